@@ -1,10 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ..core.database import get_db
+from ..core.database import get_db, get_read_db, engine, read_engine
+from ..core.pool import pool_status
 from ..api.dependencies import get_admin_user
-from ..models.models import GeoBoundary, ApiCredential, Department, Jurisdiction, User, UserRole
+from ..models.models import GeoBoundary, ApiCredential, Department, Jurisdiction, RequestCategory, User, UserRole
 from ..core.crypto import get_fernet
+from ..services.scan_queue import scan_queue
+from ..services.storage_gc import StorageReconciler
+from ..services.audit_service import AuditService
+from ..services.audit_partitions import AuditPartitionManager
+from ..services.request_stats import RequestStatsService
+from ..services.resolution_analytics import ResolutionAnalytics
 from ..services.department_service import DepartmentService
 from ..services.jurisdiction_service import JurisdictionService
 from pathlib import Path
@@ -55,6 +65,121 @@ async def request_update(db: AsyncSession = Depends(get_db), current_user=Depend
     (flag_dir / "update_requested").write_text("1")
     return {"ok": True}
 
+@router.get("/scan-queue")
+async def scan_queue_metrics(current_user=Depends(get_admin_user)):
+    try:
+        return await scan_queue.metrics()
+    except Exception:
+        raise HTTPException(status_code=503, detail="scan queue unavailable")
+
+@router.get("/db-pool")
+async def db_pool_metrics(current_user=Depends(get_admin_user)):
+    """Pool state of the process that answers; each API worker keeps its own pools"""
+    return {
+        "primary": pool_status(engine),
+        "replica": pool_status(read_engine) if read_engine is not None else None,
+    }
+
+@router.get("/stats")
+async def dashboard_stats(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_read_db),
+    current_user=Depends(get_admin_user)
+):
+    """Counts by status/category/priority, daily opened/closed trend and average time to completion"""
+    return await RequestStatsService(db).dashboard(days)
+
+@router.get("/resolution-times")
+async def resolution_times(
+    since: Optional[datetime] = Query(None, description="Start of the range (default: 12 weeks ago)"),
+    until: Optional[datetime] = Query(None, description="End of the range, exclusive (default: now)"),
+    category: Optional[RequestCategory] = None,
+    exact: bool = Query(False, description="Compute from every request in the range instead of the sketches"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user=Depends(get_admin_user)
+):
+    """Median, p90 and p99 hours to resolution per category, for requests completed in the range"""
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(weeks=12)
+    try:
+        return await ResolutionAnalytics(db).percentiles(since, until, category, exact)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/resolution-times/weekly")
+async def weekly_resolution_times(
+    weeks: int = Query(12, ge=1, le=104),
+    category: Optional[RequestCategory] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user=Depends(get_admin_user)
+):
+    """Median, p90 and p99 hours to resolution per completion week and category"""
+    return await ResolutionAnalytics(db).weekly(weeks, category)
+
+@router.get("/storage-gc")
+async def storage_gc_report(db: AsyncSession = Depends(get_db), current_user=Depends(get_admin_user)):
+    try:
+        return await StorageReconciler(db, scan_queue.client).report()
+    except Exception:
+        raise HTTPException(status_code=503, detail="storage reconciliation report unavailable")
+
+def _parse_details(pairs: List[str]) -> dict:
+    """"assigned_staff_id:42" -> {"assigned_staff_id": 42}; values that are not JSON stay strings"""
+    details = {}
+    for pair in pairs:
+        key, sep, value = pair.partition(":")
+        if not sep:
+            raise ValueError(f"Expected key:value, got {pair}")
+        try:
+            details[key] = json.loads(value)
+        except ValueError:
+            details[key] = value
+    return details
+
+@router.get("/audit")
+async def search_audit_events(
+    response: Response,
+    actor_id: Optional[int] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    detail: List[str] = Query([], description="key:value pairs the event details must contain, e.g. assigned_staff_id:42"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_admin_user)
+):
+    """Audit events, newest first; the next page's cursor is in X-Next-Cursor"""
+    try:
+        events, next_cursor = await AuditService(db).search(
+            actor_id, entity_type, entity_id, action, since, until, limit, cursor, _parse_details(detail)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            "id": e.id,
+            "actor_id": e.actor_id,
+            "action": e.action,
+            "entity_type": e.entity_type,
+            "entity_id": e.entity_id,
+            "details": e.details,
+            "created_at": e.created_at.isoformat(),
+        }
+        for e in events
+    ]
+
+@router.get("/audit/partitions")
+async def list_audit_partitions(db: AsyncSession = Depends(get_db), current_user=Depends(get_admin_user)):
+    if db.bind.dialect.name != "postgresql":
+        return []
+    partitions = await AuditPartitionManager(db).partitions()
+    return [{"name": p.name, "month": p.month.date().isoformat(), "attached": p.attached} for p in partitions]
+
 @router.post("/departments")
 async def create_department(payload: dict, db: AsyncSession = Depends(get_db), current_user=Depends(get_admin_user)):
     name = payload.get("name")
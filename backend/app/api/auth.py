@@ -9,6 +9,7 @@ from ..core.config import settings
 from ..services.user_service import UserService
 from ..schemas.user import UserCreate, UserResponse, UserLogin, Token
 from ..core.rate_limit import RateLimiter
+from .dependencies import get_current_active_user
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 limit_auth = RateLimiter(limit=20, window_seconds=60)
@@ -59,6 +60,3 @@ async def get_current_user_info(
 ):
     """Get current user information"""
     return current_user
-
-# Import dependencies at the bottom to avoid circular imports
-from .dependencies import get_current_active_user
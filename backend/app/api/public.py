@@ -2,14 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from ..core.database import get_db
-from ..schemas.request import ServiceRequestCreate, ServiceRequestResponse
+from ..schemas.request import ServiceRequestCreate, ServiceRequestResponse, StatusBatch
 from ..services.request_service import RequestService
-from ..models.models import ServiceRequest, User
+from ..models.models import User
 from ..core.rate_limit import RateLimiter
+from ..services.status_cache import status_cache
 
 router = APIRouter(prefix="/public", tags=["public"])
 limit_create = RateLimiter(limit=10, window_seconds=60)
 limit_status = RateLimiter(limit=30, window_seconds=60)
+limit_status_batch = RateLimiter(limit=30, window_seconds=60)
 
 async def _get_anonymous_user(db: AsyncSession) -> User:
     result = await db.execute(select(User).where(User.email == "anonymous@system.local"))
@@ -35,8 +37,16 @@ async def submit_request(request_create: ServiceRequestCreate, db: AsyncSession
 
 @router.get("/requests/{request_id}/status", dependencies=[Depends(limit_status)])
 async def request_status(request_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ServiceRequest).where(ServiceRequest.id == request_id))
-    req = result.scalar_one_or_none()
-    if not req:
+    value = await status_cache.get(db, request_id)
+    if value is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    return {"id": req.id, "status": req.status.value}
+    return {"id": request_id, "status": value}
+
+@router.post("/requests/status", dependencies=[Depends(limit_status_batch)])
+async def request_statuses(batch: StatusBatch, db: AsyncSession = Depends(get_db)):
+    """Many statuses in one call (for the SMS gateway); IDs with no request are listed under "missing" """
+    statuses = await status_cache.get_many(db, batch.ids)
+    return {
+        "requests": [{"id": request_id, "status": value} for request_id, value in statuses.items() if value is not None],
+        "missing": [request_id for request_id, value in statuses.items() if value is None],
+    }
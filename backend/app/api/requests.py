@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+import asyncio
+import base64
+import json
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from pathlib import Path
 from typing import List, Optional
+from urllib.parse import quote
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, get_read_db
 from ..api.dependencies import get_current_active_user, get_staff_user
 from ..services.request_service import RequestService
 from ..services.attachment_service import AttachmentService
 from ..services.comment_service import CommentService
+from ..services.comment_events import comment_broadcaster
+from ..services.archive import stream_zip
+from ..services.image_variants import FORMATS
+from ..services.resumable_uploads import ChecksumMismatch, UploadConflict, parse_checksum
+from ..services.storage import content_disposition, parse_range
 from ..schemas.request import (
     ServiceRequestCreate, 
     ServiceRequestUpdate, 
@@ -16,11 +28,17 @@ from ..schemas.request import (
 )
 from ..schemas.attachment import AttachmentResponse
 from ..schemas.comment import CommentCreate, CommentResponse, CommentUpdate
-from ..models.user import User, UserRole
-from ..models.request import RequestStatus, RequestCategory, RequestPriority
+from ..models.models import User, UserRole, RequestStatus, RequestCategory, RequestPriority
 
 router = APIRouter(prefix="/requests", tags=["service-requests"])
 
+def _for_viewer(request, current_user: User) -> ServiceRequestResponse:
+    """Citizens do not see staff-only notes, so their comment count leaves those out"""
+    response = ServiceRequestResponse.model_validate(request)
+    if current_user.role == UserRole.CITIZEN:
+        response.comment_count = response.public_comment_count
+    return response
+
 @router.post("/", response_model=ServiceRequestResponse)
 async def create_request(
     request_create: ServiceRequestCreate,
@@ -43,7 +61,10 @@ async def get_requests(
     category: Optional[RequestCategory] = None,
     priority: Optional[RequestPriority] = None,
     search: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    open: bool = Query(False, description="Only requests still waiting on staff"),
+    assigned_staff_id: Optional[int] = None,
+    sort: str = Query("created", pattern="^(created|activity)$", description="Newest created or most recently active first"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get list of service requests with filtering"""
@@ -52,8 +73,10 @@ async def get_requests(
     # Build filter
     filter_params = ServiceRequestFilter(
         status=status,
+        open_only=open,
         category=category,
         priority=priority,
+        assigned_staff_id=assigned_staff_id,
         search=search
     )
     
@@ -66,21 +89,79 @@ async def get_requests(
         limit=limit,
         filter_params=filter_params,
         user_id=user_id,
-        user_role=user_role
+        user_role=user_role,
+        sort=sort
     )
     
     return ServiceRequestList(
-        items=requests,
+        items=[_for_viewer(request, current_user) for request in requests],
         total=total,
         page=skip // limit + 1,
         size=limit,
         pages=(total + limit - 1) // limit
     )
 
+@router.get("/comments/stream")
+async def stream_comments(
+    http_request: Request,
+    request_id: List[int] = Query(..., max_length=50, description="Requests to watch"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Server-sent events with new comments on the watched requests.
+
+    Reconnecting clients send Last-Event-ID and get what they missed replayed first.
+    """
+    request_ids = sorted(set(request_id))
+    request_service = RequestService(db)
+    for watched_id in request_ids:
+        request = await request_service.get_request_by_id(watched_id)
+        if not request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
+        if current_user.role == UserRole.CITIZEN and request.citizen_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to view comments for this request"
+            )
+    include_internal = current_user.role != UserRole.CITIZEN
+    
+    missed = []
+    last_event_id = http_request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        comments = await CommentService(db).get_comments_since(request_ids, int(last_event_id), include_internal)
+        missed = [CommentResponse.model_validate(c).model_dump(mode="json") for c in comments]
+    
+    def event(payload: dict) -> str:
+        return f"id: {payload['id']}\nevent: comment\ndata: {json.dumps(payload)}\n\n"
+    
+    async def events():
+        async with comment_broadcaster.listen(request_ids) as queue:
+            for payload in missed:
+                yield event(payload)
+            while not await http_request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=settings.sse_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    comment_broadcaster.ensure_reader()
+                    yield ": keep-alive\n\n"  # Keeps proxies from closing an idle stream
+                    continue
+                if payload.get("is_internal") and not include_internal:
+                    continue
+                yield event(payload)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/{request_id}", response_model=ServiceRequestResponse)
 async def get_request(
     request_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a specific service request"""
@@ -100,7 +181,7 @@ async def get_request(
             detail="Not authorized to view this request"
         )
     
-    return request
+    return _for_viewer(request, current_user)
 
 @router.put("/{request_id}", response_model=ServiceRequestResponse)
 async def update_request(
@@ -201,14 +282,150 @@ async def upload_attachment(
             detail=str(e)
         )
 
-@router.get("/{request_id}/attachments", response_model=List[AttachmentResponse])
-async def get_attachments(
+# Resumable uploads (tus-style): create, PATCH chunks at offsets, then finalize
+TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+
+def _parse_upload_metadata(header: Optional[str]) -> dict:
+    """Decode a tus Upload-Metadata header: comma-separated "key base64value" pairs"""
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ""
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed Upload-Metadata header")
+    return metadata
+
+def _int_header(http_request: Request, name: str) -> int:
+    try:
+        value = int(http_request.headers[name])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} header is required")
+    if value < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{name} must not be negative")
+    return value
+
+async def _get_upload_session(attachment_service: AttachmentService, request_id: int, upload_id: str, current_user: User):
+    session = await attachment_service.uploads.get(upload_id)
+    # Sessions are private to the user who started them
+    if not session or session.request_id != request_id or session.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return session
+
+@router.post("/{request_id}/uploads", status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
     request_id: int,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get attachments for a request"""
-    # Check if request exists and user has access
+    """Start a resumable upload; send Upload-Length and Upload-Metadata (filename, description)"""
+    await _get_request_for_attachments(request_id, db, current_user)
+    length = _int_header(http_request, "upload-length")
+    metadata = _parse_upload_metadata(http_request.headers.get("upload-metadata"))
+    if not metadata.get("filename"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Metadata must include a filename")
+    
+    attachment_service = AttachmentService(db)
+    try:
+        session = await attachment_service.create_upload(
+            request_id, current_user.id, metadata["filename"], length, metadata.get("description") or None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(
+        status_code=status.HTTP_201_CREATED,
+        headers={
+            **TUS_HEADERS,
+            "Location": f"/api/requests/{request_id}/uploads/{session.id}",
+            "Upload-Offset": "0",
+        }
+    )
+
+@router.head("/{request_id}/uploads/{upload_id}")
+async def get_resumable_upload_offset(
+    request_id: int,
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """How many bytes of the upload have arrived, so the client knows where to resume"""
+    session = await _get_upload_session(AttachmentService(db), request_id, upload_id, current_user)
+    return Response(headers={
+        **TUS_HEADERS,
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.length),
+        "Cache-Control": "no-store",
+    })
+
+@router.patch("/{request_id}/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def append_resumable_upload(
+    request_id: int,
+    upload_id: str,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Append a chunk at Upload-Offset, optionally verified by an Upload-Checksum header"""
+    if http_request.headers.get("content-type") != "application/offset+octet-stream":
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Content-Type must be application/offset+octet-stream"
+        )
+    attachment_service = AttachmentService(db)
+    session = await _get_upload_session(attachment_service, request_id, upload_id, current_user)
+    offset = _int_header(http_request, "upload-offset")
+    try:
+        checksum = parse_checksum(http_request.headers.get("upload-checksum"))
+        new_offset = await attachment_service.uploads.append(session, offset, http_request.stream(), checksum)
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ChecksumMismatch as e:
+        raise HTTPException(status_code=460, detail=str(e))  # tus "Checksum Mismatch"
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={**TUS_HEADERS, "Upload-Offset": str(new_offset)}
+    )
+
+@router.post("/{request_id}/uploads/{upload_id}/finalize", response_model=AttachmentResponse)
+async def finalize_resumable_upload(
+    request_id: int,
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Scan and attach a completely received upload"""
+    attachment_service = AttachmentService(db)
+    session = await _get_upload_session(attachment_service, request_id, upload_id, current_user)
+    try:
+        return await attachment_service.finalize_upload(session)
+    except UploadConflict as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.delete("/{request_id}/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_resumable_upload(
+    request_id: int,
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Abandon an upload and discard the bytes received so far"""
+    attachment_service = AttachmentService(db)
+    session = await _get_upload_session(attachment_service, request_id, upload_id, current_user)
+    await attachment_service.uploads.delete(session.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=TUS_HEADERS)
+
+async def _get_request_for_attachments(request_id: int, db: AsyncSession, current_user: User):
+    """Load a request, checking the user may see its attachments"""
     request_service = RequestService(db)
     request = await request_service.get_request_by_id(request_id)
     
@@ -224,11 +441,191 @@ async def get_attachments(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view attachments for this request"
         )
+    return request
+
+@router.get("/{request_id}/attachments", response_model=List[AttachmentResponse])
+async def get_attachments(
+    request_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get attachments for a request"""
+    await _get_request_for_attachments(request_id, db, current_user)
     
     attachment_service = AttachmentService(db)
     attachments = await attachment_service.get_attachments_by_request(request_id)
     return attachments
 
+@router.get("/{request_id}/attachments.zip")
+async def download_attachments_zip(
+    request_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Every scanned-clean attachment of a request as one ZIP, built while it is sent"""
+    await _get_request_for_attachments(request_id, db, current_user)
+    
+    attachment_service = AttachmentService(db)
+    entries = await attachment_service.get_archive_entries(request_id)
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="request-{request_id}-attachments.zip"',
+            "Cache-Control": "private, no-store",
+        }
+    )
+
+async def _get_clean_attachment(attachment_service: AttachmentService, request_id: int, attachment_id: int):
+    attachment = await attachment_service.get_attachment_by_id(attachment_id)
+    if not attachment or attachment.request_id != request_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found"
+        )
+
+    # Only serve files the scanner has cleared
+    if attachment.is_scanned == 0:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Attachment is waiting for a virus scan"
+        )
+    if attachment.is_scanned == 2:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Attachment failed the virus scan"
+        )
+    return attachment
+
+@router.get("/{request_id}/attachments/{attachment_id}/download")
+async def download_attachment(
+    request_id: int,
+    attachment_id: int,
+    http_request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Download an attachment once it has passed the virus scan"""
+    await _get_request_for_attachments(request_id, db, current_user)
+
+    attachment_service = AttachmentService(db)
+    attachment = await _get_clean_attachment(attachment_service, request_id, attachment_id)
+    return await _stored_file_response(
+        http_request,
+        attachment_service.storage,
+        attachment.file_path,
+        attachment.mime_type,
+        attachment.original_filename,
+        etag=f'"{attachment.content_hash}"' if attachment.content_hash else None
+    )
+
+@router.get("/{request_id}/attachments/{attachment_id}/variants/{variant}")
+async def get_attachment_variant(
+    request_id: int,
+    attachment_id: int,
+    variant: str,
+    http_request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Resized, metadata-free copy of an image attachment (e.g. thumb.webp), rendered on first request"""
+    await _get_request_for_attachments(request_id, db, current_user)
+
+    attachment_service = AttachmentService(db)
+    attachment = await _get_clean_attachment(attachment_service, request_id, attachment_id)
+    try:
+        key = await attachment_service.get_variant(attachment, variant)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if not key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Variant not found"
+        )
+    return await _stored_file_response(
+        http_request,
+        attachment_service.storage,
+        key,
+        FORMATS[variant.rsplit(".", 1)[1]][1],
+        f"{Path(attachment.original_filename).stem}.{variant}",
+        etag=f'"{attachment.content_hash}.{variant}"' if attachment.content_hash else None,
+        disposition="inline"
+    )
+
+async def _stored_file_response(
+    http_request: Request,
+    storage,
+    key: str,
+    media_type: str,
+    filename: str,
+    etag: Optional[str] = None,
+    disposition: str = "attachment"
+):
+    """Send a stored file, letting the proxy or object store do the transfer where possible"""
+    headers = {
+        "Content-Disposition": content_disposition(disposition, filename),
+        # A content hash always names the same bytes, so browsers never need to revalidate
+        "Cache-Control": f"private, max-age={settings.download_cache_max_age}" + (", immutable" if etag else ""),
+    }
+    if etag:
+        headers["ETag"] = etag
+        if_none_match = http_request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    local_path = storage.local_path(key)
+    if local_path:
+        internal_uri = _offload_uri(local_path)
+        if internal_uri:
+            # The proxy sends the file itself (sendfile, Range, conditional requests); the app only authorizes
+            headers["X-Accel-Redirect"] = internal_uri
+            return Response(media_type=media_type, headers=headers)
+        # Starlette answers Range requests for files on disk
+        return FileResponse(local_path, media_type=media_type, headers=headers)
+
+    # Object storage serves ranges itself from a short-lived URL
+    # (the filename makes the object store send it as a download)
+    url = await storage.presigned_url(
+        key, settings.presigned_url_expires, filename if disposition == "attachment" else None
+    )
+    if url:
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+
+    size = await storage.size(key)
+    if size is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment file missing"
+        )
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = parse_range(http_request.headers.get("range"), size)
+    if byte_range == "invalid":
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        storage.iter_chunks(key, start=start, end=end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=media_type,
+        headers=headers
+    )
+
+def _offload_uri(local_path: Path) -> Optional[str]:
+    """Internal URI the proxy serves local_path from, when downloads are offloaded"""
+    if settings.download_offload != "x-accel":
+        return None
+    try:
+        relative = local_path.resolve().relative_to(Path(settings.storage_root).resolve())
+    except ValueError:
+        return None  # Outside the directory mounted into the proxy
+    return settings.download_offload_prefix.rstrip("/") + "/" + quote(relative.as_posix())
+
 # Comment endpoints
 @router.post("/{request_id}/comments", response_model=CommentResponse)
 async def create_comment(
@@ -262,13 +659,15 @@ async def create_comment(
 @router.get("/{request_id}/comments", response_model=List[CommentResponse])
 async def get_comments(
     request_id: int,
+    response: Response,
     include_internal: bool = Query(False),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get comments for a request"""
+    """Get comments for a request, newest first; the next page's cursor is in X-Next-Cursor"""
     # Check if request exists and user has access
     request_service = RequestService(db)
     request = await request_service.get_request_by_id(request_id)
@@ -291,7 +690,16 @@ async def get_comments(
         include_internal = False
     
     comment_service = CommentService(db)
-    comments = await comment_service.get_comments_by_request(
-        request_id, include_internal, skip, limit
-    )
+    if skip:
+        return await comment_service.get_comments_by_request(
+            request_id, include_internal, skip, limit
+        )
+    try:
+        comments, next_cursor = await comment_service.get_comments_page(
+            request_id, include_internal, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return comments
@@ -8,7 +8,36 @@ celery_app.conf.beat_schedule = {
     "weekly-report": {
         "task": "app.tasks.reports.weekly_report",
         "schedule": 7 * 24 * 60 * 60,
-    }
+    },
+    "attachment-scan-sweep": {
+        "task": "app.tasks.scanning.requeue_pending",
+        "schedule": 5 * 60,
+    },
+    "resumable-upload-purge": {
+        "task": "app.tasks.uploads.purge_expired",
+        "schedule": 60 * 60,
+    },
+    "storage-reconcile": {
+        "task": "app.tasks.storage_gc.reconcile",
+        "schedule": 24 * 60 * 60,
+    },
+    "activity-counter-repair": {
+        "task": "app.tasks.activity.repair_counters",
+        "schedule": 24 * 60 * 60,
+    },
+    "audit-partition-maintenance": {
+        "task": "app.tasks.audit.maintain_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+    "request-stats-repair": {
+        "task": "app.tasks.stats.rebuild_counts",
+        "schedule": 24 * 60 * 60,
+    },
+}
+# Virus scans and image resizing run on their own worker pools so they never hold up other tasks
+celery_app.conf.task_routes = {
+    "app.tasks.scanning.*": {"queue": "scans"},
+    "app.tasks.images.*": {"queue": "images"},
 }
 
 @celery_app.task(name="app.tasks.ai.ai_triage_task")
@@ -17,6 +46,59 @@ def ai_triage_task(payload: dict) -> dict:
     return triage(payload)
 
 @celery_app.task(name="app.tasks.reports.weekly_report")
-def weekly_report():
+def weekly_report(week_start=None):
     from app.tasks.reports import generate_weekly_report
-    return generate_weekly_report()
+    return generate_weekly_report(week_start)
+
+@celery_app.task(name="app.tasks.scanning.scan_batch")
+def scan_attachments():
+    from app.tasks.scanning import scan_batch
+    result = scan_batch()
+    if result.get("retry"):
+        # Scanner is struggling; back off instead of spinning on the same ids
+        scan_attachments.apply_async(countdown=30)
+    elif result.get("remaining"):
+        scan_attachments.delay()
+    return result
+
+@celery_app.task(name="app.tasks.scanning.requeue_pending")
+def requeue_pending_scans():
+    from app.tasks.scanning import requeue_pending
+    result = requeue_pending()
+    if result.get("requeued"):
+        scan_attachments.delay()
+    return result
+
+@celery_app.task(name="app.tasks.images.generate_variants")
+def generate_image_variants(attachment_id: int):
+    from app.tasks.images import generate_variants
+    return generate_variants(attachment_id)
+
+@celery_app.task(name="app.tasks.uploads.purge_expired")
+def purge_expired_uploads():
+    from app.tasks.uploads import purge_expired
+    return purge_expired()
+
+@celery_app.task(name="app.tasks.storage_gc.reconcile")
+def reconcile_storage(continuation: bool = False, dry_run: bool = False):
+    from app.tasks.storage_gc import reconcile_batch
+    result = reconcile_batch(continuation=continuation, dry_run=dry_run)
+    if not result["finished"]:
+        # One small batch per task keeps each run short; chain until the pass is done
+        reconcile_storage.delay(continuation=True, dry_run=dry_run)
+    return result
+
+@celery_app.task(name="app.tasks.activity.repair_counters")
+def repair_activity_counters():
+    from app.tasks.activity import repair_counters
+    return repair_counters()
+
+@celery_app.task(name="app.tasks.audit.maintain_partitions")
+def maintain_audit_partitions():
+    from app.tasks.audit import maintain_partitions
+    return maintain_partitions()
+
+@celery_app.task(name="app.tasks.stats.rebuild_counts")
+def rebuild_request_counts():
+    from app.tasks.stats import rebuild_counts
+    return rebuild_counts()
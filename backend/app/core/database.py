@@ -1,26 +1,66 @@
 from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from fastapi import Request
 from .config import settings
+from .pool import create_pooled_engine
+from .query_stats import install_query_stats
+from .replica import ReplicaMonitor, recent_writes
 from ..models.models import Base
 
-# Create async engine
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,  # Set to True for debugging
-    pool_size=20,
-    max_overflow=40,
-    pool_pre_ping=True,
-)
+# Create async engine; pool sizing and PgBouncer mode come from settings (see core/pool.py)
+engine = create_pooled_engine(settings.database_url)
+install_query_stats(engine)
 
 # Create async session
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+# Optional read replica for GET endpoints (see get_read_db)
+read_engine = None
+ReadSessionLocal = None
+replica_monitor = None
+if settings.database_read_url:
+    read_engine = create_pooled_engine(
+        settings.database_read_url,
+        # Refuse writes even if the URL points at a primary by mistake. PgBouncer rejects
+        # startup parameters it does not track, so there the role of the replica must do it.
+        connect_args=(
+            {"server_settings": {"default_transaction_read_only": "on"}}
+            if settings.database_read_url.startswith("postgresql+asyncpg") and not settings.db_pgbouncer else {}
+        ),
+    )
+    install_query_stats(read_engine)
+    ReadSessionLocal = sessionmaker(
+        read_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    replica_monitor = ReplicaMonitor(read_engine)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+async def get_read_db(request: Request):
+    """Session for read-only endpoints: the replica when it is healthy and caught up,
+    otherwise (or right after this client wrote something) the primary"""
+    factory = AsyncSessionLocal
+    if (
+        ReadSessionLocal is not None
+        and not await recent_writes.wrote_recently(request.headers.get("authorization"))
+        and await replica_monitor.usable()
+    ):
+        factory = ReadSessionLocal
+    async with factory() as session:
+        try:
+            yield session
+        except DBAPIError:
+            if factory is ReadSessionLocal:
+                replica_monitor.mark_unhealthy()
+            raise
+        finally:
+            await session.close()
@@ -0,0 +1,125 @@
+import bisect
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class PoolMetrics:
+    """Checkout waits, pool timeouts and failed pre-pings for one engine, in this process"""
+    def __init__(self):
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+        self.wait_sum = 0.0
+        self.timeouts = 0
+        self.pre_ping_failures = 0
+
+    def observe_wait(self, seconds: float):
+        self.wait_counts[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+        self.wait_sum += seconds
+
+    def histogram(self) -> dict:
+        """Cumulative counts per upper bound, as Prometheus histograms report them"""
+        buckets, total = {}, 0
+        for bound, count in zip((*WAIT_BUCKETS, "+Inf"), self.wait_counts):
+            total += count
+            buckets[str(bound)] = total
+        return {"buckets": buckets, "count": total, "sum": round(self.wait_sum, 6)}
+
+class _TimedCheckout:
+    """Times every checkout, including waits for a free connection and the pre-ping"""
+    metrics: Optional[PoolMetrics] = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; the counters carry over
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class InstrumentedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+def engine_options(url: str) -> dict:
+    """create_async_engine arguments for url, from the db_pool_* and db_pgbouncer settings"""
+    options = {"echo": False, "pool_pre_ping": settings.db_pool_pre_ping}
+    if settings.db_pgbouncer and url.startswith("postgresql+asyncpg"):
+        # PgBouncer in transaction mode hands each transaction to whichever server connection
+        # is free, so a statement prepared on one is unknown (or clashes by name) on the next.
+        # Nothing is cached, names are unique, and PgBouncer does the pooling.
+        options["poolclass"] = InstrumentedNullPool
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+        return options
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+    )
+    return options
+
+def create_pooled_engine(url: str, **kwargs) -> AsyncEngine:
+    """Async engine with the configured pool and metrics attached (see pool_status)"""
+    options = engine_options(url)
+    if "connect_args" in kwargs:
+        kwargs["connect_args"] = {**options.pop("connect_args", {}), **kwargs["connect_args"]}
+    engine = create_async_engine(url, **{**options, **kwargs})
+    metrics = PoolMetrics()
+    engine.pool.metrics = metrics
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def count_pre_ping_failure(context):
+        if context.is_pre_ping:
+            metrics.pre_ping_failures += 1
+            logger.warning("Pooled connection failed its pre-ping and was replaced")
+
+    return engine
+
+def pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.pool
+    metrics = getattr(pool, "metrics", None) or PoolMetrics()
+    status = {
+        "pid": os.getpid(),
+        "pool": type(pool).__name__,
+        "timeouts": metrics.timeouts,
+        "pre_ping_failures": metrics.pre_ping_failures,
+        "checkout_wait_seconds": metrics.histogram(),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            max_overflow=pool._max_overflow,
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    return status
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Expanded IN lists differ in length from call to call: "IN ($3, $4, $5)" -> "IN (...)"
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\$\d+|\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\$\d+|\?|%\(\w+\)s|:\w+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_trackers: ContextVar[tuple["QueryStats", ...]] = ContextVar("query_trackers", default=())
+
+def fingerprint(statement: str) -> str:
+    """The statement with its bound values left out, so repeats of one query share a fingerprint"""
+    return _PLACEHOLDER_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+
+def parameter_fingerprint(parameters) -> str:
+    """Short hash of the bound values: equal for the same query with the same arguments, without logging them"""
+    return hashlib.sha1(repr(parameters).encode()).hexdigest()[:10]
+
+class QueryStats:
+    """Queries run while a track_queries() block is open, and how long the database took"""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+        self.calls: Counter = Counter()
+
+    def record(self, statement: str, parameters: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+        self.calls[statement, parameters] += 1
+
+    def repeated(self, threshold: int = settings.query_repeat_threshold) -> dict[str, int]:
+        """Statements run threshold times or more: usually a query per row of an earlier result (N+1)"""
+        return {statement: n for statement, n in self.statements.items() if n >= threshold}
+
+    def duplicates(self) -> dict[str, int]:
+        """Statements run more than once with the same arguments, e.g. re-loading a row already in hand"""
+        return {statement: n for (statement, _), n in self.calls.items() if n > 1}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+@contextmanager
+def track_queries():
+    """Count the queries run in this context (and the tasks it starts) until the block exits"""
+    stats = QueryStats()
+    token = _trackers.set(_trackers.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _trackers.reset(token)
+
+def install_query_stats(engine: AsyncEngine):
+    """Feed engine's queries to the open trackers and log the slow ones"""
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "query_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        statement = fingerprint(statement)
+        parameters = parameter_fingerprint(parameters)
+        for stats in _trackers.get():
+            stats.record(statement, parameters, duration)
+        if duration * 1000 >= settings.query_slow_ms:
+            logger.warning("Slow query (%.1f ms, params %s): %s", duration * 1000, parameters, statement)
+
+class QueryStatsMiddleware:
+    """Counts each HTTP request's queries, reports them in a Server-Timing header and logs likely N+1s.
+
+    Queries run after the response has started (streamed bodies) are logged but
+    cannot make it into the header.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start" and settings.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", stats.server_timing().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                for statement, n in stats.repeated().items():
+                    logger.warning("Possible N+1 in %s %s: %d runs of %s", scope["method"], scope["path"], n, statement)
+                for statement, n in stats.duplicates().items():
+                    logger.info("%s %s ran the same query %d times: %s", scope["method"], scope["path"], n, statement)
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional
+import redis.asyncio as aioredis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+WRITE_KEY_PREFIX = "db:recent_write:"
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it received
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+class ReplicaMonitor:
+    """Decides whether reads may go to the replica.
+
+    The replica is probed at most once per check_interval; it is skipped while
+    it is unreachable or more than max_lag seconds behind, and taken back as
+    soon as a probe finds it healthy again.
+    """
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_lag: float = settings.replica_max_lag_seconds,
+        check_interval: float = settings.replica_check_interval
+    ):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def usable(self) -> bool:
+        if time.monotonic() - self.checked_at >= self.check_interval:
+            async with self._lock:
+                if time.monotonic() - self.checked_at >= self.check_interval:
+                    await self.check()
+        return self.healthy and self.lag <= self.max_lag
+
+    async def _probe(self) -> float:
+        async with self.engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                return await conn.scalar(text(LAG_QUERY))
+            await conn.execute(text("SELECT 1"))
+            return 0
+
+    async def check(self):
+        try:
+            # Bounds the connect too: a replica that stops answering SYNs would otherwise hold every reader
+            # (an interval of 0, probing on every read, leaves it unbounded)
+            lag = await asyncio.wait_for(self._probe(), self.check_interval or None)
+            if not self.healthy:
+                logger.info("Read replica is back; routing reads to it again")
+            self.healthy, self.lag = True, float(lag or 0)
+        except Exception:
+            if self.healthy:
+                logger.warning("Read replica unavailable; reading from the primary", exc_info=True)
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def mark_unhealthy(self):
+        """A query failed on the replica; stay on the primary until the next probe"""
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+class RecentWrites:
+    """Remembers, per bearer token, that a client just wrote something.
+
+    For max_lag seconds after a write that client's reads go to the primary,
+    so it always sees its own changes even if the replica has not caught up.
+    """
+    def __init__(self, client: aioredis.Redis, window: float = settings.replica_max_lag_seconds):
+        self.client = client
+        self.window = window
+
+    @staticmethod
+    def _key(authorization: Optional[str]) -> Optional[str]:
+        if not authorization:
+            return None
+        return WRITE_KEY_PREFIX + hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+    async def mark(self, authorization: Optional[str]):
+        key = self._key(authorization)
+        if key:
+            try:
+                await self.client.set(key, 1, px=int(self.window * 1000))
+            except Exception:
+                logger.warning("Could not record a recent write", exc_info=True)
+
+    async def wrote_recently(self, authorization: Optional[str]) -> bool:
+        """Unknown counts as yes: without Redis we cannot rule out a recent write"""
+        key = self._key(authorization)
+        if not key:
+            return False
+        try:
+            return bool(await self.client.exists(key))
+        except Exception:
+            return True
+
+class RecentWriteMiddleware:
+    """Records successful POST/PUT/PATCH/DELETE requests in recent_writes.
+
+    The write is recorded before the response starts, so a client cannot see
+    the response and issue its next read before the primary is pinned.
+    """
+    def __init__(self, app, writes: Optional[RecentWrites] = None):
+        self.app = app
+        self.writes = writes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+        authorization = next(
+            (value.decode("latin-1") for name, value in scope["headers"] if name == b"authorization"), None
+        )
+
+        async def send_after_marking(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                await (self.writes or recent_writes).mark(authorization)
+            await send(message)
+
+        await self.app(scope, receive, send_after_marking)
+
+def create_recent_writes(redis_url: Optional[str] = None) -> RecentWrites:
+    return RecentWrites(aioredis.Redis.from_url(redis_url or settings.redis_url, decode_responses=True))
+
+recent_writes = create_recent_writes()
@@ -1,23 +1,22 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 import logging
 import os
 
 from .core.config import settings
-from .core.database import engine, Base
+from .core.replica import RecentWriteMiddleware, recent_writes
+from .core.query_stats import QueryStatsMiddleware
+from .services.clamav import clamav_client
+from .services.comment_events import comment_broadcaster
+from .services.audit_service import audit_buffer
+from .services.status_cache import status_cache
 from .api import auth_router, requests_router, admin_router, public_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create tables on startup
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
 # Create FastAPI app
 app = FastAPI(
     title="Township 311 Request Management System",
@@ -34,13 +33,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Resumable upload clients read these from cross-origin responses
+    expose_headers=["Location", "Upload-Offset", "Upload-Length", "Tus-Resumable", "X-Next-Cursor"],
 )
 
-# Create upload directory
-os.makedirs("/app/uploads", exist_ok=True)
+# Per-request query count and database time (Server-Timing), slow query and N+1 logging
+app.add_middleware(QueryStatsMiddleware)
 
-# Mount static files for attachments
-app.mount("/uploads", StaticFiles(directory="/app/uploads"), name="uploads")
+# With a read replica, pin each client's reads to the primary briefly after it writes
+if settings.database_read_url:
+    app.add_middleware(RecentWriteMiddleware)
+
+# Create upload directory
+# Attachments are served through the authorized, scan-gated download endpoint rather than a static mount
+if settings.storage_backend == "local":
+    os.makedirs(settings.storage_root, exist_ok=True)
 
 # Add routers
 app.include_router(auth_router, prefix="/api/auth")
@@ -51,14 +58,20 @@ app.include_router(public_router, prefix="/api")
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
+    # The schema is brought up to date by the one-shot migrate step (python -m app.migrations),
+    # not by every worker on boot
     logger.info("Starting Township 311 Request Management System...")
-    await create_tables()
-    logger.info("Database tables created/verified")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Township 311 Request Management System...")
+    await clamav_client.close()
+    await comment_broadcaster.close()
+    # Write out buffered audit events before the process goes
+    await audit_buffer.close()
+    await recent_writes.client.aclose()
+    await status_cache.client.aclose()
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -0,0 +1,4 @@
+from .revisions import MIGRATIONS
+from .runner import ConcurrentIndex, Migration, upgrade
+
+__all__ = ["MIGRATIONS", "ConcurrentIndex", "Migration", "upgrade"]
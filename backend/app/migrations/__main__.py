@@ -0,0 +1,16 @@
+"""Bring the database schema up to date: python -m app.migrations"""
+import asyncio
+import logging
+from ..core.database import engine
+from . import MIGRATIONS, upgrade
+
+async def main():
+    try:
+        applied = await upgrade(engine, MIGRATIONS)
+        print(f"Applied migrations: {applied}" if applied else "Database schema is up to date")
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,260 @@
+from ..services.audit_partitions import PARTITION_AUDIT_EVENTS
+from ..services.request_stats import backfill_request_stats
+from ..services.resolution_analytics import backfill_resolution_sketches
+from .runner import ConcurrentIndex, Migration
+
+# Append new revisions at the end with the next version number; never edit one that has shipped.
+# Each revision spells out the DDL for what it introduces rather than calling create_all,
+# so replaying it later builds the schema as of that revision, not as of the current models.
+# Steps use IF NOT EXISTS and friends because databases from before versioned
+# migrations already have some of these changes.
+MIGRATIONS = [
+    Migration(1, "baseline", [
+        # Enum columns are stored by member name
+        """
+        DO $$ BEGIN
+            CREATE TYPE userrole AS ENUM ('CITIZEN', 'STAFF', 'ADMIN');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """,
+        """
+        DO $$ BEGIN
+            CREATE TYPE requeststatus AS ENUM (
+                'SUBMITTED', 'UNDER_REVIEW', 'ASSIGNED', 'IN_PROGRESS', 'COMPLETED', 'REJECTED', 'CLOSED'
+            );
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """,
+        """
+        DO $$ BEGIN
+            CREATE TYPE requestpriority AS ENUM ('LOW', 'MEDIUM', 'HIGH', 'URGENT');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """,
+        """
+        DO $$ BEGIN
+            CREATE TYPE requestcategory AS ENUM (
+                'ROAD_MAINTENANCE', 'STREET_LIGHTING', 'TRAFFIC_SIGNALS', 'PARK_MAINTENANCE', 'WASTE_MANAGEMENT',
+                'WATER_SEWER', 'NOISE_COMPLAINT', 'PARKING_ISSUE', 'OTHER'
+            );
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR NOT NULL,
+            hashed_password VARCHAR NOT NULL,
+            full_name VARCHAR NOT NULL,
+            phone VARCHAR,
+            role userrole NOT NULL,
+            is_active BOOLEAN,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+        """
+        CREATE TABLE IF NOT EXISTS service_requests (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR NOT NULL,
+            description TEXT NOT NULL,
+            category requestcategory NOT NULL,
+            status requeststatus NOT NULL,
+            priority requestpriority NOT NULL,
+            latitude FLOAT,
+            longitude FLOAT,
+            address VARCHAR,
+            citizen_id INTEGER NOT NULL REFERENCES users (id),
+            assigned_staff_id INTEGER REFERENCES users (id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            completed_at TIMESTAMP WITH TIME ZONE,
+            is_anonymous BOOLEAN,
+            estimated_completion_date TIMESTAMP WITH TIME ZONE,
+            comment_count INTEGER NOT NULL DEFAULT 0,
+            public_comment_count INTEGER NOT NULL DEFAULT 0,
+            attachment_count INTEGER NOT NULL DEFAULT 0,
+            last_activity_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_service_requests_id ON service_requests (id)",
+        """
+        CREATE TABLE IF NOT EXISTS attachment_blobs (
+            sha256 VARCHAR(64) PRIMARY KEY,
+            file_path VARCHAR NOT NULL,
+            file_size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attachments (
+            id SERIAL PRIMARY KEY,
+            filename VARCHAR NOT NULL,
+            original_filename VARCHAR NOT NULL,
+            file_path VARCHAR NOT NULL,
+            file_size INTEGER NOT NULL,
+            mime_type VARCHAR NOT NULL,
+            description TEXT,
+            content_hash VARCHAR(64) REFERENCES attachment_blobs (sha256),
+            is_scanned INTEGER,
+            scan_result VARCHAR,
+            request_id INTEGER NOT NULL REFERENCES service_requests (id),
+            uploaded_by_id INTEGER NOT NULL REFERENCES users (id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_attachments_id ON attachments (id)",
+        """
+        CREATE TABLE IF NOT EXISTS comments (
+            id SERIAL PRIMARY KEY,
+            content TEXT NOT NULL,
+            is_internal BOOLEAN,
+            request_id INTEGER NOT NULL REFERENCES service_requests (id),
+            author_id INTEGER NOT NULL REFERENCES users (id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_comments_id ON comments (id)",
+        # Created plain; PARTITION_AUDIT_EVENTS below turns it into the partitioned table
+        """
+        CREATE TABLE IF NOT EXISTS audit_events (
+            id SERIAL PRIMARY KEY,
+            actor_id INTEGER NOT NULL REFERENCES users (id),
+            action VARCHAR NOT NULL,
+            entity_type VARCHAR NOT NULL,
+            entity_id INTEGER NOT NULL,
+            details JSONB,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS geo_boundaries (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            geojson TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_geo_boundaries_id ON geo_boundaries (id)",
+        """
+        CREATE TABLE IF NOT EXISTS api_credentials (
+            id SERIAL PRIMARY KEY,
+            service_name VARCHAR NOT NULL UNIQUE,
+            encrypted_value TEXT NOT NULL,
+            created_by_id INTEGER NOT NULL REFERENCES users (id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_api_credentials_id ON api_credentials (id)",
+        "ALTER TABLE attachments ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64) REFERENCES attachment_blobs(sha256)",
+        "CREATE INDEX IF NOT EXISTS ix_attachments_content_hash ON attachments (content_hash)",
+        "CREATE INDEX IF NOT EXISTS ix_comments_request_internal_created ON comments (request_id, is_internal, created_at, id)",
+        # Existing rows start at zero; the nightly counter repair fills the real counts in
+        "ALTER TABLE service_requests ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE service_requests ADD COLUMN IF NOT EXISTS public_comment_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE service_requests ADD COLUMN IF NOT EXISTS attachment_count INTEGER NOT NULL DEFAULT 0",
+        """
+        DO $$ BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'service_requests' AND column_name = 'last_activity_at'
+            ) THEN
+                ALTER TABLE service_requests ADD COLUMN last_activity_at TIMESTAMP WITH TIME ZONE DEFAULT now();
+                UPDATE service_requests SET last_activity_at = COALESCE(updated_at, created_at);
+            END IF;
+        END $$
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_service_requests_last_activity ON service_requests (last_activity_at DESC, id DESC)",
+        PARTITION_AUDIT_EVENTS,
+        "CREATE INDEX IF NOT EXISTS ix_audit_events_actor_created ON audit_events (actor_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_audit_events_entity ON audit_events (entity_type, entity_id)",
+        """
+        DO $$ BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'audit_events' AND column_name = 'details' AND data_type = 'text'
+            ) THEN
+                ALTER TABLE audit_events ALTER COLUMN details TYPE JSONB USING details::jsonb;
+            END IF;
+        END $$
+        """,
+        # jsonb_path_ops serves details @> '{...}' lookups, which is how AuditService.search filters on details
+        "CREATE INDEX IF NOT EXISTS ix_audit_events_details ON audit_events USING gin (details jsonb_path_ops)",
+    ]),
+    # Indexes shaped like the request-list queries, built without locking out writes. The
+    # single-column indexes an older init_db defined lead with the same columns and go
+    Migration(2, "request_list_indexes", [
+        ConcurrentIndex("ix_service_requests_created", "service_requests", "(created_at DESC, id DESC)"),
+        ConcurrentIndex("ix_service_requests_citizen_created", "service_requests", "(citizen_id, created_at DESC, id DESC)"),
+        ConcurrentIndex("ix_service_requests_status_created", "service_requests", "(status, created_at DESC, id DESC)"),
+        ConcurrentIndex("ix_service_requests_category_created", "service_requests", "(category, created_at DESC, id DESC)"),
+        ConcurrentIndex("ix_service_requests_priority_created", "service_requests", "(priority, created_at DESC, id DESC)"),
+        ConcurrentIndex("ix_service_requests_assigned_created", "service_requests", "(assigned_staff_id, created_at DESC, id DESC)"),
+        ConcurrentIndex(
+            "ix_service_requests_open_created", "service_requests", "(created_at DESC, id DESC)",
+            where="status IN ('SUBMITTED', 'UNDER_REVIEW', 'ASSIGNED', 'IN_PROGRESS')"
+        ),
+        ConcurrentIndex(
+            "ix_service_requests_open_assigned", "service_requests", "(assigned_staff_id, priority, created_at DESC)",
+            where="status IN ('SUBMITTED', 'UNDER_REVIEW', 'ASSIGNED', 'IN_PROGRESS')"
+        ),
+        ConcurrentIndex("idx_attachments_request_id", "attachments", "(request_id)"),
+        ConcurrentIndex("idx_comments_request_id", "comments", "(request_id)"),
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_status",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_category",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_priority",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_created_at",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_citizen_id",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_service_requests_assigned_staff_id",
+    ], transactional=False),
+    # Dashboard aggregate tables, filled from the requests that already exist
+    Migration(3, "request_stats", [
+        """
+        CREATE TABLE IF NOT EXISTS request_counts (
+            status requeststatus NOT NULL,
+            category requestcategory NOT NULL,
+            priority requestpriority NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, category, priority)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS request_daily_stats (
+            day DATE NOT NULL,
+            category requestcategory NOT NULL,
+            opened INTEGER NOT NULL DEFAULT 0,
+            closed INTEGER NOT NULL DEFAULT 0,
+            reopened INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completion_seconds FLOAT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category)
+        )
+        """,
+        backfill_request_stats,
+    ]),
+    # Completion-time window for the weekly report
+    Migration(4, "completed_index", [
+        ConcurrentIndex(
+            "ix_service_requests_completed", "service_requests",
+            "(completed_at) INCLUDE (category, assigned_staff_id, created_at)",
+            where="completed_at IS NOT NULL"
+        ),
+    ], transactional=False),
+    # Weekly resolution-time sketches, built from the requests already completed
+    Migration(5, "resolution_sketches", [
+        """
+        CREATE TABLE IF NOT EXISTS resolution_sketch_bins (
+            week DATE NOT NULL,
+            category requestcategory NOT NULL,
+            bin INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (week, category, bin)
+        )
+        """,
+        backfill_resolution_sketches,
+    ]),
+]
@@ -0,0 +1,105 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Union
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from ..models.models import Base
+
+logger = logging.getLogger(__name__)
+
+# Any fixed number works, as long as every process that migrates uses the same one
+LOCK_KEY = 3110042
+
+Step = Union[str, "ConcurrentIndex", Callable[[AsyncConnection], Awaitable[None]]]
+
+@dataclass
+class ConcurrentIndex:
+    """CREATE INDEX CONCURRENTLY: built without blocking writes to the table"""
+    name: str
+    table: str
+    definition: str
+    where: str = ""
+
+    def sql(self) -> str:
+        sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} {self.definition}"
+        return f"{sql} WHERE {self.where}" if self.where else sql
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    steps: list[Step] = field(default_factory=list)
+    # CONCURRENTLY cannot run inside a transaction; such migrations run step by step,
+    # so every step must be safe to repeat after a crash halfway through
+    transactional: bool = True
+
+async def create_tables(conn: AsyncConnection):
+    await conn.run_sync(Base.metadata.create_all)
+
+async def _run_step(conn: AsyncConnection, step: Step):
+    if isinstance(step, ConcurrentIndex):
+        # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep forever
+        invalid = await conn.scalar(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": step.name})
+        if invalid:
+            await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {step.name}"))
+        await conn.execute(text(step.sql()))
+    elif isinstance(step, str):
+        await conn.execute(text(step))
+    else:
+        await step(conn)
+
+async def applied_versions(conn: AsyncConnection) -> set[int]:
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+async def upgrade(engine: AsyncEngine, migrations: list[Migration]) -> list[int]:
+    """Apply pending migrations in version order and return the versions applied.
+
+    A session-level advisory lock makes concurrent callers wait for each other,
+    so exactly one of them migrates and the rest find nothing left to do.
+    Other databases (SQLite in development and tests) just get create_all.
+    """
+    if engine.dialect.name != "postgresql":
+        async with engine.begin() as conn:
+            await create_tables(conn)
+        return []
+
+    applied = []
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            done = await applied_versions(lock_conn)
+            for migration in sorted(migrations, key=lambda m: m.version):
+                if migration.version in done:
+                    continue
+                logger.info("Applying migration %04d %s", migration.version, migration.name)
+                if migration.transactional:
+                    async with engine.begin() as conn:
+                        for step in migration.steps:
+                            await _run_step(conn, step)
+                        await _record(conn, migration)
+                else:
+                    for step in migration.steps:
+                        await _run_step(lock_conn, step)
+                    await _record(lock_conn, migration)
+                applied.append(migration.version)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+    return applied
+
+async def _record(conn: AsyncConnection, migration: Migration):
+    await conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name}
+    )
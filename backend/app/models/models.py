@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Enum as SQLEnum, Float
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Boolean, Enum as SQLEnum, Float, Index, JSON, bindparam
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -84,10 +85,105 @@ class ServiceRequest(Base):
     is_anonymous = Column(Boolean, default=False)
     estimated_completion_date = Column(DateTime(timezone=True), nullable=True)
     
+    # Activity counters, updated in the same transaction as the comment or attachment
+    # they count (see services/activity.py) so list pages never COUNT(*) child tables
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    public_comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    attachment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(DateTime(timezone=True), server_default=func.now())
+    
     # Relationships
     citizen = relationship("User", foreign_keys=[citizen_id], backref="submitted_requests")
     assigned_staff = relationship("User", foreign_keys=[assigned_staff_id], backref="assigned_requests")
 
+# Backs the "most recently active first" request listing
+Index(
+    "ix_service_requests_last_activity",
+    ServiceRequest.last_activity_at.desc(),
+    ServiceRequest.id.desc()
+)
+
+# Statuses still waiting on staff. Bound as literals, so the planner can match
+# queries using it against the partial indexes below
+OPEN_STATUSES = [RequestStatus.SUBMITTED, RequestStatus.UNDER_REVIEW, RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS]
+OPEN_REQUEST = ServiceRequest.status.in_(
+    bindparam("open_statuses", OPEN_STATUSES, expanding=True, literal_execute=True, type_=ServiceRequest.status.type)
+)
+
+# One index per request-list shape (see request_service.list_statements); each ends in
+# created_at DESC, id DESC so the page comes straight off the index without a sort
+Index("ix_service_requests_created", ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+Index("ix_service_requests_citizen_created", ServiceRequest.citizen_id, ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+Index("ix_service_requests_status_created", ServiceRequest.status, ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+Index("ix_service_requests_category_created", ServiceRequest.category, ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+Index("ix_service_requests_priority_created", ServiceRequest.priority, ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+Index("ix_service_requests_assigned_created", ServiceRequest.assigned_staff_id, ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+# The open queue, and a staff member's open work by priority
+Index(
+    "ix_service_requests_open_created",
+    ServiceRequest.created_at.desc(), ServiceRequest.id.desc(),
+    postgresql_where=OPEN_REQUEST, sqlite_where=OPEN_REQUEST
+)
+Index(
+    "ix_service_requests_open_assigned",
+    ServiceRequest.assigned_staff_id, ServiceRequest.priority, ServiceRequest.created_at.desc(),
+    postgresql_where=OPEN_REQUEST, sqlite_where=OPEN_REQUEST
+)
+# Requests completed in a time window (weekly report); on PostgreSQL the included
+# columns let the resolution-time aggregates run as index-only scans
+Index(
+    "ix_service_requests_completed",
+    ServiceRequest.completed_at,
+    postgresql_include=["category", "assigned_staff_id", "created_at"],
+    postgresql_where=ServiceRequest.completed_at.isnot(None),
+    sqlite_where=ServiceRequest.completed_at.isnot(None)
+)
+
+# Dashboard aggregates, kept current by services/request_stats.py in the same
+# transaction as every request write, so the dashboard never scans service_requests.
+# Requests per (status, category, priority): at most a few hundred rows
+class RequestCount(Base):
+    __tablename__ = "request_counts"
+    
+    status = Column(SQLEnum(RequestStatus), primary_key=True)
+    category = Column(SQLEnum(RequestCategory), primary_key=True)
+    priority = Column(SQLEnum(RequestPriority), primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Per-day, per-category flow: requests opened, closed and reopened, and completions
+# with their total time to completion (average = completion_seconds / completed)
+class RequestDailyStats(Base):
+    __tablename__ = "request_daily_stats"
+    
+    day = Column(Date, primary_key=True)
+    category = Column(SQLEnum(RequestCategory), primary_key=True)
+    opened = Column(Integer, nullable=False, default=0, server_default="0")
+    closed = Column(Integer, nullable=False, default=0, server_default="0")
+    reopened = Column(Integer, nullable=False, default=0, server_default="0")
+    completed = Column(Integer, nullable=False, default=0, server_default="0")
+    completion_seconds = Column(Float, nullable=False, default=0, server_default="0")
+
+# Resolution-time sketches (services/resolution_analytics.py): per completion week and
+# category, how many requests took a time falling in each DDSketch bin. Sketches merge
+# by adding bins, so any run of weeks is one SUM(count) ... GROUP BY bin
+class ResolutionSketchBin(Base):
+    __tablename__ = "resolution_sketch_bins"
+    
+    week = Column(Date, primary_key=True)
+    category = Column(SQLEnum(RequestCategory), primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+
+# Content-addressed file shared by every attachment with the same bytes
+class AttachmentBlob(Base):
+    __tablename__ = "attachment_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # Attachment Model
 class Attachment(Base):
     __tablename__ = "attachments"
@@ -99,6 +195,7 @@ class Attachment(Base):
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String, nullable=False)
     description = Column(Text, nullable=True)
+    content_hash = Column(String(64), ForeignKey("attachment_blobs.sha256"), nullable=True, index=True)
     
     # Security
     is_scanned = Column(Integer, default=0)  # 0=pending, 1=clean, 2=infected
@@ -134,16 +231,28 @@ class Comment(Base):
     # Relationships
     request = relationship("ServiceRequest", backref="comments")
     author = relationship("User", backref="comments")
+    
+    __table_args__ = (
+        # Serves the newest-first, keyset-paginated comment listing per request
+        Index("ix_comments_request_internal_created", "request_id", "is_internal", "created_at", "id"),
+    )
 
 class AuditEvent(Base):
+    # On PostgreSQL this is range-partitioned by month on created_at, with (id, created_at)
+    # as the primary key; see services/audit_partitions.py
     __tablename__ = "audit_events"
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        Index("ix_audit_events_actor_created", "actor_id", "created_at"),
+        Index("ix_audit_events_entity", "entity_type", "entity_id"),
+    )
+    id = Column(Integer, primary_key=True)
     actor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     action = Column(String, nullable=False)
     entity_type = Column(String, nullable=False)
     entity_id = Column(Integer, nullable=False)
-    details = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # JSONB on PostgreSQL (GIN-indexed for containment searches), JSON text elsewhere
+    details = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     actor = relationship("User")
 
 class GeoBoundary(Base):
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 from typing import Optional
 from datetime import datetime
+from ..services.image_variants import has_variants, variant_names
 
 class AttachmentBase(BaseModel):
     description: Optional[str] = None
@@ -27,6 +28,15 @@ class AttachmentInDB(AttachmentBase):
 class AttachmentResponse(AttachmentInDB):
     uploaded_by_name: Optional[str] = None
 
+    @computed_field
+    @property
+    def variants(self) -> dict[str, str]:
+        """URLs of resized, metadata-free copies of a clean image, keyed by variant name"""
+        if self.is_scanned != 1 or not has_variants(self.mime_type):
+            return {}
+        base = f"/api/requests/{self.request_id}/attachments/{self.id}/variants"
+        return {variant: f"{base}/{variant}" for variant in variant_names()}
+
 class AttachmentUploadResponse(BaseModel):
     message: str
     attachment: AttachmentResponse
\ No newline at end of file
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
-from ..models.request import RequestStatus, RequestPriority, RequestCategory
+from ..core.config import settings
+from ..models.models import RequestStatus, RequestPriority, RequestCategory
 
 class ServiceRequestBase(BaseModel):
     title: str = Field(..., min_length=3, max_length=200)
@@ -43,6 +44,8 @@ class ServiceRequestResponse(ServiceRequestInDB):
     assigned_staff_name: Optional[str] = None
     attachment_count: int = 0
     comment_count: int = 0
+    public_comment_count: int = 0
+    last_activity_at: Optional[datetime] = None
 
 class ServiceRequestList(BaseModel):
     items: List[ServiceRequestResponse]
@@ -53,8 +56,12 @@ class ServiceRequestList(BaseModel):
 
 class ServiceRequestFilter(BaseModel):
     status: Optional[RequestStatus] = None
+    open_only: bool = False
     category: Optional[RequestCategory] = None
     priority: Optional[RequestPriority] = None
     citizen_id: Optional[int] = None
     assigned_staff_id: Optional[int] = None
-    search: Optional[str] = None
\ No newline at end of file
+    search: Optional[str] = None
+
+class StatusBatch(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.status_batch_max)
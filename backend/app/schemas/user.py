@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime
-from ..models.user import UserRole
+from ..models.models import UserRole
 
 class UserBase(BaseModel):
     email: EmailStr
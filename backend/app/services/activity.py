@@ -0,0 +1,94 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import Attachment, Comment, ServiceRequest
+
+async def record_activity(
+    db: AsyncSession,
+    request_id: int,
+    comments: int = 0,
+    public_comments: int = 0,
+    attachments: int = 0,
+    touch: bool = True
+):
+    """Adjust a request's counters inside the caller's transaction.
+
+    Increments are applied in SQL (count = count + n), so concurrent writers
+    never lose each other's updates; the caller's commit makes them visible
+    together with the comment or attachment itself.
+    """
+    values = {}
+    if comments:
+        values["comment_count"] = ServiceRequest.comment_count + comments
+    if public_comments:
+        values["public_comment_count"] = ServiceRequest.public_comment_count + public_comments
+    if attachments:
+        values["attachment_count"] = ServiceRequest.attachment_count + attachments
+    if touch:
+        values["last_activity_at"] = func.now()
+    if values:
+        await db.execute(
+            update(ServiceRequest)
+            .where(ServiceRequest.id == request_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+
+async def repair_activity_counters(db: AsyncSession, batch_size: int = 1000) -> dict:
+    """Recount every request in id order, rewriting only the rows that drifted"""
+    comment_total = (
+        select(func.count(Comment.id)).where(Comment.request_id == ServiceRequest.id).scalar_subquery()
+    )
+    public_total = (
+        select(func.count(Comment.id))
+        .where(Comment.request_id == ServiceRequest.id, Comment.is_internal == False)
+        .scalar_subquery()
+    )
+    attachment_total = (
+        select(func.count(Attachment.id)).where(Attachment.request_id == ServiceRequest.id).scalar_subquery()
+    )
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(
+                ServiceRequest.id,
+                ServiceRequest.comment_count,
+                ServiceRequest.public_comment_count,
+                ServiceRequest.attachment_count,
+                ServiceRequest.last_activity_at,
+                comment_total.label("comments"),
+                public_total.label("public_comments"),
+                attachment_total.label("attachments")
+            )
+            .where(ServiceRequest.id > last_id)
+            .order_by(ServiceRequest.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        drifted = [
+            row.id for row in rows
+            if (row.comment_count, row.public_comment_count, row.attachment_count) != (row.comments, row.public_comments, row.attachments)
+            or row.last_activity_at is None
+        ]
+        if drifted:
+            # Recount inside the UPDATE so writes that landed since the read are included
+            await db.execute(
+                update(ServiceRequest)
+                .where(ServiceRequest.id.in_(drifted))
+                .values(
+                    comment_count=comment_total,
+                    public_comment_count=public_total,
+                    attachment_count=attachment_total,
+                    last_activity_at=func.coalesce(
+                        ServiceRequest.last_activity_at, ServiceRequest.updated_at, ServiceRequest.created_at
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        checked += len(rows)
+        repaired += len(drifted)
+        last_id = rows[-1].id
+    return {"checked": checked, "repaired": repaired}
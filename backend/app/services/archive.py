@@ -0,0 +1,61 @@
+import asyncio
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Callable
+
+# Formats that are already compressed; deflating them again only burns CPU
+COMPRESSED_TYPES = {
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "application/zip",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+@dataclass
+class ArchiveEntry:
+    name: str
+    size: int
+    modified: datetime
+    mime_type: str
+    open: Callable[[], AsyncIterator[bytes]]
+
+class _ChunkSink:
+    """Write-only file object. Having no tell()/seek(), zipfile treats it as a
+    pipe and writes sizes in data descriptors instead of seeking back."""
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+async def stream_zip(entries: list[ArchiveEntry]) -> AsyncIterator[bytes]:
+    """Yield a ZIP archive of entries piece by piece; memory use is one storage chunk, whatever the total size"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=entry.modified.timetuple()[:6])
+            stored = entry.mime_type in COMPRESSED_TYPES
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            # The size up front lets zipfile pick ZIP64 headers for very large entries
+            info.file_size = entry.size
+            with archive.open(info, mode="w") as member:
+                async for chunk in entry.open():
+                    if stored:
+                        member.write(chunk)
+                    else:
+                        await asyncio.to_thread(member.write, chunk)
+                    if sink.buffer:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # Central directory
@@ -1,125 +1,251 @@
-import os
-import uuid
-import mimetypes
+import asyncio
+import hashlib
+import logging
+from contextlib import AsyncExitStack
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
 from fastapi import UploadFile
-from aiofiles import open as aio_open
-from ..models.models import Attachment, ServiceRequest
+from ..models.models import Attachment, AttachmentBlob, ServiceRequest
 from ..core.config import settings
-import clamd
+from .clamav import clamav_client
+from .scan_queue import scan_queue
+from .file_types import SNIFF_BYTES, detect_mime_type, file_extension
+from .resumable_uploads import UploadConflict, UploadSession, upload_store
+from .image_variants import has_variants, parse_variant, render_variant, variant_key, variant_names
+from .storage import StorageBackend, storage
+from .archive import ArchiveEntry
+from .activity import record_activity
+from ..celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+QUARANTINE_PREFIX = "quarantine/"
 
 class AttachmentService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, storage_backend: Optional[StorageBackend] = None):
         self.db = db
-        self.upload_dir = Path("/app/uploads")
-        self.upload_dir.mkdir(exist_ok=True)
-        self.clamav = None
-    
-    async def _get_clamav_connection(self):
-        """Get ClamAV connection"""
-        if not self.clamav:
-            try:
-                self.clamav = clamd.ClamdNetworkSocket(
-                    host=settings.clamav_host,
-                    port=settings.clamav_port
-                )
-            except Exception:
-                self.clamav = None
-        return self.clamav
-    
+        self.storage = storage_backend or storage
+        self.clamav = clamav_client
+        self.scan_queue = scan_queue
+        self.uploads = upload_store
+
+    async def _defer_scan(self) -> bool:
+        """Whether this upload should leave scanning to the background scan workers"""
+        if settings.attachment_scan_mode != "background":
+            return False
+        if await self.scan_queue.has_capacity():
+            return True
+        # Queue is full (or Redis is down): scan inline so uploads slow down instead of piling up
+        try:
+            await self.scan_queue.record(inline_fallback=1)
+        except Exception:
+            pass
+        return False
+
+    async def _queue_scan(self, attachment: Attachment):
+        try:
+            depth = await self.scan_queue.enqueue(attachment.id)
+            # One worker task per batch of queued uploads lets the scan pool work in parallel
+            if (depth - 1) % settings.scan_batch_size == 0:
+                await asyncio.to_thread(celery_app.send_task, "app.tasks.scanning.scan_batch")
+        except Exception:
+            pass  # Stays pending; the periodic sweep re-queues it
+
+    async def _queue_variants(self, attachment: Attachment):
+        if attachment.is_scanned != 1 or not has_variants(attachment.mime_type):
+            return
+        try:
+            await asyncio.to_thread(
+                celery_app.send_task, "app.tasks.images.generate_variants", args=[attachment.id]
+            )
+        except Exception:
+            pass  # Variants are also rendered on first request
+
     def _validate_file(self, filename: str, file_size: int) -> bool:
         """Validate file type and size"""
         if file_size > settings.max_file_size:
             return False
         
-        file_extension = Path(filename).suffix.lower().lstrip('.')
-        if file_extension not in settings.allowed_file_types:
+        if file_extension(filename) not in settings.allowed_file_types:
             return False
         
         return True
     
-    async def _scan_file(self, file_path: Path) -> tuple[int, Optional[str]]:
-        """Scan file with ClamAV"""
+    async def _scan_file(self, key: str) -> tuple[int, Optional[str]]:
+        """Scan a stored file with ClamAV by streaming it over INSTREAM"""
         try:
-            clamav = await self._get_clamav_connection()
-            if not clamav:
-                return 0, "Scanner unavailable"  # Mark as pending if scanner unavailable
-            
-            scan_result = clamav.scan(str(file_path))
-            file_key = str(file_path)
-            
-            if file_key in scan_result:
-                result = scan_result[file_key]
-                if result[0] == "OK":
-                    return 1, "Clean"  # Clean
-                elif result[0] == "FOUND":
-                    return 2, result[1]  # Infected
-            
-            return 0, "Scan failed"  # Pending
-            
+            async with self.clamav.stream() as scan:
+                async for chunk in self.storage.iter_chunks(key, chunk_size=CHUNK_SIZE):
+                    await scan.send(chunk)
+                return await scan.result()
         except Exception as e:
             return 0, f"Scan error: {str(e)}"  # Pending on error
     
-    async def save_attachment(
-        self, 
-        file_content: bytes, 
-        original_filename: str, 
-        request_id: int, 
-        uploaded_by_id: int,
-        description: Optional[str] = None
-    ) -> Attachment:
-        
-        # Validate request exists
+    async def _ensure_request_exists(self, request_id: int):
         request_result = await self.db.execute(
             select(ServiceRequest).where(ServiceRequest.id == request_id)
         )
         if not request_result.scalar_one_or_none():
             raise ValueError("Request not found")
+    
+    async def _store_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        original_filename: str,
+        request_id: int,
+        uploaded_by_id: int,
+        description: Optional[str] = None
+    ) -> Attachment:
+        """Validate, write and scan an upload chunk by chunk, then record it.
+
+        Bad extensions are rejected before anything is read, disguised files
+        after the first chunk, and oversize files as soon as they cross
+        max_file_size, so rejected uploads cost almost no disk I/O.
+        """
+        if file_extension(original_filename) not in settings.allowed_file_types:
+            raise ValueError("File type not allowed")
         
-        # Validate file
-        file_size = len(file_content)
-        if not self._validate_file(original_filename, file_size):
-            raise ValueError("Invalid file type or size")
-        
-        # Generate unique filename
-        file_extension = Path(original_filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = self.upload_dir / unique_filename
-        
-        # Save file
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        
-        # Get MIME type
-        mime_type, _ = mimetypes.guess_type(original_filename)
+        chunks = aiter(chunks)
+        chunk = await anext(chunks, b"")
+        if not chunk:
+            raise ValueError("File is empty")
+        mime_type = detect_mime_type(original_filename, chunk[:SNIFF_BYTES])
         if not mime_type:
-            mime_type = "application/octet-stream"
+            raise ValueError("File content does not match its extension")
+        
+        writer = self.storage.open_writer()
+        hasher = hashlib.sha256()
+        size = 0
+        deferred = await self._defer_scan()
+        is_scanned, scan_result = 0, "Queued"
+        try:
+            # Each chunk goes to disk and to clamd concurrently, so the upload costs
+            # max(write, scan) instead of write + scan
+            async with AsyncExitStack() as stack:
+                scan = None if deferred else await stack.enter_async_context(self.clamav.stream())
+                while chunk:
+                    size += len(chunk)
+                    if size > settings.max_file_size:
+                        raise ValueError("File exceeds the maximum upload size")
+                    hasher.update(chunk)
+                    if scan:
+                        await asyncio.gather(writer.write(chunk), scan.send(chunk))
+                    else:
+                        await writer.write(chunk)
+                    chunk = await anext(chunks, b"")
+                if scan:
+                    is_scanned, scan_result = await scan.result()
+            digest = hasher.hexdigest()
+            key, created = await self._register_blob(digest, writer, size)
+        except BaseException:
+            await writer.abort()
+            raise
         
-        # Scan file
-        is_scanned, scan_result = await self._scan_file(file_path)
+        if deferred and not created:
+            # Same bytes were uploaded before; reuse their verdict instead of scanning again
+            verdict = await self._known_verdict(digest)
+            if verdict:
+                deferred = False
+                is_scanned, scan_result = verdict
         
-        # Create attachment record
         attachment = Attachment(
-            filename=unique_filename,
+            filename=f"{digest}{Path(original_filename).suffix.lower()}",
             original_filename=original_filename,
-            file_path=str(file_path),
-            file_size=file_size,
+            file_path=key,
+            file_size=size,
             mime_type=mime_type,
             description=description,
+            content_hash=digest,
             is_scanned=is_scanned,
             scan_result=scan_result,
             request_id=request_id,
             uploaded_by_id=uploaded_by_id
         )
-        
         self.db.add(attachment)
-        await self.db.commit()
+        try:
+            if is_scanned == 2 and not key.startswith(QUARANTINE_PREFIX):
+                # Scanned inline: quarantine it, and every attachment sharing the blob, like a scan worker would
+                await self.apply_scan_result(attachment, is_scanned, scan_result)
+            await record_activity(self.db, request_id, attachments=1)
+            await self.db.commit()
+        except BaseException:
+            await self.db.rollback()
+            if created:
+                try:
+                    await self.storage.delete(attachment.file_path)  # Nothing references the new blob
+                except Exception:
+                    logger.warning("Could not delete unreferenced blob %s", attachment.file_path, exc_info=True)
+            raise
         await self.db.refresh(attachment)
-        
+        if deferred:
+            await self._queue_scan(attachment)
+        else:
+            await self._queue_variants(attachment)
         return attachment
+    
+    def _blob_key(self, digest: str) -> str:
+        """Sharded location ab/cd/<sha256> keeps every directory small"""
+        return f"{digest[:2]}/{digest[2:4]}/{digest}"
+    
+    async def _register_blob(self, digest: str, writer, size: int) -> tuple[str, bool]:
+        """Take a reference on the blob for digest, storing the upload only if it is new"""
+        blob_key = self._blob_key(digest)
+        for _ in range(2):
+            result = await self.db.execute(
+                update(AttachmentBlob)
+                .where(AttachmentBlob.sha256 == digest)
+                .values(ref_count=AttachmentBlob.ref_count + 1)
+                .returning(AttachmentBlob.file_path)
+            )
+            existing_key = result.scalar_one_or_none()
+            if existing_key is not None:
+                # Discards our copy, or restores the stored one if it went missing
+                await writer.commit(existing_key)
+                return existing_key, False
+            await writer.commit(blob_key)
+            try:
+                async with self.db.begin_nested():
+                    self.db.add(AttachmentBlob(sha256=digest, file_path=blob_key, file_size=size, ref_count=1))
+            except IntegrityError:
+                # A concurrent upload of the same bytes created the row first; take a reference on it
+                continue
+            return blob_key, True
+        raise ValueError("Could not store attachment")
+    
+    async def _known_verdict(self, digest: str) -> Optional[tuple[int, Optional[str]]]:
+        result = await self.db.execute(
+            select(Attachment.is_scanned, Attachment.scan_result)
+            .where(Attachment.content_hash == digest, Attachment.is_scanned != 0)
+            .limit(1)
+        )
+        row = result.first()
+        return (row.is_scanned, row.scan_result) if row else None
+    
+    async def save_attachment(
+        self, 
+        file_content: bytes, 
+        original_filename: str, 
+        request_id: int, 
+        uploaded_by_id: int,
+        description: Optional[str] = None
+    ) -> Attachment:
+        
+        # Validate request exists
+        await self._ensure_request_exists(request_id)
+        
+        # Validate file
+        if not self._validate_file(original_filename, len(file_content)):
+            raise ValueError("Invalid file type or size")
+        
+        async def chunks():
+            for offset in range(0, len(file_content), CHUNK_SIZE):
+                yield file_content[offset:offset + CHUNK_SIZE]
+        
+        return await self._store_stream(chunks(), original_filename, request_id, uploaded_by_id, description)
 
     async def save_uploadfile(
         self,
@@ -128,44 +254,134 @@ class AttachmentService:
         uploaded_by_id: int,
         description: Optional[str] = None
     ) -> Attachment:
-        request_result = await self.db.execute(select(ServiceRequest).where(ServiceRequest.id == request_id))
-        if not request_result.scalar_one_or_none():
-            raise ValueError("Request not found")
-        original_filename = upload.filename
-        unique_filename = f"{uuid.uuid4()}{Path(original_filename).suffix}"
-        file_path = self.upload_dir / unique_filename
-        size = 0
-        async with aio_open(file_path, "wb") as f:
+        await self._ensure_request_exists(request_id)
+        # The multipart parser may already know the size; reject before reading a byte
+        if upload.size is not None and upload.size > settings.max_file_size:
+            raise ValueError("File exceeds the maximum upload size")
+        
+        async def chunks():
             while True:
-                chunk = await upload.read(1024 * 1024)
+                chunk = await upload.read(CHUNK_SIZE)
                 if not chunk:
                     break
-                size += len(chunk)
-                await f.write(chunk)
-        if not self._validate_file(original_filename, size):
-            file_path.unlink(missing_ok=True)
+                yield chunk
+        
+        return await self._store_stream(chunks(), upload.filename, request_id, uploaded_by_id, description)
+    
+    async def create_upload(
+        self,
+        request_id: int,
+        uploaded_by_id: int,
+        original_filename: str,
+        length: int,
+        description: Optional[str] = None
+    ) -> UploadSession:
+        """Start a resumable upload; the declared size and type are checked before any bytes arrive"""
+        await self._ensure_request_exists(request_id)
+        if length <= 0:
+            raise ValueError("File is empty")
+        if not self._validate_file(original_filename, length):
             raise ValueError("Invalid file type or size")
-        mime_type, _ = mimetypes.guess_type(original_filename)
-        if not mime_type:
-            mime_type = "application/octet-stream"
-        is_scanned, scan_result = await self._scan_file(file_path)
-        attachment = Attachment(
-            filename=unique_filename,
-            original_filename=original_filename,
-            file_path=str(file_path),
-            file_size=size,
-            mime_type=mime_type,
-            description=description,
-            is_scanned=is_scanned,
-            scan_result=scan_result,
-            request_id=request_id,
-            uploaded_by_id=uploaded_by_id
-        )
-        self.db.add(attachment)
-        await self.db.commit()
-        await self.db.refresh(attachment)
+        return await self.uploads.create(request_id, uploaded_by_id, original_filename, length, description)
+    
+    async def finalize_upload(self, session: UploadSession) -> Attachment:
+        """Scan and record a fully received resumable upload"""
+        async with self.uploads.locked(session.id):
+            session = await self.uploads.get(session.id)
+            if not session:
+                raise UploadConflict("Upload was already finalized")
+            if not session.complete:
+                raise UploadConflict("Upload is not complete")
+            try:
+                attachment = await self._store_stream(
+                    self.uploads.iter_chunks(session, CHUNK_SIZE),
+                    session.filename,
+                    session.request_id,
+                    session.user_id,
+                    session.description
+                )
+            except ValueError:
+                await self.uploads.delete(session.id)  # The content was rejected; resending won't help
+                raise
+            await self.uploads.delete(session.id)
         return attachment
     
+    async def apply_scan_result(self, attachment: Attachment, is_scanned: int, scan_result: Optional[str]):
+        """Record a scan verdict, moving infected files out of the upload directory"""
+        if is_scanned == 2:
+            target = f"{QUARANTINE_PREFIX}{attachment.content_hash or Path(attachment.file_path).name}"
+            try:
+                await self.storage.move(attachment.file_path, target)
+            except (FileNotFoundError, KeyError):
+                target = None
+            if attachment.content_hash:
+                # Every attachment sharing the blob carries the same bytes, so all of them are infected
+                blob_update = update(AttachmentBlob).where(AttachmentBlob.sha256 == attachment.content_hash)
+                siblings = update(Attachment).where(Attachment.content_hash == attachment.content_hash)
+                if target:
+                    await self.db.execute(blob_update.values(file_path=target))
+                    siblings = siblings.values(file_path=target)
+                await self.db.execute(
+                    siblings.values(is_scanned=is_scanned, scan_result=scan_result)
+                    .execution_options(synchronize_session=False)
+                )
+            if target:
+                attachment.file_path = target
+        attachment.is_scanned = is_scanned
+        attachment.scan_result = scan_result
+    
+    async def get_variant(self, attachment: Attachment, variant: str) -> Optional[str]:
+        """Storage key of an image variant such as "thumb.webp", rendering it on first use"""
+        spec = parse_variant(variant)
+        if not spec or attachment.is_scanned != 1 or not has_variants(attachment.mime_type):
+            return None
+        key = variant_key(attachment.file_path, variant)
+        if not await self.storage.exists(key):
+            await self._store_variant(await self._read(attachment.file_path), key, *spec)
+        return key
+    
+    async def generate_variants(self, attachment: Attachment) -> int:
+        """Render every missing variant of a clean image, reading the original only once"""
+        if attachment.is_scanned != 1 or not has_variants(attachment.mime_type):
+            return 0
+        data = None
+        created = 0
+        for variant in variant_names():
+            key = variant_key(attachment.file_path, variant)
+            if await self.storage.exists(key):
+                continue
+            if data is None:
+                data = await self._read(attachment.file_path)
+            await self._store_variant(data, key, *parse_variant(variant))
+            created += 1
+        return created
+    
+    async def _read(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.storage.iter_chunks(key, chunk_size=CHUNK_SIZE)])
+    
+    async def _store_variant(self, data: bytes, key: str, max_edge: int, fmt: str):
+        try:
+            # Decoding and resizing is CPU-bound; keep it off the event loop
+            rendered = await asyncio.to_thread(render_variant, data, max_edge, fmt)
+        except (ValueError, OSError) as e:
+            raise ValueError("Could not create image variant") from e
+        writer = self.storage.open_writer()
+        try:
+            await writer.write(rendered)
+            await writer.commit(key)  # False when a concurrent request stored it first; same bytes either way
+        except BaseException:
+            await writer.abort()
+            raise
+    
+    async def get_pending_scan_ids(self, limit: int = 1000) -> list[int]:
+        result = await self.db.execute(
+            select(Attachment.id)
+            .where(Attachment.is_scanned == 0, Attachment.scan_result.is_distinct_from("File missing"))
+            .order_by(Attachment.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
     async def get_attachment_by_id(self, attachment_id: int) -> Optional[Attachment]:
         result = await self.db.execute(
             select(Attachment).where(Attachment.id == attachment_id)
@@ -178,20 +394,67 @@ class AttachmentService:
         )
         return list(result.scalars().all())
     
+    async def get_archive_entries(self, request_id: int) -> list[ArchiveEntry]:
+        """ZIP entries for every scanned-clean attachment of a request, with unique, path-free names"""
+        entries = []
+        used_names = set()
+        for attachment in await self.get_attachments_by_request(request_id):
+            if attachment.is_scanned != 1 or not await self.storage.exists(attachment.file_path):
+                continue
+            original = Path(attachment.original_filename).name or attachment.filename
+            name, counter = original, 1
+            while name.lower() in used_names:
+                counter += 1
+                name = f"{Path(original).stem} ({counter}){Path(original).suffix}"
+            used_names.add(name.lower())
+            entries.append(ArchiveEntry(
+                name=name,
+                size=attachment.file_size,
+                modified=attachment.created_at,
+                mime_type=attachment.mime_type,
+                open=lambda key=attachment.file_path: self.storage.iter_chunks(key, chunk_size=CHUNK_SIZE)
+            ))
+        return entries
+    
     async def delete_attachment(self, attachment_id: int) -> bool:
         attachment = await self.get_attachment_by_id(attachment_id)
         if not attachment:
             return False
         
-        # Delete physical file
-        try:
-            file_path = Path(attachment.file_path)
-            if file_path.exists():
-                file_path.unlink()
-        except Exception:
-            pass  # Don't fail if file deletion fails
-        
-        # Delete database record
+        # The attachment row references the blob row, so it has to go first
         await self.db.delete(attachment)
+        await self.db.flush()
+        await record_activity(self.db, attachment.request_id, attachments=-1, touch=False)
+        
+        if not attachment.content_hash:
+            await self.db.commit()
+            await self._delete_files(attachment.file_path, attachment.mime_type)
+            return True
+        
+        # Drop our reference; the file only goes away with the last one
+        result = await self.db.execute(
+            update(AttachmentBlob)
+            .where(AttachmentBlob.sha256 == attachment.content_hash)
+            .values(ref_count=AttachmentBlob.ref_count - 1)
+            .returning(AttachmentBlob.ref_count, AttachmentBlob.file_path)
+        )
+        blob = result.first()
+        if blob and blob.ref_count <= 0:
+            await self.db.execute(delete(AttachmentBlob).where(AttachmentBlob.sha256 == attachment.content_hash))
+            # Unlink while this transaction still holds the blob row: an upload of the same
+            # bytes waits on it in _register_blob, then finds no row and stores its own copy,
+            # so it can never be registered against the file being removed here
+            await self._delete_files(blob.file_path, attachment.mime_type)
         await self.db.commit()
         return True
+    
+    async def _delete_files(self, key: str, mime_type: str):
+        keys = [key]
+        if has_variants(mime_type):
+            keys += [variant_key(key, variant) for variant in variant_names()]
+        for path in keys:
+            try:
+                await self.storage.delete(path)
+            except Exception:
+                # Don't fail the request; storage reconciliation removes the orphan later
+                logger.warning("Could not delete attachment file %s", path, exc_info=True)
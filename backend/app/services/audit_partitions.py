@@ -0,0 +1,200 @@
+import gzip
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^audit_events_(\d{4})_(\d{2})$")
+
+# Turns the plain audit_events table that create_all makes (or an older release left
+# behind) into a table partitioned by month, copying existing rows into it. Runs once:
+# afterwards the table is already partitioned and the block does nothing.
+PARTITION_AUDIT_EVENTS = """
+DO $$
+DECLARE
+    month timestamptz;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'audit_events'::regclass) THEN
+        RETURN;
+    END IF;
+    DROP INDEX IF EXISTS ix_audit_events_id;
+    DROP INDEX IF EXISTS ix_audit_events_actor_created;
+    DROP INDEX IF EXISTS ix_audit_events_entity;
+    ALTER TABLE audit_events RENAME TO audit_events_unpartitioned;
+    ALTER TABLE audit_events_unpartitioned RENAME CONSTRAINT audit_events_pkey TO audit_events_unpartitioned_pkey;
+    CREATE TABLE audit_events (
+        id INTEGER NOT NULL DEFAULT nextval('audit_events_id_seq'),
+        actor_id INTEGER NOT NULL REFERENCES users (id),
+        action VARCHAR NOT NULL,
+        entity_type VARCHAR NOT NULL,
+        entity_id INTEGER NOT NULL,
+        details JSONB,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+    ALTER SEQUENCE audit_events_id_seq OWNED BY audit_events.id;
+    -- Catches rows outside every monthly partition rather than failing the insert
+    CREATE TABLE audit_events_default PARTITION OF audit_events DEFAULT;
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE((SELECT min(created_at) FROM audit_events_unpartitioned), now()), 'UTC'),
+            date_trunc('month', now(), 'UTC') + interval '3 months',
+            interval '1 month'
+        )
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF audit_events FOR VALUES FROM (%L) TO (%L)',
+            'audit_events_' || to_char(month AT TIME ZONE 'UTC', 'YYYY_MM'),
+            month,
+            month + interval '1 month'
+        );
+    END LOOP;
+    INSERT INTO audit_events (id, actor_id, action, entity_type, entity_id, details, created_at)
+    SELECT id, actor_id, action, entity_type, entity_id, details::jsonb, COALESCE(created_at, now())
+    FROM audit_events_unpartitioned;
+    DROP TABLE audit_events_unpartitioned;
+END $$
+"""
+
+def partition_name(month: datetime) -> str:
+    return f"audit_events_{month.year:04d}_{month.month:02d}"
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+@dataclass
+class AuditPartition:
+    name: str
+    month: datetime
+    attached: bool
+
+class AuditPartitionManager:
+    """Monthly audit_events partitions: created ahead of time, and once past the
+    retention period detached, written to gzipped NDJSON under archive_dir and dropped.
+
+    A partition is only dropped after its archive file is fully written and
+    synced, so a run that dies halfway leaves a detached table that the next
+    run archives again.
+    """
+    def __init__(
+        self,
+        db: AsyncSession,
+        archive_dir: str = settings.audit_archive_dir,
+        retention_months: int = settings.audit_retention_months
+    ):
+        self.db = db
+        self.archive_dir = Path(archive_dir)
+        self.retention_months = retention_months
+
+    async def partitions(self) -> list[AuditPartition]:
+        result = await self.db.execute(text("""
+            SELECT c.relname, c.relispartition
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r' AND n.nspname = current_schema() AND c.relname LIKE 'audit\\_events\\_%'
+        """))
+        partitions = []
+        for name, attached in result.all():
+            match = PARTITION_NAME.match(name)
+            if match:
+                month = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+                partitions.append(AuditPartition(name, month, attached))
+        return sorted(partitions, key=lambda partition: partition.month)
+
+    async def ensure_partitions(self, months_ahead: int = settings.audit_partition_months_ahead, now: Optional[datetime] = None) -> list[str]:
+        """Create any missing partition from this month through months_ahead"""
+        existing = {partition.name for partition in await self.partitions()}
+        current = _month_start(now or datetime.now(timezone.utc))
+        created = []
+        for offset in range(months_ahead + 1):
+            month = _add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            await self._create_partition(name, month)
+            created.append(name)
+        return created
+
+    async def _create_partition(self, name: str, month: datetime):
+        """Create one monthly partition, moving in any of its rows that landed in the default partition.
+
+        PostgreSQL refuses to create a partition whose range already has rows in
+        the default one, so those are moved across with the default detached, all
+        in one transaction. Anything else going wrong is raised, not skipped.
+        """
+        bounds = {"start": month, "end": _add_months(month, 1)}
+        create = text(
+            f'CREATE TABLE "{name}" PARTITION OF audit_events '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{bounds['end'].isoformat()}')"
+        )
+        stranded = await self.db.scalar(text(
+            "SELECT EXISTS (SELECT 1 FROM audit_events_default WHERE created_at >= :start AND created_at < :end)"
+        ), bounds)
+        try:
+            if not stranded:
+                await self.db.execute(create)
+            else:
+                await self.db.execute(text("ALTER TABLE audit_events DETACH PARTITION audit_events_default"))
+                await self.db.execute(create)
+                moved = await self.db.execute(text(
+                    f'INSERT INTO "{name}" SELECT * FROM audit_events_default '
+                    "WHERE created_at >= :start AND created_at < :end"
+                ), bounds)
+                await self.db.execute(text(
+                    "DELETE FROM audit_events_default WHERE created_at >= :start AND created_at < :end"
+                ), bounds)
+                await self.db.execute(text("ALTER TABLE audit_events ATTACH PARTITION audit_events_default DEFAULT"))
+                logger.info("Moved %d audit event(s) from the default partition into %s", moved.rowcount, name)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def apply_retention(self, now: Optional[datetime] = None) -> list[str]:
+        """Archive and drop partitions that end before the retention window; returns the archive files"""
+        if self.retention_months <= 0:
+            return []
+        cutoff = _add_months(_month_start(now or datetime.now(timezone.utc)), -self.retention_months)
+        archived = []
+        for partition in await self.partitions():
+            if partition.month >= cutoff:
+                continue
+            if partition.attached:
+                await self.db.execute(text(f'ALTER TABLE audit_events DETACH PARTITION "{partition.name}"'))
+                await self.db.commit()
+            path = await self._archive(partition.name)
+            await self.db.execute(text(f'DROP TABLE "{partition.name}"'))
+            await self.db.commit()
+            logger.info("Archived audit partition %s to %s", partition.name, path)
+            archived.append(str(path))
+        return archived
+
+    async def _archive(self, name: str) -> Path:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        path = self.archive_dir / f"{name}.ndjson.gz"
+        partial = path.with_name(path.name + ".partial")
+        rows = await self.db.stream(
+            text(f'SELECT * FROM "{name}" ORDER BY created_at, id').execution_options(yield_per=1000)
+        )
+        with open(partial, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as out:
+                async for row in rows.mappings():
+                    out.write(json.dumps(dict(row), default=str).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        await rows.close()
+        partial.replace(path)
+        return path
@@ -1,20 +1,220 @@
+import asyncio
 import json
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import desc, func, insert, select, tuple_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
 from ..models.models import AuditEvent
+from .pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+DETAIL_KEY = re.compile(r"^\w+$")
+
+class AuditBuffer:
+    """Holds audit rows in memory and writes them with multi-row INSERTs.
+
+    A batch goes out once batch_size events are waiting or flush_interval
+    seconds have passed. Events leave the buffer only after their INSERT has
+    committed, so a failed write keeps them for the next attempt.
+
+    Buffered mode is best-effort. Nothing is spooled to disk: events that
+    arrived since the last flush are lost if the process is killed outright
+    (shutdown flushes the rest). Once max_pending are waiting, log() waits up
+    to flush_timeout for the flusher to make room, then drops the event with
+    an error log rather than failing or stalling the change it records.
+    Use "transactional" mode where every event must survive.
+    """
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        batch_size: int = settings.audit_batch_size,
+        flush_interval: float = settings.audit_flush_interval,
+        max_pending: int = settings.audit_max_pending,
+        flush_timeout: float = settings.audit_flush_timeout
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.flush_timeout = flush_timeout
+        self.pending: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._progress = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def add(self, row: dict):
+        if len(self.pending) >= self.max_pending and not await self._make_room():
+            logger.error("Audit buffer full; dropping event: %s", row)
+            return
+        self.pending.append(row)
+        self.ensure_flusher()
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _make_room(self) -> bool:
+        """Wake the flusher and wait at most flush_timeout for it to get below max_pending"""
+        self.ensure_flusher()
+        self._wakeup.set()
+        try:
+            async with self._progress:
+                await asyncio.wait_for(
+                    self._progress.wait_for(lambda: len(self.pending) < self.max_pending), self.flush_timeout
+                )
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Audit flush failed; %d event(s) kept for retry", len(self.pending), exc_info=True)
+
+    async def flush(self) -> int:
+        """Write everything pending, batch_size rows per INSERT"""
+        written = 0
+        async with self._lock:
+            while self.pending:
+                batch = self.pending[:self.batch_size]
+                async with self.session_factory() as db:
+                    written += await self._write(db, batch)
+                # Rows logged during the INSERT were appended after the batch, so this drops exactly the batch
+                del self.pending[:len(batch)]
+                async with self._progress:
+                    self._progress.notify_all()
+        return written
+
+    async def _write(self, db: AsyncSession, rows: list[dict]) -> int:
+        try:
+            await db.execute(insert(AuditEvent), rows)
+            await db.commit()
+            return len(rows)
+        except IntegrityError:
+            await db.rollback()
+        # One bad row (e.g. a deleted actor) must not hold the rest back forever
+        written = 0
+        for row in rows:
+            try:
+                await db.execute(insert(AuditEvent), [row])
+                await db.commit()
+                written += 1
+            except IntegrityError:
+                await db.rollback()
+                logger.error("Dropping audit event rejected by the database: %s", row)
+        return written
+
+    async def close(self):
+        """Stop the background flusher and write whatever is still pending"""
+        self._closing = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            await self._flusher
+        try:
+            await self.flush()
+        except Exception:
+            logger.error("Could not write %d audit event(s) on shutdown", len(self.pending), exc_info=True)
+
+audit_buffer = AuditBuffer()
 
 class AuditService:
-    def __init__(self, db: AsyncSession):
+    """Records who did what.
+
+    In "transactional" mode the event is added to the caller's session and
+    commits (or rolls back) with the change it describes. In "buffered" mode
+    it is handed to audit_buffer and written in a later batch, off the
+    request's own transaction.
+    """
+    def __init__(self, db: AsyncSession, mode: Optional[str] = None, buffer: Optional[AuditBuffer] = None):
         self.db = db
+        self.mode = mode or settings.audit_mode
+        self.buffer = buffer or audit_buffer
 
-    async def log(self, actor_id: int, action: str, entity_type: str, entity_id: int, metadata: dict | None = None) -> AuditEvent:
-        event = AuditEvent(
-            actor_id=actor_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            details=json.dumps(metadata or {})
-        )
+    async def log(self, actor_id: int, action: str, entity_type: str, entity_id: int, metadata: dict | None = None) -> Optional[AuditEvent]:
+        row = {
+            "actor_id": actor_id,
+            "action": action,
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            # Round-trip so enums and datetimes are stored the way they serialize
+            "details": json.loads(json.dumps(metadata or {}, default=str)),
+            # Stamped now, not at flush time, so buffered events keep their real order
+            "created_at": datetime.now(timezone.utc),
+        }
+        if self.mode == "buffered":
+            await self.buffer.add(row)
+            return None
+        event = AuditEvent(**row)
         self.db.add(event)
-        await self.db.commit()
-        await self.db.refresh(event)
         return event
+
+    async def search(
+        self,
+        actor_id: Optional[int] = None,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[int] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        details: Optional[dict] = None
+    ) -> tuple[list[AuditEvent], Optional[str]]:
+        """Newest-first page of events and the cursor for the next one (None on the last page).
+
+        details matches events whose details hold every given key with that
+        value. A since/until range lets PostgreSQL skip whole monthly partitions.
+        """
+        query = select(AuditEvent)
+        if actor_id is not None:
+            query = query.where(AuditEvent.actor_id == actor_id)
+        if entity_type:
+            query = query.where(AuditEvent.entity_type == entity_type)
+        if entity_id is not None:
+            query = query.where(AuditEvent.entity_id == entity_id)
+        if action:
+            query = query.where(AuditEvent.action == action)
+        if since:
+            query = query.where(AuditEvent.created_at >= since)
+        if until:
+            query = query.where(AuditEvent.created_at < until)
+        if details:
+            query = query.where(*self._details_filter(details))
+        if cursor:
+            created_at, event_id = decode_cursor(cursor)
+            query = query.where(tuple_(AuditEvent.created_at, AuditEvent.id) < tuple_(created_at, event_id))
+        query = query.order_by(desc(AuditEvent.created_at), desc(AuditEvent.id)).limit(limit + 1)
+        
+        result = await self.db.execute(query)
+        events = list(result.scalars().all())
+        if len(events) <= limit:
+            return events, None
+        events = events[:limit]
+        return events, encode_cursor(events[-1])
+
+    def _details_filter(self, details: dict) -> list:
+        for key in details:
+            if not DETAIL_KEY.match(key):
+                raise ValueError(f"Invalid detail key: {key}")
+        if self.db.bind.dialect.name == "postgresql":
+            # Containment, so the GIN index on details does the work
+            return [type_coerce(AuditEvent.details, JSONB).contains(details)]
+        return [func.json_extract(AuditEvent.details, f"$.{key}") == value for key, value in details.items()]
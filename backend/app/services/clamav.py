@@ -0,0 +1,149 @@
+import asyncio
+import struct
+import time
+from typing import Optional
+from ..core.config import settings
+
+class _Session:
+    """A clamd IDSESSION connection that can carry several INSTREAM scans"""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            if not self.writer.is_closing():
+                self.writer.write(b"zEND\0")
+            self.writer.close()
+        except Exception:
+            pass
+
+class ClamAVClient:
+    """Async clamd client that streams data over INSTREAM using pooled sessions"""
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        pool_size: int = 4,
+        connect_timeout: float = 2.0,
+        timeout: float = 30.0,
+        idle_timeout: float = 20.0
+    ):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        # Must stay below clamd's IdleTimeout, otherwise we hand out sessions clamd already closed
+        self.idle_timeout = idle_timeout
+        self._idle: list[_Session] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        return self._slots
+
+    async def _checkout(self) -> _Session:
+        while self._idle:
+            session = self._idle.pop()
+            if time.monotonic() - session.last_used < self.idle_timeout and not session.writer.is_closing():
+                return session
+            session.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.connect_timeout
+        )
+        writer.write(b"zIDSESSION\0")
+        return _Session(reader, writer)
+
+    def _checkin(self, session: _Session, reusable: bool):
+        if reusable and len(self._idle) < self.pool_size:
+            session.last_used = time.monotonic()
+            self._idle.append(session)
+        else:
+            session.close()
+
+    def stream(self) -> "InstreamScan":
+        """Start a scan; feed it with send() and finish with result()"""
+        return InstreamScan(self)
+
+    async def scan_bytes(self, data: bytes, chunk_size: int = 1024 * 1024) -> tuple[int, Optional[str]]:
+        async with self.stream() as scan:
+            for offset in range(0, len(data), chunk_size):
+                await scan.send(data[offset:offset + chunk_size])
+            return await scan.result()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+class InstreamScan:
+    """A single INSTREAM scan.
+
+    Failures never raise out of send(): the upload keeps going and result()
+    reports the scan as pending, matching how an unavailable scanner is handled.
+    """
+    def __init__(self, client: ClamAVClient):
+        self.client = client
+        self.session: Optional[_Session] = None
+        self.error: Optional[str] = None
+        self._done = False
+
+    async def __aenter__(self) -> "InstreamScan":
+        await self.client._semaphore().acquire()
+        try:
+            self.session = await self.client._checkout()
+            self.session.writer.write(b"zINSTREAM\0")
+        except Exception:
+            self.error = "Scanner unavailable"
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.session:
+            self.client._checkin(self.session, reusable=self._done and not self.error)
+            self.session = None
+        self.client._semaphore().release()
+
+    async def send(self, chunk: bytes):
+        if self.error or not chunk:
+            return
+        try:
+            self.session.writer.write(struct.pack("!L", len(chunk)) + chunk)
+            await asyncio.wait_for(self.session.writer.drain(), self.client.timeout)
+        except Exception as e:
+            self.error = f"Scan error: {str(e) or type(e).__name__}"
+
+    async def result(self) -> tuple[int, Optional[str]]:
+        if self.error:
+            return 0, self.error
+        try:
+            self.session.writer.write(struct.pack("!L", 0))
+            await asyncio.wait_for(self.session.writer.drain(), self.client.timeout)
+            reply = await asyncio.wait_for(self.session.reader.readuntil(b"\0"), self.client.timeout)
+        except Exception as e:
+            self.error = f"Scan error: {str(e) or type(e).__name__}"
+            return 0, self.error
+        is_scanned, scan_result = parse_reply(reply)
+        # clamd ends the session after an ERROR reply, so only verdicts keep it reusable
+        self._done = is_scanned != 0
+        return is_scanned, scan_result
+
+def parse_reply(reply: bytes) -> tuple[int, Optional[str]]:
+    """Map a clamd reply such as b'1: stream: OK\\0' to (is_scanned, scan_result)"""
+    text = reply.rstrip(b"\0").decode(errors="replace")
+    # Session replies are prefixed with the request number
+    _, _, text = text.partition(": ") if text[:1].isdigit() else ("", "", text)
+    if text == "stream: OK":
+        return 1, "Clean"  # Clean
+    if text.endswith(" FOUND"):
+        return 2, text[len("stream: "):-len(" FOUND")]  # Infected
+    return 0, f"Scan error: {text}"  # Pending
+
+clamav_client = ClamAVClient(
+    host=settings.clamav_host,
+    port=settings.clamav_port,
+    pool_size=settings.clamav_pool_size,
+    connect_timeout=settings.clamav_connect_timeout,
+    timeout=settings.clamav_timeout
+)
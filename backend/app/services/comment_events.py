@@ -0,0 +1,84 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional
+import redis.asyncio as aioredis
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "comments:"
+
+class CommentBroadcaster:
+    """Fans new comments out to the SSE clients connected to this process.
+
+    Every API process holds a single Redis pattern subscription for as long as
+    it runs and hands each message to the local listeners watching that
+    request, so open streams cost one queue each rather than one Redis
+    connection each.
+    """
+    def __init__(self, client: aioredis.Redis, queue_size: int = 100):
+        self.client = client
+        self.queue_size = queue_size
+        self.listeners: dict[int, set[asyncio.Queue]] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def publish(self, request_id: int, payload: dict):
+        """Announce a new comment; delivery is best effort, clients catch up through the cursor API"""
+        try:
+            await self.client.publish(f"{CHANNEL_PREFIX}{request_id}", json.dumps(payload, default=str))
+        except Exception:
+            logger.warning("Could not publish comment for request %s", request_id, exc_info=True)
+
+    @asynccontextmanager
+    async def listen(self, request_ids: list[int]):
+        """Queue that receives comment payloads for request_ids while the block is open"""
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        for request_id in request_ids:
+            self.listeners.setdefault(request_id, set()).add(queue)
+        self.ensure_reader()
+        try:
+            yield queue
+        finally:
+            for request_id in request_ids:
+                watchers = self.listeners.get(request_id)
+                if watchers is not None:
+                    watchers.discard(queue)
+                    if not watchers:
+                        del self.listeners[request_id]
+
+    def ensure_reader(self):
+        """Start (or restart, after a Redis failure) this process's subscription"""
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if not message:
+                    continue
+                request_id = int(message["channel"][len(CHANNEL_PREFIX):])
+                payload = json.loads(message["data"])
+                for queue in list(self.listeners.get(request_id, ())):
+                    try:
+                        queue.put_nowait(payload)
+                    except asyncio.QueueFull:
+                        pass  # Slow client; it re-syncs from the cursor API after reconnecting
+        except Exception:
+            logger.warning("Comment subscription failed", exc_info=True)
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self.client.aclose()
+
+def create_comment_broadcaster(redis_url: Optional[str] = None) -> CommentBroadcaster:
+    return CommentBroadcaster(aioredis.Redis.from_url(redis_url or settings.redis_url, decode_responses=True))
+
+comment_broadcaster = create_comment_broadcaster()
@@ -1,8 +1,11 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import lambda_stmt, select, desc, tuple_
 from typing import List, Optional
 from ..models.models import Comment, ServiceRequest
-from ..schemas.comment import CommentCreate, CommentUpdate
+from ..schemas.comment import CommentCreate, CommentUpdate, CommentResponse
+from .activity import record_activity
+from .pagination import decode_cursor, encode_cursor
+from .comment_events import comment_broadcaster
 
 class CommentService:
     def __init__(self, db: AsyncSession):
@@ -10,8 +13,9 @@ class CommentService:
     
     async def create_comment(self, comment_create: CommentCreate, author_id: int) -> Comment:
         # Validate request exists
+        request_id = comment_create.request_id
         request_result = await self.db.execute(
-            select(ServiceRequest).where(ServiceRequest.id == comment_create.request_id)
+            lambda_stmt(lambda: select(ServiceRequest).where(ServiceRequest.id == request_id))
         )
         if not request_result.scalar_one_or_none():
             raise ValueError("Request not found")
@@ -22,13 +26,20 @@ class CommentService:
         )
         
         self.db.add(comment)
+        await record_activity(
+            self.db, comment.request_id, comments=1, public_comments=0 if comment.is_internal else 1
+        )
         await self.db.commit()
         await self.db.refresh(comment)
+        # Push to clients watching the request instead of making them poll
+        await comment_broadcaster.publish(
+            comment.request_id, CommentResponse.model_validate(comment).model_dump(mode="json")
+        )
         return comment
     
     async def get_comment_by_id(self, comment_id: int) -> Optional[Comment]:
         result = await self.db.execute(
-            select(Comment).where(Comment.id == comment_id)
+            lambda_stmt(lambda: select(Comment).where(Comment.id == comment_id))
         )
         return result.scalar_one_or_none()
     
@@ -46,12 +57,51 @@ class CommentService:
         if not include_internal:
             query = query.where(Comment.is_internal == False)
         
-        query = query.order_by(desc(Comment.created_at))
+        query = query.order_by(desc(Comment.created_at), desc(Comment.id))
         query = query.offset(skip).limit(limit)
         
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
+    async def get_comments_page(
+        self,
+        request_id: int,
+        include_internal: bool = False,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> tuple[List[Comment], Optional[str]]:
+        """Newest-first page of comments and the cursor for the next one (None on the last page).
+
+        Seeks past the cursor on (created_at, id) instead of counting rows with
+        OFFSET, so deep pages cost the same as the first.
+        """
+        # Lambda statements: each variant (internal or not, first page or not) is built and
+        # compiled once, later calls only bind new values
+        query = lambda_stmt(lambda: select(Comment).where(Comment.request_id == request_id))
+        if not include_internal:
+            query += lambda q: q.where(Comment.is_internal == False)
+        if cursor:
+            created_at, comment_id = decode_cursor(cursor)
+            query += lambda q: q.where(tuple_(Comment.created_at, Comment.id) < tuple_(created_at, comment_id))
+        page_size = limit + 1
+        query += lambda q: q.order_by(desc(Comment.created_at), desc(Comment.id)).limit(page_size)
+        
+        result = await self.db.execute(query)
+        comments = list(result.scalars().all())
+        if len(comments) <= limit:
+            return comments, None
+        comments = comments[:limit]
+        return comments, encode_cursor(comments[-1])
+    
+    async def get_comments_since(self, request_ids: List[int], after_id: int, include_internal: bool, limit: int = 100) -> List[Comment]:
+        """Comments created after after_id, for replaying what a reconnecting stream missed"""
+        query = lambda_stmt(lambda: select(Comment).where(Comment.request_id.in_(request_ids), Comment.id > after_id))
+        if not include_internal:
+            query += lambda q: q.where(Comment.is_internal == False)
+        query += lambda q: q.order_by(Comment.id).limit(limit)
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+    
     async def update_comment(self, comment_id: int, comment_update: CommentUpdate, author_id: int) -> Optional[Comment]:
         comment = await self.get_comment_by_id(comment_id)
         if not comment:
@@ -76,5 +126,8 @@ class CommentService:
             raise ValueError("Not authorized to delete this comment")
         
         await self.db.delete(comment)
+        await record_activity(
+            self.db, comment.request_id, comments=-1, public_comments=0 if comment.is_internal else -1, touch=False
+        )
         await self.db.commit()
         return True
\ No newline at end of file
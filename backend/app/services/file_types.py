@@ -0,0 +1,44 @@
+import mimetypes
+from pathlib import Path
+from typing import Optional
+
+# Leading bytes of the formats we accept, checked against the first chunk of an upload
+SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/msword"),  # OLE2 compound document
+    (b"PK\x03\x04", "application/zip"),  # OOXML documents are zip containers
+]
+
+# Content types each extension may legitimately contain, first entry is the canonical MIME type
+EXTENSION_TYPES = {
+    "pdf": ["application/pdf"],
+    "jpg": ["image/jpeg"],
+    "jpeg": ["image/jpeg"],
+    "png": ["image/png"],
+    "doc": ["application/msword"],
+    "docx": ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/zip"],
+}
+
+SNIFF_BYTES = 16
+
+def file_extension(filename: str) -> str:
+    return Path(filename).suffix.lower().lstrip('.')
+
+def sniff(head: bytes) -> Optional[str]:
+    for signature, mime_type in SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return None
+
+def detect_mime_type(filename: str, head: bytes) -> Optional[str]:
+    """MIME type for an upload, or None if its leading bytes contradict the extension"""
+    expected = EXTENSION_TYPES.get(file_extension(filename))
+    if not expected:
+        # No signature for this extension (configured via allowed_file_types); trust the name
+        mime_type, _ = mimetypes.guess_type(filename)
+        return mime_type or "application/octet-stream"
+    if sniff(head) not in expected:
+        return None
+    return expected[0]
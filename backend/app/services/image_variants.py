@@ -0,0 +1,56 @@
+import io
+from typing import Optional
+from ..core.config import settings
+
+# Formats a variant can be requested in, with the Pillow encoder and MIME type for each
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+
+# Originals we can decode; anything else (PDFs, Word documents) has no variants
+SOURCE_TYPES = {"image/jpeg", "image/png"}
+
+def has_variants(mime_type: Optional[str]) -> bool:
+    return mime_type in SOURCE_TYPES
+
+def variant_names() -> list[str]:
+    """File names of every variant, e.g. "thumb.webp" """
+    return [f"{name}.{fmt}" for name in settings.image_variants for fmt in FORMATS]
+
+def parse_variant(variant: str) -> Optional[tuple[int, str]]:
+    """(max edge in pixels, format) for a variant file name, or None if it is not one we make"""
+    name, _, fmt = variant.partition(".")
+    if name not in settings.image_variants or fmt not in FORMATS:
+        return None
+    return settings.image_variants[name], fmt
+
+def variant_key(blob_key: str, variant: str) -> str:
+    """Variants sit next to the original: ab/cd/<sha256>.thumb.webp"""
+    return f"{blob_key}.{variant}"
+
+def render_variant(data: bytes, max_edge: int, fmt: str) -> bytes:
+    """Downscale an image to fit max_edge, dropping EXIF (GPS position, camera serials) and other metadata"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > settings.image_max_pixels:
+            raise ValueError("Image is too large to process")
+        # JPEG can decode straight at a reduced scale, which is much cheaper than resizing the full frame
+        image.draft("RGB", (max_edge, max_edge))
+        # Bake the EXIF orientation into the pixels, since the tag itself is dropped
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha and fmt == "webp" else "RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        encoder, _ = FORMATS[fmt]
+        out = io.BytesIO()
+        # Only pixels are written: no exif, xmp or comment blocks are passed to the encoder
+        options = {"quality": settings.image_variant_quality}
+        if encoder == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options["method"] = 4
+        image.save(out, encoder, **options)
+        return out.getvalue()
@@ -0,0 +1,14 @@
+import base64
+from datetime import datetime
+
+def encode_cursor(row) -> str:
+    """Opaque position after a row in (created_at, id) DESC order"""
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,205 @@
+import csv
+import html
+import io
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import OPEN_REQUEST, ServiceRequest, User
+from .request_stats import completion_seconds
+
+# Backlog age buckets: (label, upper bound in days); the last one is open-ended
+BACKLOG_AGES = [
+    ("under 1 day", 1),
+    ("1-3 days", 3),
+    ("3-7 days", 7),
+    ("1-2 weeks", 14),
+    ("2-4 weeks", 28),
+    ("4 weeks or more", None),
+]
+
+def last_week(now: Optional[datetime] = None) -> datetime:
+    """Start (Monday 00:00 UTC) of the last complete week before now"""
+    now = now or datetime.now(timezone.utc)
+    monday = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return monday - timedelta(days=7)
+
+def _hours(seconds) -> Optional[float]:
+    return None if seconds is None else round(float(seconds) / 3600, 1)
+
+async def completion_percentiles(
+    db: AsyncSession, group, start: datetime, end: datetime,
+    quantiles: tuple[float, ...] = (0.5, 0.9), criteria: tuple = ()
+) -> dict:
+    """{group value: (count, [seconds at each quantile])} for requests completed in [start, end).
+
+    Without a group the single key is None; criteria narrow the requests
+    further. Percentiles are nearest-rank (percentile_disc): PostgreSQL
+    computes them with ordered-set aggregates, SQLite with cume_dist() over
+    the window.
+    """
+    dialect_name = db.bind.dialect.name
+    window = (ServiceRequest.completed_at >= start, ServiceRequest.completed_at < end, *criteria)
+    seconds = completion_seconds(dialect_name)
+    groups = [group] if group is not None else []
+    if dialect_name == "postgresql":
+        query = select(
+            *groups, func.count(), *[func.percentile_disc(q).within_group(seconds) for q in quantiles]
+        ).where(*window)
+    else:
+        ranked = select(
+            *[column.label("key") for column in groups],
+            seconds.label("seconds"),
+            func.cume_dist().over(partition_by=groups or None, order_by=seconds).label("rank"),
+        ).where(*window).subquery()
+        query = select(
+            *([ranked.c.key] if groups else []), func.count(),
+            *[func.min(case((ranked.c.rank >= q, ranked.c.seconds))) for q in quantiles],
+        )
+        groups = [ranked.c.key] if groups else []
+    percentiles = {}
+    for row in (await db.execute(query.group_by(*groups))).all():
+        key, values = (row[0], row[1:]) if group is not None else (None, row)
+        if values[0]:
+            percentiles[key] = (values[0], list(values[1:]))
+    return percentiles
+
+class ReportService:
+    """Weekly operations report, aggregated in the database.
+
+    Every query is bounded by an indexed range - created_at for new requests,
+    completed_at for resolutions, the open partial indexes for the backlog -
+    and returns one row per category, age bucket or staff member, so the
+    cost follows the week's traffic rather than the size of the table.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def weekly(self, week_start: Optional[datetime] = None, as_of: Optional[datetime] = None) -> dict:
+        start = week_start or last_week()
+        end = start + timedelta(days=7)
+        as_of = as_of or datetime.now(timezone.utc)
+
+        opened = dict((await self.db.execute(
+            select(ServiceRequest.category, func.count())
+            .where(ServiceRequest.created_at >= start, ServiceRequest.created_at < end)
+            .group_by(ServiceRequest.category)
+        )).all())
+        resolved = await self._resolution(ServiceRequest.category, start, end)
+        categories = [
+            {
+                "category": category.value,
+                "opened": opened.get(category, 0),
+                **resolved.get(category, {"resolved": 0, "median_hours": None, "p90_hours": None}),
+            }
+            for category in sorted(set(opened) | set(resolved), key=lambda category: category.value)
+        ]
+        overall = (await self._resolution(None, start, end)).get(None)
+
+        return {
+            "week_start": start.date().isoformat(),
+            "week_end": (end - timedelta(days=1)).date().isoformat(),
+            "generated_at": as_of.isoformat(timespec="seconds"),
+            "categories": categories,
+            "total": {
+                "category": "all",
+                "opened": sum(opened.values()),
+                **(overall or {"resolved": 0, "median_hours": None, "p90_hours": None}),
+            },
+            "backlog": await self._backlog(as_of),
+            "staff": await self._staff(start, end),
+        }
+
+    async def _resolution(self, group, start: datetime, end: datetime) -> dict:
+        """Resolved count, median and p90 hours of requests completed in [start, end), per group value"""
+        resolution = {}
+        for key, (count, (median, p90)) in (await completion_percentiles(self.db, group, start, end)).items():
+            resolution[key] = {"resolved": count, "median_hours": _hours(median), "p90_hours": _hours(p90)}
+        return resolution
+
+    async def _backlog(self, as_of: datetime) -> list[dict]:
+        """Open requests by age at as_of, oldest bucket last"""
+        bucket = case(
+            *[
+                (ServiceRequest.created_at > as_of - timedelta(days=days), index)
+                for index, (_, days) in enumerate(BACKLOG_AGES) if days is not None
+            ],
+            else_=len(BACKLOG_AGES) - 1,
+        ).label("bucket")
+        aged = select(bucket).where(OPEN_REQUEST).subquery()
+        counts = dict((await self.db.execute(
+            select(aged.c.bucket, func.count()).group_by(aged.c.bucket)
+        )).all())
+        return [{"age": label, "requests": counts.get(index, 0)} for index, (label, _) in enumerate(BACKLOG_AGES)]
+
+    async def _staff(self, start: datetime, end: datetime) -> list[dict]:
+        """Requests each staff member resolved in the week, and what is still open on their desk"""
+        resolved = await self._resolution(ServiceRequest.assigned_staff_id, start, end)
+        resolved.pop(None, None)
+        open_counts = dict((await self.db.execute(
+            select(ServiceRequest.assigned_staff_id, func.count())
+            .where(OPEN_REQUEST, ServiceRequest.assigned_staff_id.isnot(None))
+            .group_by(ServiceRequest.assigned_staff_id)
+        )).all())
+        staff_ids = set(resolved) | set(open_counts)
+        if not staff_ids:
+            return []
+        names = dict((await self.db.execute(
+            select(User.id, User.full_name).where(User.id.in_(staff_ids))
+        )).all())
+        staff = [
+            {
+                "staff_id": staff_id,
+                "name": names.get(staff_id, ""),
+                **resolved.get(staff_id, {"resolved": 0, "median_hours": None, "p90_hours": None}),
+                "open": open_counts.get(staff_id, 0),
+            }
+            for staff_id in staff_ids
+        ]
+        return sorted(staff, key=lambda row: (-row["resolved"], row["name"], row["staff_id"]))
+
+def report_csv(report: dict) -> dict[str, str]:
+    """The report's tables as CSV documents, keyed by file name"""
+    tables = {
+        "categories.csv": report["categories"] + [report["total"]],
+        "backlog.csv": report["backlog"],
+        "staff.csv": report["staff"],
+    }
+    files = {}
+    for name, rows in tables.items():
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows else ["empty"])
+        writer.writeheader()
+        writer.writerows(rows)
+        files[name] = out.getvalue()
+    return files
+
+def _table(rows: list[dict], columns: list[tuple[str, str]]) -> str:
+    head = "".join(f"<th>{html.escape(title)}</th>" for _, title in columns)
+    body = "".join(
+        "<tr>" + "".join(
+            f"<td>{'-' if row[key] is None else html.escape(str(row[key]))}</td>" for key, _ in columns
+        ) + "</tr>"
+        for row in rows
+    )
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def report_html(report: dict) -> str:
+    """Self-contained HTML page for the report, suitable as an email body"""
+    resolution = [("resolved", "Resolved"), ("median_hours", "Median hours"), ("p90_hours", "P90 hours")]
+    period = f"{report['week_start']} to {report['week_end']}"
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>Weekly report {period}</title>"
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse;margin-bottom:1.5em}"
+        "th,td{border:1px solid #ccc;padding:4px 8px;text-align:right}th:first-child,td:first-child{text-align:left}</style>"
+        "</head><body>"
+        f"<h1>Weekly report, {period}</h1>"
+        "<h2>Requests by category</h2>"
+        + _table(report["categories"] + [report["total"]], [("category", "Category"), ("opened", "Opened"), *resolution])
+        + f"<h2>Open backlog by age</h2><p>As of {html.escape(report['generated_at'])}</p>"
+        + _table(report["backlog"], [("age", "Age"), ("requests", "Requests")])
+        + "<h2>Staff throughput</h2>"
+        + _table(report["staff"], [("name", "Staff member"), *resolution, ("open", "Still open")])
+        + "</body></html>"
+    )
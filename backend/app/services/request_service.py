@@ -1,11 +1,50 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import Integer, Select, bindparam, lambda_stmt, select, func, or_, and_
+from functools import lru_cache
 from typing import List, Optional
 from datetime import datetime
-from ..models.models import ServiceRequest, RequestStatus, RequestPriority, RequestCategory, User
+from ..models.models import ServiceRequest, RequestStatus, RequestPriority, RequestCategory, User, OPEN_REQUEST
 from ..schemas.request import ServiceRequestCreate, ServiceRequestUpdate, ServiceRequestFilter
 from .audit_service import AuditService
 from .gis import is_point_in_boundary
+from .request_stats import record_request_change, request_key
+from .resolution_analytics import record_resolution
+from .status_cache import status_cache
+
+# Request-list filters by name, each comparing against a bound parameter of the same name.
+# Only these combine, so each combination ("shape") is built once and reused, keeping
+# the SQL compiled for it in SQLAlchemy's cache instead of rebuilding it every request.
+LIST_FILTERS = {
+    "status": lambda: ServiceRequest.status == bindparam("status"),
+    "open": lambda: OPEN_REQUEST,
+    "category": lambda: ServiceRequest.category == bindparam("category"),
+    "priority": lambda: ServiceRequest.priority == bindparam("priority"),
+    "citizen_id": lambda: ServiceRequest.citizen_id == bindparam("citizen_id"),
+    "assigned_staff_id": lambda: ServiceRequest.assigned_staff_id == bindparam("assigned_staff_id"),
+    "search": lambda: or_(
+        ServiceRequest.title.ilike(bindparam("search")),
+        ServiceRequest.description.ilike(bindparam("search")),
+        User.full_name.ilike(bindparam("search"))
+    ),
+    "viewer_id": lambda: ServiceRequest.citizen_id == bindparam("viewer_id"),
+}
+
+@lru_cache(maxsize=512)
+def list_statements(shape: tuple[str, ...], sort: str = "created") -> tuple[Select, Select]:
+    """(count, page) statements for one combination of list filters; the indexes on service_requests follow these shapes"""
+    query = select(ServiceRequest)
+    if "search" in shape:
+        # Only searches need the citizen's name, so only they pay for the join
+        query = query.join(User, ServiceRequest.citizen_id == User.id)
+    for name in shape:
+        query = query.where(LIST_FILTERS[name]())
+    count_query = select(func.count()).select_from(query.subquery())
+    # Newest first; "activity" follows ix_service_requests_last_activity
+    if sort == "activity":
+        query = query.order_by(ServiceRequest.last_activity_at.desc(), ServiceRequest.id.desc())
+    else:
+        query = query.order_by(ServiceRequest.created_at.desc(), ServiceRequest.id.desc())
+    return count_query, query.offset(bindparam("skip", type_=Integer)).limit(bindparam("limit", type_=Integer))
 
 class RequestService:
     def __init__(self, db: AsyncSession):
@@ -21,14 +60,16 @@ class RequestService:
             status=RequestStatus.SUBMITTED
         )
         self.db.add(request)
+        await record_request_change(self.db, request)
         await self.db.commit()
         await self.db.refresh(request)
+        # Replaces a cached "not found" left by anyone who tried this ID early
+        await status_cache.set(request.id, request.status.value)
         return request
     
     async def get_request_by_id(self, request_id: int) -> Optional[ServiceRequest]:
         result = await self.db.execute(
-            select(ServiceRequest)
-            .where(ServiceRequest.id == request_id)
+            lambda_stmt(lambda: select(ServiceRequest).where(ServiceRequest.id == request_id))
         )
         return result.scalar_one_or_none()
     
@@ -40,12 +81,28 @@ class RequestService:
         )
         return result.scalar_one_or_none()
     
-    async def update_request(self, request_id: int, request_update: ServiceRequestUpdate, updated_by_id: int) -> Optional[ServiceRequest]:
-        request = await self.get_request_by_id(request_id)
+    async def update_request(
+        self,
+        request_id: int,
+        request_update: ServiceRequestUpdate,
+        updated_by_id: int,
+        audit_action: Optional[tuple[str, dict]] = None
+    ) -> Optional[ServiceRequest]:
+        """Apply an update; audit_action records an extra (action, details) event alongside "update_request" """
+        # Locked until commit: the aggregates move from this state, so no other update may change it meanwhile
+        result = await self.db.execute(
+            select(ServiceRequest)
+            .where(ServiceRequest.id == request_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        request = result.scalar_one_or_none()
         if not request:
             return None
         
         update_data = request_update.dict(exclude_unset=True)
+        before = request_key(request)
+        completed_before = request.completed_at
         
         # Set completion date if status is changed to completed
         if "status" in update_data and update_data["status"] == RequestStatus.COMPLETED:
@@ -55,77 +112,86 @@ class RequestService:
             setattr(request, field, value)
         
         request.updated_at = datetime.utcnow()
+        request.last_activity_at = func.now()
+        await record_request_change(self.db, request, before, completed_before)
+        completed_again = request.status == RequestStatus.COMPLETED and request.completed_at != completed_before
+        if completed_again or (completed_before and request.category != before[1]):
+            await record_resolution(self.db, request, completed_before, before[1])
+        # Audit events go in with the change itself, in the same commit
+        audit = AuditService(self.db)
+        await audit.log(updated_by_id, "update_request", "ServiceRequest", request.id, request_update.dict(exclude_unset=True))
+        if audit_action:
+            await audit.log(updated_by_id, audit_action[0], "ServiceRequest", request.id, audit_action[1])
         await self.db.commit()
         await self.db.refresh(request)
-        await AuditService(self.db).log(updated_by_id, "update_request", "ServiceRequest", request.id, request_update.dict(exclude_unset=True))
+        if "status" in update_data:
+            await status_cache.set(request.id, request.status.value)
         return request
     
-    async def get_requests_list(
-        self, 
-        skip: int = 0, 
-        limit: int = 20,
+    def list_filters(
+        self,
         filter_params: Optional[ServiceRequestFilter] = None,
         user_id: Optional[int] = None,
         user_role: Optional[str] = None
-    ) -> tuple[List[ServiceRequest], int]:
-        
-        query = select(ServiceRequest).join(User, ServiceRequest.citizen_id == User.id)
-        
-        # Apply filters
+    ) -> tuple[tuple[str, ...], dict]:
+        """(shape, values) of a request-list query: the filters in use, in LIST_FILTERS order, and their bound values"""
+        values = {}
         if filter_params:
             if filter_params.status:
-                query = query.where(ServiceRequest.status == filter_params.status)
+                values["status"] = filter_params.status
+            if filter_params.open_only:
+                values["open"] = None
             if filter_params.category:
-                query = query.where(ServiceRequest.category == filter_params.category)
+                values["category"] = filter_params.category
             if filter_params.priority:
-                query = query.where(ServiceRequest.priority == filter_params.priority)
+                values["priority"] = filter_params.priority
             if filter_params.citizen_id:
-                query = query.where(ServiceRequest.citizen_id == filter_params.citizen_id)
+                values["citizen_id"] = filter_params.citizen_id
             if filter_params.assigned_staff_id:
-                query = query.where(ServiceRequest.assigned_staff_id == filter_params.assigned_staff_id)
+                values["assigned_staff_id"] = filter_params.assigned_staff_id
             if filter_params.search:
-                search_term = f"%{filter_params.search}%"
-                query = query.where(
-                    or_(
-                        ServiceRequest.title.ilike(search_term),
-                        ServiceRequest.description.ilike(search_term),
-                        User.full_name.ilike(search_term)
-                    )
-                )
+                values["search"] = f"%{filter_params.search}%"
         
         # Role-based filtering
         if user_role == "citizen":
-            query = query.where(ServiceRequest.citizen_id == user_id)
+            values["viewer_id"] = user_id
+        shape = tuple(name for name in LIST_FILTERS if name in values)
+        return shape, {name: value for name, value in values.items() if value is not None}
+    
+    async def get_requests_list(
+        self, 
+        skip: int = 0, 
+        limit: int = 20,
+        filter_params: Optional[ServiceRequestFilter] = None,
+        user_id: Optional[int] = None,
+        user_role: Optional[str] = None,
+        sort: str = "created"
+    ) -> tuple[List[ServiceRequest], int]:
+        shape, values = self.list_filters(filter_params, user_id, user_role)
+        count_query, page_query = list_statements(shape, sort)
         
         # Get total count
-        count_query = select(func.count()).select_from(query.subquery())
-        total_result = await self.db.execute(count_query)
+        total_result = await self.db.execute(count_query, values)
         total = total_result.scalar()
         
         # Apply pagination
-        query = query.offset(skip).limit(limit)
-        
-        result = await self.db.execute(query)
+        result = await self.db.execute(page_query, {**values, "skip": skip, "limit": limit})
         requests = result.scalars().all()
         
         return list(requests), total
     
     async def assign_request(self, request_id: int, staff_id: int) -> Optional[ServiceRequest]:
-        updated = await self.update_request(
+        return await self.update_request(
             request_id, 
             ServiceRequestUpdate(assigned_staff_id=staff_id, status=RequestStatus.ASSIGNED),
-            staff_id
+            staff_id,
+            audit_action=("assign_request", {"assigned_staff_id": staff_id})
         )
-        if updated:
-            await AuditService(self.db).log(staff_id, "assign_request", "ServiceRequest", updated.id, {"assigned_staff_id": staff_id})
-        return updated
     
     async def update_request_status(self, request_id: int, status: RequestStatus, updated_by_id: int) -> Optional[ServiceRequest]:
-        updated = await self.update_request(
+        return await self.update_request(
             request_id,
             ServiceRequestUpdate(status=status),
-            updated_by_id
+            updated_by_id,
+            audit_action=("update_status", {"status": status.value})
         )
-        if updated:
-            await AuditService(self.db).log(updated_by_id, "update_status", "ServiceRequest", updated.id, {"status": status.value})
-        return updated
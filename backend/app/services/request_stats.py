@@ -0,0 +1,222 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import Date, cast, delete, exists, func, insert, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import (
+    RequestCategory, RequestCount, RequestDailyStats, RequestPriority, RequestStatus, ServiceRequest
+)
+
+CLOSED_STATUSES = {RequestStatus.COMPLETED, RequestStatus.REJECTED, RequestStatus.CLOSED}
+
+# (status, category, priority) of a request, as counted in request_counts
+RequestKey = tuple[RequestStatus, RequestCategory, RequestPriority]
+
+def request_key(request: ServiceRequest) -> RequestKey:
+    return request.status, request.category, request.priority
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+async def increment_counters(db: AsyncSession, model, keys: dict, increments: dict):
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + n: one statement, safe against concurrent writers"""
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(model).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in increments}
+    )
+    await db.execute(stmt)
+
+def _seconds_to_complete(created_at: datetime, completed_at: datetime) -> float:
+    return (_naive_utc(completed_at) - _naive_utc(created_at)).total_seconds()
+
+async def record_request_change(
+    db: AsyncSession,
+    request: ServiceRequest,
+    before: Optional[RequestKey] = None,
+    completed_before: Optional[datetime] = None
+):
+    """Move a created (before=None) or updated request between the aggregates, inside the caller's transaction.
+
+    completed_before is the completed_at the request had before the update. A
+    request counts as completed once: when it is completed again (after a
+    reopen, or re-marked completed) its earlier completion is taken back out
+    of the day it was counted on. A change of category moves a counted
+    completion to the new category.
+    """
+    after = request_key(request)
+    if before != after:
+        # Take the two counter rows in a fixed order so opposite moves cannot deadlock
+        changes = {after: 1} if before is None else {before: -1, after: 1}
+        for key in sorted(changes, key=lambda k: tuple(member.name for member in k)):
+            await increment_counters(
+                db, RequestCount,
+                {"status": key[0], "category": key[1], "priority": key[2]},
+                {"count": changes[key]}
+            )
+
+    flow = {}
+    if before is None:
+        flow["opened"] = 1
+    else:
+        was_closed, is_closed = before[0] in CLOSED_STATUSES, after[0] in CLOSED_STATUSES
+        if is_closed and not was_closed:
+            flow["closed"] = 1
+        elif was_closed and not is_closed:
+            flow["reopened"] = 1
+    if after[0] == RequestStatus.COMPLETED and request.completed_at and request.completed_at != completed_before:
+        if before is not None and completed_before:
+            # Earlier days sort first, the same order every writer takes the rows in
+            await increment_counters(
+                db, RequestDailyStats,
+                {"day": _naive_utc(completed_before).date(), "category": before[1]},
+                {"completed": -1, "completion_seconds": -_seconds_to_complete(request.created_at, completed_before)}
+            )
+        flow["completed"] = 1
+        flow["completion_seconds"] = _seconds_to_complete(request.created_at, request.completed_at)
+    elif before is not None and completed_before and before[1] != after[1]:
+        # Recategorised after its completion was counted: the completion moves with it, on its own day
+        day, seconds = _naive_utc(completed_before).date(), _seconds_to_complete(request.created_at, completed_before)
+        moves = {before[1]: -1, after[1]: 1}
+        for category in sorted(moves, key=lambda member: member.name):
+            await increment_counters(
+                db, RequestDailyStats, {"day": day, "category": category},
+                {"completed": moves[category], "completion_seconds": moves[category] * seconds}
+            )
+    if flow:
+        today = datetime.now(timezone.utc).date()
+        await increment_counters(db, RequestDailyStats, {"day": today, "category": after[1]}, flow)
+
+def completion_seconds(dialect_name: str):
+    """SQL expression for seconds from submission to completion"""
+    if dialect_name == "postgresql":
+        return func.extract("epoch", ServiceRequest.completed_at - ServiceRequest.created_at)
+    return (func.julianday(ServiceRequest.completed_at) - func.julianday(ServiceRequest.created_at)) * 86400
+
+def rebuild_statements(dialect_name: str) -> list:
+    """Recount request_counts from service_requests, and fill request_daily_stats if it is empty.
+
+    The daily history is approximate when rebuilt: service_requests keeps no
+    transitions, so reopenings are lost and closures land on their completion
+    (or last update) day. Past days are therefore never overwritten.
+    """
+    day_of = (lambda column: cast(column, Date)) if dialect_name == "postgresql" else func.date
+    seconds = completion_seconds(dialect_name)
+
+    counts = insert(RequestCount).from_select(
+        ["status", "category", "priority", "count"],
+        select(ServiceRequest.status, ServiceRequest.category, ServiceRequest.priority, func.count())
+        .group_by(ServiceRequest.status, ServiceRequest.category, ServiceRequest.priority)
+    )
+
+    def flow(day, opened=0, closed=0, completed=0, completion_seconds=literal(0.0)):
+        return select(
+            day_of(day).label("day"), ServiceRequest.category.label("category"),
+            literal(opened).label("opened"), literal(closed).label("closed"),
+            literal(completed).label("completed"), completion_seconds.label("completion_seconds")
+        )
+    events = union_all(
+        flow(ServiceRequest.created_at, opened=1),
+        flow(func.coalesce(ServiceRequest.completed_at, ServiceRequest.updated_at, ServiceRequest.created_at), closed=1)
+        .where(ServiceRequest.status.in_(CLOSED_STATUSES)),
+        flow(ServiceRequest.completed_at, completed=1, completion_seconds=seconds)
+        .where(ServiceRequest.status == RequestStatus.COMPLETED, ServiceRequest.completed_at.isnot(None)),
+    ).subquery()
+    daily = insert(RequestDailyStats).from_select(
+        ["day", "category", "opened", "closed", "completed", "completion_seconds"],
+        select(
+            events.c.day, events.c.category, func.sum(events.c.opened), func.sum(events.c.closed),
+            func.sum(events.c.completed), func.sum(events.c.completion_seconds)
+        )
+        .where(~exists(select(RequestDailyStats.day)))
+        .group_by(events.c.day, events.c.category)
+    )
+    return [delete(RequestCount), counts, daily]
+
+async def backfill_request_stats(conn):
+    """Migration step: build the aggregates for requests that existed before them"""
+    for statement in rebuild_statements(conn.dialect.name):
+        await conn.execute(statement)
+
+class RequestStatsService:
+    """Dashboard figures read from the aggregate tables: a few hundred rows, however many requests exist"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def rebuild_counts(self) -> int:
+        """Recount request_counts in one transaction (nightly, in case a write path was ever missed)"""
+        for statement in rebuild_statements(self.db.bind.dialect.name):
+            await self.db.execute(statement)
+        await self.db.commit()
+        return await self.db.scalar(select(func.coalesce(func.sum(RequestCount.count), 0)))
+
+    async def counts(self) -> dict:
+        result = await self.db.execute(select(RequestCount).where(RequestCount.count != 0))
+        by_status, by_category, by_priority = {}, {}, {}
+        for row in result.scalars():
+            by_status[row.status.value] = by_status.get(row.status.value, 0) + row.count
+            by_category[row.category.value] = by_category.get(row.category.value, 0) + row.count
+            by_priority[row.priority.value] = by_priority.get(row.priority.value, 0) + row.count
+        total = sum(by_status.values())
+        closed = sum(by_status.get(status.value, 0) for status in CLOSED_STATUSES)
+        return {
+            "total": total,
+            "open": total - closed,
+            "closed": closed,
+            "by_status": by_status,
+            "by_category": by_category,
+            "by_priority": by_priority,
+        }
+
+    async def trend(self, days: int = 30) -> list[dict]:
+        """Opened, closed and reopened per day, oldest first, with zero days filled in"""
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        result = await self.db.execute(
+            select(
+                RequestDailyStats.day,
+                func.sum(RequestDailyStats.opened),
+                func.sum(RequestDailyStats.closed),
+                func.sum(RequestDailyStats.reopened),
+            )
+            .where(RequestDailyStats.day >= since)
+            .group_by(RequestDailyStats.day)
+        )
+        found = {day: (opened, closed, reopened) for day, opened, closed, reopened in result.all()}
+        trend = []
+        for offset in range(days):
+            day: date = since + timedelta(days=offset)
+            opened, closed, reopened = found.get(day, (0, 0, 0))
+            trend.append({"day": day.isoformat(), "opened": opened, "closed": closed, "reopened": reopened})
+        return trend
+
+    async def completion_times(self, days: int = 30) -> dict:
+        """Average hours from submission to completion, overall and per category, for requests completed in the window"""
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        result = await self.db.execute(
+            select(
+                RequestDailyStats.category,
+                func.sum(RequestDailyStats.completed),
+                func.sum(RequestDailyStats.completion_seconds),
+            )
+            .where(RequestDailyStats.day >= since)
+            .group_by(RequestDailyStats.category)
+        )
+        per_category, completed, seconds = {}, 0, 0.0
+        for category, n, total in result.all():
+            if n:
+                per_category[category.value] = round(total / n / 3600, 2)
+                completed += n
+                seconds += total
+        return {
+            "completed": completed,
+            "average_hours": round(seconds / completed / 3600, 2) if completed else None,
+            "average_hours_by_category": per_category,
+        }
+
+    async def dashboard(self, days: int = 30) -> dict:
+        return {
+            "counts": await self.counts(),
+            "trend": await self.trend(days),
+            "completion": await self.completion_times(days),
+        }
@@ -0,0 +1,220 @@
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Optional
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.models import RequestCategory, ResolutionSketchBin, ServiceRequest
+from .reports import completion_percentiles
+from .request_stats import increment_counters
+
+# Every quantile a sketch reports is within 1% of the true value at that rank
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+
+QUANTILES = {"p50_hours": 0.5, "p90_hours": 0.9, "p99_hours": 0.99}
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+def week_of(moment: datetime) -> date:
+    """Monday (UTC) of the week a moment falls in"""
+    day = _utc(moment).date()
+    return day - timedelta(days=day.weekday())
+
+def _week_start(week: date) -> datetime:
+    return datetime.combine(week, time(), tzinfo=timezone.utc)
+
+def resolution_seconds(request) -> float:
+    return (_utc(request.completed_at) - _utc(request.created_at)).total_seconds()
+
+class DDSketch:
+    """Mergeable quantile sketch (DDSketch) over resolution times in seconds.
+
+    A time x is counted in bin ceil(log_gamma(x)), so any quantile read back
+    is within RELATIVE_ACCURACY of the exact one however many values were
+    added; times under a second share bin 0. Sketches merge by adding bin
+    counts, which is what lets the database merge them with SUM ... GROUP BY.
+    """
+    def __init__(self, bins: Optional[dict[int, int]] = None):
+        self.bins: dict[int, int] = dict(bins or {})
+
+    @staticmethod
+    def bin_of(seconds: float) -> int:
+        return max(0, math.ceil(math.log(max(seconds, 1.0)) / LOG_GAMMA))
+
+    @staticmethod
+    def value_of(bin: int) -> float:
+        return 2 * GAMMA ** bin / (GAMMA + 1)
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def add(self, seconds: float, count: int = 1):
+        bin = self.bin_of(seconds)
+        self.bins[bin] = self.bins.get(bin, 0) + count
+
+    def merge(self, other: "DDSketch"):
+        for bin, count in other.bins.items():
+            self.bins[bin] = self.bins.get(bin, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile, like percentile_disc: the value at rank ceil(q * count)"""
+        total = self.count
+        if not total:
+            return None
+        rank, seen = max(1, math.ceil(q * total)), 0
+        for bin in sorted(self.bins):
+            seen += self.bins[bin]
+            if seen >= rank:
+                return self.value_of(bin)
+
+def _summary(count: int, seconds: Iterable[Optional[float]]) -> dict:
+    return {
+        "resolved": count,
+        **{name: None if value is None else round(float(value) / 3600, 2) for name, value in zip(QUANTILES, seconds)},
+    }
+
+def _sketch_summary(sketch: DDSketch) -> dict:
+    return _summary(sketch.count, [sketch.quantile(q) for q in QUANTILES.values()])
+
+async def record_resolution(
+    db: AsyncSession,
+    request: ServiceRequest,
+    completed_before: Optional[datetime] = None,
+    category_before: Optional[RequestCategory] = None
+):
+    """Count a just-completed request in its week's sketch, inside the caller's transaction.
+
+    If the request had been completed before (completed_before, in
+    category_before), that earlier time is taken back out of its bin, so a
+    reopened and recompleted request is counted once, at its latest time.
+    A completed request that only changed category is moved between the
+    categories' bins the same way, with completed_before=completed_at.
+    """
+    changes = {
+        (week_of(request.completed_at), request.category, DDSketch.bin_of(resolution_seconds(request))): 1,
+    }
+    if completed_before:
+        seconds = (_utc(completed_before) - _utc(request.created_at)).total_seconds()
+        old = (week_of(completed_before), category_before or request.category, DDSketch.bin_of(seconds))
+        changes[old] = changes.get(old, 0) - 1
+    # Fixed order, so two writers moving between the same bins cannot deadlock
+    for (week, category, bin), count in sorted(changes.items(), key=lambda item: (item[0][0], item[0][1].name, item[0][2])):
+        if count:
+            await increment_counters(
+                db, ResolutionSketchBin, {"week": week, "category": category, "bin": bin}, {"count": count}
+            )
+
+async def backfill_resolution_sketches(conn):
+    """Migration step: sketch the requests completed before the sketches existed.
+
+    Requests are streamed, and only the bin counts are held in memory.
+    """
+    bins: dict[tuple, int] = {}
+    result = await conn.stream(
+        select(ServiceRequest.category, ServiceRequest.created_at, ServiceRequest.completed_at)
+        .where(ServiceRequest.completed_at.isnot(None))
+        .execution_options(yield_per=10_000)
+    )
+    async for request in result:
+        key = (week_of(request.completed_at), request.category, DDSketch.bin_of(resolution_seconds(request)))
+        bins[key] = bins.get(key, 0) + 1
+    rows = [{"week": week, "category": category, "bin": bin, "count": count} for (week, category, bin), count in bins.items()]
+    for first in range(0, len(rows), 10_000):
+        await conn.execute(insert(ResolutionSketchBin), rows[first:first + 10_000])
+
+class ResolutionAnalytics:
+    """Median, p90 and p99 resolution time per category, from the weekly sketches.
+
+    A time range is answered by merging the sketches of the whole weeks it
+    covers in the database, plus the requests completed in its ragged ends,
+    read through the completed_at index. exact=True computes the percentiles
+    from every request in the range instead, for audits.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def percentiles(
+        self, start: datetime, end: datetime, category: Optional[RequestCategory] = None, exact: bool = False
+    ) -> dict:
+        start, end = _utc(start), _utc(end)
+        if start >= end:
+            raise ValueError("The range must start before it ends")
+        if exact:
+            categories, overall = await self._exact(start, end, category)
+        else:
+            sketches = await self._merged(start, end, category)
+            overall = DDSketch()
+            for sketch in sketches.values():
+                overall.merge(sketch)
+            categories = {
+                key.value: _sketch_summary(sketch)
+                for key, sketch in sorted(sketches.items(), key=lambda item: item[0].value)
+            }
+            overall = _sketch_summary(overall)
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "exact": exact,
+            "categories": categories,
+            "all": overall,
+        }
+
+    async def weekly(self, weeks: int = 12, category: Optional[RequestCategory] = None) -> list[dict]:
+        """Per completion week (oldest first, the current one so far) and category, from the sketches alone"""
+        since = week_of(datetime.now(timezone.utc)) - timedelta(weeks=weeks - 1)
+        query = select(ResolutionSketchBin).where(ResolutionSketchBin.week >= since)
+        if category:
+            query = query.where(ResolutionSketchBin.category == category)
+        sketches: dict[tuple, DDSketch] = {}
+        for row in (await self.db.execute(query)).scalars():
+            sketches.setdefault((row.week, row.category.value), DDSketch()).bins[row.bin] = row.count
+        return [
+            {"week": week.isoformat(), "category": name, **_sketch_summary(sketches[week, name])}
+            for week, name in sorted(sketches)
+        ]
+
+    async def _merged(self, start: datetime, end: datetime, category: Optional[RequestCategory]) -> dict:
+        """One sketch per category for requests completed in [start, end)"""
+        first_week = week_of(start) if _week_start(week_of(start)) == start else week_of(start) + timedelta(weeks=1)
+        end_week = week_of(end)
+        if first_week < end_week:
+            edges = [(start, _week_start(first_week)), (_week_start(end_week), end)]
+            query = (
+                select(ResolutionSketchBin.category, ResolutionSketchBin.bin, func.sum(ResolutionSketchBin.count))
+                .where(ResolutionSketchBin.week >= first_week, ResolutionSketchBin.week < end_week)
+                .group_by(ResolutionSketchBin.category, ResolutionSketchBin.bin)
+            )
+            if category:
+                query = query.where(ResolutionSketchBin.category == category)
+            rows = (await self.db.execute(query)).all()
+        else:
+            edges, rows = [(start, end)], []
+
+        sketches: dict[RequestCategory, DDSketch] = {}
+        for key, bin, count in rows:
+            sketches.setdefault(key, DDSketch()).bins[bin] = count
+        for edge_start, edge_end in edges:
+            if edge_start >= edge_end:
+                continue
+            query = select(ServiceRequest.category, ServiceRequest.created_at, ServiceRequest.completed_at).where(
+                ServiceRequest.completed_at >= edge_start, ServiceRequest.completed_at < edge_end
+            )
+            if category:
+                query = query.where(ServiceRequest.category == category)
+            for request in (await self.db.execute(query)).all():
+                sketches.setdefault(request.category, DDSketch()).add(resolution_seconds(request))
+        return sketches
+
+    async def _exact(self, start: datetime, end: datetime, category: Optional[RequestCategory]) -> tuple[dict, dict]:
+        criteria = (ServiceRequest.category == category,) if category else ()
+        quantiles = tuple(QUANTILES.values())
+        per_category = await completion_percentiles(self.db, ServiceRequest.category, start, end, quantiles, criteria)
+        overall = (await completion_percentiles(self.db, None, start, end, quantiles, criteria)).get(None)
+        categories = {
+            key.value: _summary(count, values)
+            for key, (count, values) in sorted(per_category.items(), key=lambda item: item[0].value)
+        }
+        return categories, _summary(*overall) if overall else _summary(0, [None] * len(QUANTILES))
@@ -0,0 +1,206 @@
+import base64
+import hashlib
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+import redis.asyncio as aioredis
+from aiofiles import open as aio_open
+from ..core.config import settings
+
+SESSION_PREFIX = "upload:"
+CHECKSUM_ALGORITHMS = {"sha1", "sha256", "md5"}
+LOCK_TTL = 15 * 60
+
+# Release the upload lock only if it still holds our token: once it has expired
+# another request may have taken it, and that request's lock must survive us
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class UploadConflict(ValueError):
+    """The client's offset disagrees with ours, or another chunk is being written"""
+
+class ChecksumMismatch(ValueError):
+    pass
+
+@dataclass
+class UploadSession:
+    id: str
+    request_id: int
+    user_id: int
+    filename: str
+    length: int
+    offset: int
+    description: Optional[str] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.length
+
+def parse_checksum(header: Optional[str]) -> Optional[tuple[str, bytes]]:
+    """(algorithm, digest) from a tus "Upload-Checksum: sha256 <base64>" header"""
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError("Unsupported checksum algorithm")
+    try:
+        return algorithm, base64.b64decode(encoded, validate=True)
+    except ValueError:
+        raise ValueError("Malformed Upload-Checksum header")
+
+class ResumableUploadStore:
+    """Partial uploads: bytes received so far on disk, offsets and metadata in Redis.
+
+    Every chunk is appended at the offset Redis says we hold, so a client that
+    lost its connection asks for the offset and continues from there.
+    """
+    def __init__(self, client: aioredis.Redis, directory: str, ttl: int = settings.resumable_upload_ttl):
+        self.client = client
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def path(self, upload_id: str) -> Path:
+        return self.directory / upload_id
+
+    async def create(
+        self,
+        request_id: int,
+        user_id: int,
+        filename: str,
+        length: int,
+        description: Optional[str] = None
+    ) -> UploadSession:
+        session = UploadSession(uuid.uuid4().hex, request_id, user_id, filename, length, 0, description)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path(session.id).touch()
+        fields = {
+            "request_id": request_id,
+            "user_id": user_id,
+            "filename": filename,
+            "length": length,
+            "offset": 0,
+            "description": description or "",
+        }
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(SESSION_PREFIX + session.id, mapping=fields)
+            pipe.expire(SESSION_PREFIX + session.id, self.ttl)
+            await pipe.execute()
+        return session
+
+    async def get(self, upload_id: str) -> Optional[UploadSession]:
+        raw = await self.client.hgetall(SESSION_PREFIX + upload_id)
+        if not raw:
+            return None
+        return UploadSession(
+            id=upload_id,
+            request_id=int(raw["request_id"]),
+            user_id=int(raw["user_id"]),
+            filename=raw["filename"],
+            length=int(raw["length"]),
+            offset=int(raw["offset"]),
+            description=raw["description"] or None
+        )
+
+    async def append(
+        self,
+        session: UploadSession,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        checksum: Optional[tuple[str, bytes]] = None
+    ) -> int:
+        """Write one PATCH body at offset and return the new offset.
+
+        A chunk that fails its checksum is discarded. Without a checksum, the
+        bytes that arrived before a dropped connection are kept, so the client
+        only resends the rest.
+        """
+        hasher = hashlib.new(checksum[0]) if checksum else None
+        written = 0
+        async with self.locked(session.id):
+            # Re-read under the lock: an earlier PATCH may have moved the offset since the session was loaded
+            current = await self.client.hget(SESSION_PREFIX + session.id, "offset")
+            if current is None:
+                raise UploadConflict("Upload has expired or was finalized")
+            if offset != int(current):
+                raise UploadConflict("Upload-Offset does not match the bytes received")
+            async with aio_open(self.path(session.id), "r+b") as f:
+                # Drop anything past the acknowledged offset, left by an interrupted chunk
+                await f.truncate(offset)
+                await f.seek(offset)
+                try:
+                    async for chunk in chunks:
+                        if offset + written + len(chunk) > session.length:
+                            raise ValueError("Chunk runs past the declared Upload-Length")
+                        await f.write(chunk)
+                        written += len(chunk)
+                        if hasher:
+                            hasher.update(chunk)
+                    if hasher and hasher.digest() != checksum[1]:
+                        raise ChecksumMismatch("Chunk checksum does not match")
+                except BaseException:
+                    if hasher or not written:
+                        await f.truncate(offset)
+                        raise
+                    # Keep what arrived intact; the client resumes from the new offset
+                    await f.flush()
+                    await self._set_offset(session, offset + written)
+                    raise
+            return await self._set_offset(session, offset + written)
+
+    @asynccontextmanager
+    async def locked(self, upload_id: str):
+        """Only one request at a time may write to or finalize an upload"""
+        lock_key = f"{SESSION_PREFIX}{upload_id}:lock"
+        token = uuid.uuid4().hex
+        if not await self.client.set(lock_key, token, nx=True, ex=LOCK_TTL):
+            raise UploadConflict("Another request is still working on this upload")
+        try:
+            yield
+        finally:
+            await self._release(keys=[lock_key], args=[token])
+
+    async def _set_offset(self, session: UploadSession, offset: int) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(SESSION_PREFIX + session.id, "offset", offset)
+            pipe.expire(SESSION_PREFIX + session.id, self.ttl)
+            await pipe.execute()
+        session.offset = offset
+        return offset
+
+    async def iter_chunks(self, session: UploadSession, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+        async with aio_open(self.path(session.id), "rb") as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+
+    async def delete(self, upload_id: str):
+        await self.client.delete(SESSION_PREFIX + upload_id)
+        self.path(upload_id).unlink(missing_ok=True)
+
+    async def purge_expired(self) -> int:
+        """Remove partial files whose session expired in Redis"""
+        if not self.directory.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for path in self.directory.iterdir():
+            if path.stat().st_mtime > cutoff or await self.client.exists(SESSION_PREFIX + path.name):
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+def create_upload_store(redis_url: Optional[str] = None) -> ResumableUploadStore:
+    return ResumableUploadStore(
+        aioredis.Redis.from_url(redis_url or settings.redis_url, decode_responses=True),
+        settings.resumable_upload_dir
+    )
+
+upload_store = create_upload_store()
@@ -0,0 +1,122 @@
+import time
+from typing import Optional
+import redis.asyncio as aioredis
+from ..core.config import settings
+
+PENDING_KEY = "scan:pending"
+QUEUED_KEY = "scan:queued"  # Set mirror of the pending list, so an id is queued at most once
+CLAIMED_KEY = "scan:claimed"  # Popped ids being scanned, scored by when they were taken
+METRICS_KEY = "scan:metrics"
+
+# KEYS: pending, queued, claimed; ARGV: claims taken before this time are treated as lost
+# (0 to keep them all), then the ids. Queues the ids that are neither queued nor being scanned.
+ENQUEUE_SCRIPT = """
+if tonumber(ARGV[1]) > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+end
+local added = 0
+for i = 2, #ARGV do
+    if not redis.call('ZSCORE', KEYS[3], ARGV[i]) and redis.call('SADD', KEYS[2], ARGV[i]) == 1 then
+        redis.call('RPUSH', KEYS[1], ARGV[i])
+        added = added + 1
+    end
+end
+return {added, redis.call('LLEN', KEYS[1])}
+"""
+
+# KEYS: pending, queued, claimed; ARGV: batch size, now. Pops ids and claims them in one step.
+POP_SCRIPT = """
+local ids = redis.call('LPOP', KEYS[1], ARGV[1])
+if not ids then
+    return {}
+end
+for _, id in ipairs(ids) do
+    redis.call('SREM', KEYS[2], id)
+    redis.call('ZADD', KEYS[3], ARGV[2], id)
+end
+return ids
+"""
+
+class ScanQueue:
+    """Redis list of attachment ids waiting for a background virus scan.
+
+    An id is either pending (in the list, mirrored in a set) or claimed by a
+    worker until it calls finish(), and it is never queued twice. The sweep
+    only adds ids that are in neither state, so it can run while workers pop.
+    A claim older than claim_ttl is taken to belong to a dead worker, and its
+    id may be queued again.
+    """
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        max_depth: int = settings.scan_queue_max_depth,
+        claim_ttl: int = settings.scan_claim_ttl
+    ):
+        self.client = client
+        self.max_depth = max_depth
+        self.claim_ttl = claim_ttl
+        self._enqueue = client.register_script(ENQUEUE_SCRIPT)
+        self._pop = client.register_script(POP_SCRIPT)
+
+    async def depth(self) -> int:
+        return await self.client.llen(PENDING_KEY)
+
+    async def has_capacity(self) -> bool:
+        """Backpressure check; an unreachable Redis counts as full so uploads scan inline"""
+        try:
+            return await self.depth() < self.max_depth
+        except Exception:
+            return False
+
+    async def enqueue(self, *attachment_ids: int) -> int:
+        """Queue ids for scanning (skipping any already queued or being scanned) and return the new queue depth"""
+        if not attachment_ids:
+            return await self.depth()
+        added, depth = await self._enqueue(keys=[PENDING_KEY, QUEUED_KEY, CLAIMED_KEY], args=[0, *attachment_ids])
+        await self._record_enqueued(added)
+        return depth
+
+    async def enqueue_missing(self, attachment_ids: list[int]) -> int:
+        """Sweep: queue the pending ids the queue has lost track of, including expired claims; returns how many"""
+        if not attachment_ids:
+            return 0
+        lost_before = time.time() - self.claim_ttl
+        added, _ = await self._enqueue(keys=[PENDING_KEY, QUEUED_KEY, CLAIMED_KEY], args=[lost_before, *attachment_ids])
+        await self._record_enqueued(added)
+        return added
+
+    async def _record_enqueued(self, added: int):
+        if added:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.hincrby(METRICS_KEY, "enqueued", added)
+                pipe.hset(METRICS_KEY, "last_enqueued_at", int(time.time()))
+                await pipe.execute()
+
+    async def pop_batch(self, size: int) -> list[int]:
+        """Take up to size ids; each stays claimed until finish()"""
+        ids = await self._pop(keys=[PENDING_KEY, QUEUED_KEY, CLAIMED_KEY], args=[size, time.time()])
+        return [int(i) for i in ids or []]
+
+    async def finish(self, *attachment_ids: int):
+        """Release the claims on ids that are done (or already queued again for a retry)"""
+        if attachment_ids:
+            await self.client.zrem(CLAIMED_KEY, *attachment_ids)
+
+    async def record(self, **counters: int):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for name, value in counters.items():
+                if value:
+                    pipe.hincrby(METRICS_KEY, name, value)
+            await pipe.execute()
+
+    async def metrics(self) -> dict:
+        raw = await self.client.hgetall(METRICS_KEY)
+        metrics = {k: int(v) for k, v in raw.items()}
+        metrics["depth"] = await self.depth()
+        metrics["max_depth"] = self.max_depth
+        return metrics
+
+def create_scan_queue(redis_url: Optional[str] = None) -> ScanQueue:
+    return ScanQueue(aioredis.Redis.from_url(redis_url or settings.redis_url, decode_responses=True))
+
+scan_queue = create_scan_queue()
@@ -0,0 +1,119 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+import redis.asyncio as aioredis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..models.models import ServiceRequest
+
+logger = logging.getLogger(__name__)
+
+STATUS_PREFIX = "request_status:"
+MISSING = ""  # Cached answer for an ID with no request behind it
+
+class StatusCache:
+    """Public status lookups, answered from Redis with the database as the source of truth.
+
+    RequestService writes every status change through to the cache, so
+    entries only expire to bound the damage of a lost write. Unknown IDs are
+    remembered for missing_ttl seconds, which keeps scans of random IDs off
+    the database. The optional in-process tier (local_ttl > 0) is only
+    updated by this process's writes, so it may lag other processes by up to
+    local_ttl seconds.
+    """
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        ttl: int = settings.status_cache_ttl,
+        missing_ttl: int = settings.status_cache_missing_ttl,
+        local_ttl: float = settings.status_cache_local_ttl,
+        local_size: int = settings.status_cache_local_size
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.local: OrderedDict[int, tuple[float, str]] = OrderedDict()
+
+    async def get(self, db: AsyncSession, request_id: int) -> Optional[str]:
+        """Status value of a request, or None if there is no such request"""
+        return (await self.get_many(db, [request_id]))[request_id]
+
+    async def get_many(self, db: AsyncSession, request_ids: Iterable[int]) -> dict[int, Optional[str]]:
+        """Status of each ID (None where missing): local tier, then one Redis MGET, then one query for the rest"""
+        found: dict[int, str] = {}
+        wanted = list(dict.fromkeys(request_ids))
+        now = time.monotonic()
+        pending = []
+        for request_id in wanted:
+            entry = self.local.get(request_id)
+            if entry and entry[0] > now:
+                found[request_id] = entry[1]
+            else:
+                pending.append(request_id)
+
+        if pending:
+            try:
+                cached = await self.client.mget([STATUS_PREFIX + str(request_id) for request_id in pending])
+            except Exception:
+                logger.warning("Status cache unavailable; reading from the database", exc_info=True)
+                cached = [None] * len(pending)
+            misses = []
+            for request_id, value in zip(pending, cached):
+                if value is None:
+                    misses.append(request_id)
+                else:
+                    found[request_id] = value
+                    self._remember(request_id, value)
+            if misses:
+                found.update(await self._load(db, misses))
+
+        return {request_id: found[request_id] or None for request_id in wanted}
+
+    async def _load(self, db: AsyncSession, request_ids: list[int]) -> dict[int, str]:
+        result = await db.execute(
+            select(ServiceRequest.id, ServiceRequest.status).where(ServiceRequest.id.in_(request_ids))
+        )
+        loaded = {request_id: MISSING for request_id in request_ids}
+        loaded.update({request_id: status.value for request_id, status in result.all()})
+        await self._store(loaded, fill=True)
+        return loaded
+
+    async def set(self, request_id: int, status: str):
+        """Write-through after a committed status change (or a new request, replacing any cached miss)"""
+        await self._store({request_id: status})
+
+    async def _store(self, statuses: dict[int, str], fill: bool = False):
+        """Cache statuses; fill=True (a read-fill) only adds keys nobody has written meanwhile.
+
+        A reader may load a status just before an update commits and writes the
+        new one through; with SET NX its late write cannot replace the newer value.
+        """
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for request_id, value in statuses.items():
+                    pipe.set(STATUS_PREFIX + str(request_id), value, ex=self.ttl if value else self.missing_ttl, nx=fill)
+                written = await pipe.execute()
+        except Exception:
+            logger.warning("Could not update the status cache", exc_info=True)
+            written = [True] * len(statuses)
+        for (request_id, value), stored in zip(statuses.items(), written):
+            # A fill that lost to a write-through must not reach the local tier either
+            if stored:
+                self._remember(request_id, value)
+
+    def _remember(self, request_id: int, value: str):
+        if self.local_ttl <= 0:
+            return
+        self.local[request_id] = (time.monotonic() + min(self.local_ttl, self.ttl if value else self.missing_ttl), value)
+        self.local.move_to_end(request_id)
+        while len(self.local) > self.local_size:
+            self.local.popitem(last=False)
+
+def create_status_cache(redis_url: Optional[str] = None) -> StatusCache:
+    return StatusCache(aioredis.Redis.from_url(redis_url or settings.redis_url, decode_responses=True))
+
+status_cache = create_status_cache()
@@ -0,0 +1,419 @@
+import os
+import uuid
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+from aiofiles import open as aio_open
+from ..core.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+def content_disposition(disposition: str, filename: str) -> str:
+    """Content-Disposition value for a user-supplied filename.
+
+    Headers are Latin-1, so names outside plain ASCII (or containing quotes)
+    go in an RFC 5987 filename* parameter, with an ASCII filename fallback
+    for clients that do not read it.
+    """
+    quoted = quote(filename, safe="")
+    if quoted == filename:
+        return f'{disposition}; filename="{filename}"'
+    fallback = "".join(char if " " <= char <= "~" and char not in '"\\' else "_" for char in filename)
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quoted}"
+
+def parse_range(header: Optional[str], size: int):
+    """(start, end) of a single "bytes=" range, None for the whole file, or "invalid" for a 416"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None  # Multi-range requests get the whole file
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1  # Suffix range: the last N bytes
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return "invalid"
+    return start, min(end, size - 1)
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    modified: float  # Unix timestamp
+
+class StorageWriter(ABC):
+    """Streams one upload into the backend; the final key is chosen at commit time"""
+
+    @abstractmethod
+    async def write(self, chunk: bytes):
+        ...
+
+    @abstractmethod
+    async def commit(self, key: str) -> bool:
+        """Store the data under key. Returns False if the key already held a copy (nothing written)."""
+
+    @abstractmethod
+    async def abort(self):
+        ...
+
+class StorageBackend(ABC):
+    """Where attachment bytes live. Keys are relative, '/'-separated paths."""
+
+    @abstractmethod
+    def open_writer(self) -> StorageWriter:
+        ...
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def size(self, key: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield bytes [start, end] (inclusive, like an HTTP Range) of the object"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def move(self, key: str, new_key: str):
+        ...
+
+    @abstractmethod
+    def iter_keys(self, start_after: str = "") -> AsyncIterator[StoredObject]:
+        """Every stored object with a key greater than start_after, in ascending code point order"""
+
+    async def presigned_url(self, key: str, expires: int, filename: Optional[str] = None) -> Optional[str]:
+        """Direct download URL, or None when the backend cannot hand out one"""
+        return None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path of the object when it is on a local disk"""
+        return None
+
+# Local filesystem
+
+class _LocalWriter(StorageWriter):
+    def __init__(self, backend: "LocalStorageBackend"):
+        self.backend = backend
+        self.temp_path = backend.temp_dir / uuid.uuid4().hex
+        self._file = None
+
+    async def write(self, chunk: bytes):
+        if self._file is None:
+            self.temp_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = await aio_open(self.temp_path, "wb")
+        await self._file.write(chunk)
+
+    async def _close(self):
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+    async def commit(self, key: str) -> bool:
+        await self._close()
+        target = self.backend.local_path(key)
+        if target.exists():
+            self.temp_path.unlink(missing_ok=True)
+            return False
+        await asyncio.to_thread(_place_file, self.temp_path, target)
+        return True
+
+    async def abort(self):
+        await self._close()
+        self.temp_path.unlink(missing_ok=True)
+
+class LocalStorageBackend(StorageBackend):
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.temp_dir = self.root / "tmp"
+
+    def local_path(self, key: str) -> Path:
+        # Rows written before keys were relative hold absolute paths under the upload root
+        path = Path(key)
+        return path if path.is_absolute() else self.root / path
+
+    def open_writer(self) -> StorageWriter:
+        return _LocalWriter(self)
+
+    async def exists(self, key: str) -> bool:
+        return self.local_path(key).exists()
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            return self.local_path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        async with aio_open(self.local_path(key), "rb") as f:
+            await f.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = await f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str):
+        self.local_path(key).unlink(missing_ok=True)
+
+    async def move(self, key: str, new_key: str):
+        await asyncio.to_thread(_place_file, self.local_path(key), self.local_path(new_key))
+
+    async def iter_keys(self, start_after: str = "") -> AsyncIterator[StoredObject]:
+        async for obj in self._walk(self.root, "", start_after):
+            yield obj
+
+    async def _walk(self, directory: Path, prefix: str, start_after: str) -> AsyncIterator[StoredObject]:
+        # Only one directory listing is held per level, so the walk stays small on millions of files
+        for name, is_dir, size, modified in await asyncio.to_thread(_list_sorted, directory):
+            key = prefix + name
+            if not is_dir:
+                if key > start_after:
+                    yield StoredObject(key, size, modified)
+                continue
+            subtree = key + "/"
+            # Skip directories whose keys all sort at or before start_after
+            if subtree > start_after or start_after.startswith(subtree):
+                async for obj in self._walk(directory / name, subtree, start_after):
+                    yield obj
+
+def _list_sorted(directory: Path) -> list[tuple[str, bool, int, float]]:
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    entries.append((entry.name, True, 0, 0.0))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    entries.append((entry.name, False, stat.st_size, stat.st_mtime))
+    except FileNotFoundError:
+        return []
+    # A directory sorts as "name/" so the walk yields full keys in plain string order
+    entries.sort(key=lambda e: e[0] + "/" if e[1] else e[0])
+    return entries
+
+def _place_file(source: Path, target: Path):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(source, target)
+
+# S3-compatible object storage (AWS S3, MinIO, ...)
+
+class _S3Writer(StorageWriter):
+    """Buffers one part at a time; small files become a single PUT, large ones a multipart upload"""
+    def __init__(self, backend: "S3StorageBackend"):
+        self.backend = backend
+        self.temp_key = f"tmp/{uuid.uuid4().hex}"
+        self.buffer = bytearray()
+        self.upload_id: Optional[str] = None
+        self.parts: list[dict] = []
+
+    async def _flush_part(self):
+        async with self.backend._client() as s3:
+            if self.upload_id is None:
+                response = await s3.create_multipart_upload(Bucket=self.backend.bucket, Key=self.temp_key)
+                self.upload_id = response["UploadId"]
+            part_number = len(self.parts) + 1
+            response = await s3.upload_part(
+                Bucket=self.backend.bucket, Key=self.temp_key, UploadId=self.upload_id,
+                PartNumber=part_number, Body=bytes(self.buffer)
+            )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer.clear()
+
+    async def write(self, chunk: bytes):
+        self.buffer.extend(chunk)
+        if len(self.buffer) >= self.backend.part_size:
+            await self._flush_part()
+
+    async def commit(self, key: str) -> bool:
+        if await self.backend.exists(key):
+            await self.abort()
+            return False
+        async with self.backend._client() as s3:
+            if self.upload_id is None:
+                await s3.put_object(Bucket=self.backend.bucket, Key=key, Body=bytes(self.buffer))
+                self.buffer.clear()
+                return True
+        if self.buffer:
+            await self._flush_part()
+        async with self.backend._client() as s3:
+            await s3.complete_multipart_upload(
+                Bucket=self.backend.bucket, Key=self.temp_key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts}
+            )
+        # S3 has no rename: copy server-side, then drop the temporary object
+        await self.backend.move(self.temp_key, key)
+        return True
+
+    async def abort(self):
+        self.buffer.clear()
+        if self.upload_id is not None:
+            async with self.backend._client() as s3:
+                await s3.abort_multipart_upload(Bucket=self.backend.bucket, Key=self.temp_key, UploadId=self.upload_id)
+            self.upload_id = None
+
+class S3StorageBackend(StorageBackend):
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024
+    ):
+        try:
+            import aioboto3
+        except ImportError as e:
+            raise RuntimeError("The S3 storage backend requires the aioboto3 package") from e
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # S3 minimum for all but the last part
+        self.session = aioboto3.Session(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region
+        )
+
+    def _client(self):
+        return self.session.client("s3", endpoint_url=self.endpoint_url)
+
+    def open_writer(self) -> StorageWriter:
+        return _S3Writer(self)
+
+    async def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+        async with self._client() as s3:
+            try:
+                return await s3.head_object(Bucket=self.bucket, Key=key)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return None
+                raise
+
+    async def exists(self, key: str) -> bool:
+        return await self._head(key) is not None
+
+    async def size(self, key: str) -> Optional[int]:
+        head = await self._head(key)
+        return head["ContentLength"] if head else None
+
+    async def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        params = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+        async with self._client() as s3:
+            response = await s3.get_object(**params)
+            async with response["Body"] as body:
+                while True:
+                    chunk = await body.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    async def delete(self, key: str):
+        async with self._client() as s3:
+            await s3.delete_object(Bucket=self.bucket, Key=key)
+
+    async def move(self, key: str, new_key: str):
+        async with self._client() as s3:
+            await s3.copy_object(Bucket=self.bucket, Key=new_key, CopySource={"Bucket": self.bucket, "Key": key})
+            await s3.delete_object(Bucket=self.bucket, Key=key)
+
+    async def iter_keys(self, start_after: str = "") -> AsyncIterator[StoredObject]:
+        # S3 lists keys in UTF-8 byte order, which matches code point order
+        async with self._client() as s3:
+            paginator = s3.get_paginator("list_objects_v2")
+            async for page in paginator.paginate(Bucket=self.bucket, StartAfter=start_after):
+                for item in page.get("Contents", []):
+                    yield StoredObject(item["Key"], item["Size"], item["LastModified"].timestamp())
+
+    async def presigned_url(self, key: str, expires: int, filename: Optional[str] = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition("attachment", filename)
+        async with self._client() as s3:
+            return await s3.generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
+
+# In-process fake, used by the tests and for running without any shared storage
+
+class _MemoryWriter(StorageWriter):
+    def __init__(self, backend: "MemoryStorageBackend"):
+        self.backend = backend
+        self.buffer = bytearray()
+
+    async def write(self, chunk: bytes):
+        self.buffer.extend(chunk)
+
+    async def commit(self, key: str) -> bool:
+        if key in self.backend.objects:
+            return False
+        self.backend.objects[key] = bytes(self.buffer)
+        return True
+
+    async def abort(self):
+        self.buffer.clear()
+
+class MemoryStorageBackend(StorageBackend):
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    def open_writer(self) -> StorageWriter:
+        return _MemoryWriter(self)
+
+    async def exists(self, key: str) -> bool:
+        return key in self.objects
+
+    async def size(self, key: str) -> Optional[int]:
+        data = self.objects.get(key)
+        return None if data is None else len(data)
+
+    async def iter_chunks(self, key: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        data = self.objects[key]
+        stop = len(data) if end is None else min(end + 1, len(data))
+        for offset in range(start, stop, chunk_size):
+            yield data[offset:min(offset + chunk_size, stop)]
+
+    async def delete(self, key: str):
+        self.objects.pop(key, None)
+
+    async def move(self, key: str, new_key: str):
+        self.objects[new_key] = self.objects.pop(key)
+
+    async def iter_keys(self, start_after: str = "") -> AsyncIterator[StoredObject]:
+        # No timestamps in memory; every object counts as old
+        for key in sorted(k for k in self.objects if k > start_after):
+            yield StoredObject(key, len(self.objects[key]), 0.0)
+
+    async def presigned_url(self, key: str, expires: int, filename: Optional[str] = None) -> Optional[str]:
+        return f"memory://{key}?expires={expires}"
+
+def create_storage() -> StorageBackend:
+    if settings.storage_backend == "s3":
+        return S3StorageBackend(
+            bucket=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key
+        )
+    if settings.storage_backend == "memory":
+        return MemoryStorageBackend()
+    return LocalStorageBackend(settings.storage_root)
+
+storage = create_storage()
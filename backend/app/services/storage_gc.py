@@ -0,0 +1,206 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+import redis.asyncio as aioredis
+from sqlalchemy import case, func, select, union, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..models.models import Attachment, AttachmentBlob
+from .image_variants import variant_names
+from .storage import StorageBackend, storage
+
+logger = logging.getLogger(__name__)
+
+CURSOR_KEY = "storage_gc:cursor"
+PASS_KEY = "storage_gc:pass"
+REPORT_KEY = "storage_gc:last_report"
+RUNNING_KEY = "storage_gc:running"
+
+class StorageReconciler:
+    """Finds stored files no row references (orphans) and rows whose file is gone (missing).
+
+    Storage keys and referenced keys are both read in ascending order and
+    merge-joined, one batch of storage keys per run. The position is kept in
+    Redis, so a pass over millions of files is a chain of small, restartable
+    runs that never hold a full listing in memory.
+    """
+    def __init__(
+        self,
+        db: AsyncSession,
+        client: aioredis.Redis,
+        storage_backend: Optional[StorageBackend] = None,
+        grace_seconds: int = settings.storage_gc_grace_seconds
+    ):
+        self.db = db
+        self.client = client
+        self.storage = storage_backend or storage
+        self.grace_seconds = grace_seconds
+        self.variant_suffixes = {f".{variant}" for variant in variant_names()}
+        self.legacy_root = settings.storage_root.rstrip("/") + "/"
+
+    def _skipped_prefixes(self) -> tuple[str, ...]:
+        # Partial resumable uploads are cleaned up by their own expiry task
+        try:
+            return (Path(settings.resumable_upload_dir).relative_to(settings.storage_root).as_posix() + "/",)
+        except ValueError:
+            return ()
+
+    def _referenced_keys(self, after: str, upto: Optional[str]):
+        """Storage keys the database points at, in the same order the backends list them"""
+        # Rows from before keys were relative hold absolute paths under the upload root
+        attachment_key = case(
+            (Attachment.file_path.startswith(self.legacy_root, autoescape=True),
+             func.substr(Attachment.file_path, len(self.legacy_root) + 1)),
+            else_=Attachment.file_path
+        )
+        refs = union(
+            select(AttachmentBlob.file_path.label("key")),
+            select(attachment_key.label("key"))
+        ).subquery()
+        key = refs.c.key
+        if self.db.bind.dialect.name == "postgresql":
+            key = key.collate("C")  # Byte order, like the storage listing, whatever the database locale
+        # Absolute paths outside the upload root are not something the backend can list
+        stmt = select(refs.c.key).where(key > after, ~refs.c.key.startswith("/"))
+        if upto is not None:
+            stmt = stmt.where(key <= upto)
+        return stmt.order_by(key).execution_options(yield_per=1000)
+
+    def _variant_original(self, key: str) -> Optional[str]:
+        for suffix in self.variant_suffixes:
+            if key.endswith(suffix):
+                return key[:-len(suffix)]
+        return None
+
+    async def _is_referenced(self, key: str) -> bool:
+        """Point lookup for an original that fell in the previous batch"""
+        result = await self.db.execute(
+            select(AttachmentBlob.sha256).where(AttachmentBlob.file_path == key).limit(1)
+        )
+        if result.first():
+            return True
+        result = await self.db.execute(
+            select(Attachment.id).where(Attachment.file_path.in_([key, self.legacy_root + key])).limit(1)
+        )
+        return result.first() is not None
+
+    async def run_batch(self, batch_size: int = settings.storage_gc_batch_size, dry_run: bool = False) -> dict:
+        cursor = await self.client.get(CURSOR_KEY) or ""
+        skipped = self._skipped_prefixes()
+        batch = []
+        async for obj in self.storage.iter_keys(start_after=cursor):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                break
+        finished = len(batch) < batch_size
+        upto = None if finished else batch[-1].key
+
+        orphans, missing, recent = [], [], 0
+        missing_count = 0
+        refs = await self.db.stream(self._referenced_keys(cursor, upto))
+        ref_iter = aiter(refs.scalars())
+        ref = await anext(ref_iter, None)
+        matched = None
+
+        async def next_missing(key: str):
+            nonlocal missing_count
+            missing.append(key)
+            missing_count += 1
+            if len(missing) >= batch_size:
+                await self._mark_missing(missing, dry_run)
+                missing.clear()
+
+        for obj in batch:
+            while ref is not None and ref < obj.key:
+                await next_missing(ref)
+                ref = await anext(ref_iter, None)
+            if ref == obj.key:
+                matched = ref
+                ref = await anext(ref_iter, None)
+                continue
+            # Image variants sort straight after their original: ab/cd/<sha256>.thumb.webp
+            original = self._variant_original(obj.key)
+            if original and (original == matched or (original <= cursor and await self._is_referenced(original))):
+                continue
+            if obj.key.startswith(skipped):
+                continue
+            # Uploads land in storage before their row commits; leave anything recent alone
+            if obj.modified > time.time() - self.grace_seconds:
+                recent += 1
+                continue
+            orphans.append(obj)
+        # Past the last stored key, every remaining reference is missing
+        while ref is not None:
+            await next_missing(ref)
+            ref = await anext(ref_iter, None)
+        await refs.close()
+        await self._mark_missing(missing, dry_run)
+        if not dry_run:
+            await self.db.commit()
+
+        removed = failed = 0
+        for obj in orphans:
+            logger.info("Orphaned upload %s (%d bytes)%s", obj.key, obj.size, " [dry run]" if dry_run else "")
+            if dry_run:
+                continue
+            try:
+                await self.storage.delete(obj.key)
+                removed += 1
+            except Exception:
+                failed += 1
+                logger.warning("Could not remove orphaned upload %s", obj.key, exc_info=True)
+
+        counts = {
+            "checked": len(batch),
+            "orphans": len(orphans),
+            "orphans_removed": removed,
+            "orphan_bytes": sum(obj.size for obj in orphans),
+            "unlink_failures": failed,
+            "recent_skipped": recent,
+            "missing": missing_count,
+        }
+        await self._advance(counts, "" if finished else batch[-1].key, finished)
+        return {**counts, "finished": finished}
+
+    async def _mark_missing(self, keys: list[str], dry_run: bool):
+        if not keys:
+            return
+        logger.warning("%d attachment file(s) missing from storage, e.g. %s", len(keys), keys[:5])
+        if dry_run:
+            return
+        # A row committed after the storage listing was read can point at a file the
+        # listing missed; like orphans, anything inside the grace window is left alone
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.grace_seconds)
+        # Only rows still waiting for a scan are marked, with the marker the scanner uses, so they
+        # drop out of the scan queue; a scanned row keeps its verdict, and every missing file is
+        # counted in the pass report and logged above
+        await self.db.execute(
+            update(Attachment)
+            .where(
+                Attachment.file_path.in_(keys + [self.legacy_root + key for key in keys]),
+                Attachment.is_scanned == 0,
+                Attachment.created_at < cutoff
+            )
+            .values(scan_result="File missing")
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _advance(self, counts: dict, cursor: str, finished: bool):
+        async with self.client.pipeline(transaction=True) as pipe:
+            for name, value in counts.items():
+                pipe.hincrby(PASS_KEY, name, value)
+            pipe.set(CURSOR_KEY, cursor)
+            if finished:
+                pipe.hset(PASS_KEY, "finished_at", int(time.time()))
+                pipe.rename(PASS_KEY, REPORT_KEY)
+            await pipe.execute()
+
+    async def report(self) -> dict:
+        return {
+            "cursor": await self.client.get(CURSOR_KEY) or "",
+            "running": bool(await self.client.exists(RUNNING_KEY)),
+            "current_pass": {k: int(v) for k, v in (await self.client.hgetall(PASS_KEY)).items()},
+            "last_report": {k: int(v) for k, v in (await self.client.hgetall(REPORT_KEY)).items()},
+        }
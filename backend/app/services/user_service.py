@@ -1,5 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import lambda_stmt, select
 from typing import Optional
 from datetime import timedelta
 from ..models.models import User
@@ -12,11 +12,12 @@ class UserService:
         self.db = db
     
     async def get_user_by_email(self, email: str) -> Optional[User]:
-        result = await self.db.execute(select(User).where(User.email == email))
+        # Cached lambda statement: runs on every authenticated request
+        result = await self.db.execute(lambda_stmt(lambda: select(User).where(User.email == email)))
         return result.scalar_one_or_none()
     
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
-        result = await self.db.execute(select(User).where(User.id == user_id))
+        result = await self.db.execute(lambda_stmt(lambda: select(User).where(User.id == user_id)))
         return result.scalar_one_or_none()
     
     async def create_user(self, user_create: UserCreate) -> User:
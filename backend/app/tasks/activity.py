@@ -0,0 +1,13 @@
+import asyncio
+from ..core.database import AsyncSessionLocal, engine
+from ..services.activity import repair_activity_counters
+
+async def _repair_counters() -> dict:
+    try:
+        async with AsyncSessionLocal() as db:
+            return await repair_activity_counters(db)
+    finally:
+        await engine.dispose()
+
+def repair_counters() -> dict:
+    return asyncio.run(_repair_counters())
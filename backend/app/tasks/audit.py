@@ -0,0 +1,18 @@
+import asyncio
+from ..core.database import AsyncSessionLocal, engine
+from ..services.audit_partitions import AuditPartitionManager
+
+async def _maintain_partitions() -> dict:
+    try:
+        if engine.dialect.name != "postgresql":
+            return {"skipped": True}
+        async with AsyncSessionLocal() as db:
+            manager = AuditPartitionManager(db)
+            created = await manager.ensure_partitions()
+            archived = await manager.apply_retention()
+        return {"created": created, "archived": archived}
+    finally:
+        await engine.dispose()
+
+def maintain_partitions() -> dict:
+    return asyncio.run(_maintain_partitions())
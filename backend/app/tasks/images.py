@@ -0,0 +1,17 @@
+import asyncio
+from ..core.database import AsyncSessionLocal, engine
+from ..services.attachment_service import AttachmentService
+
+async def _generate_variants(attachment_id: int) -> dict:
+    try:
+        async with AsyncSessionLocal() as db:
+            service = AttachmentService(db)
+            attachment = await service.get_attachment_by_id(attachment_id)
+            if not attachment:
+                return {"generated": 0}
+            return {"generated": await service.generate_variants(attachment)}
+    finally:
+        await engine.dispose()
+
+def generate_variants(attachment_id: int) -> dict:
+    return asyncio.run(_generate_variants(attachment_id))
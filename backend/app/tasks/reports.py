@@ -1,2 +1,58 @@
-def generate_weekly_report() -> dict:
-    return {"status": "sent"}
+import asyncio
+import logging
+import smtplib
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Optional
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal, ReadSessionLocal, engine, read_engine
+from ..services.reports import ReportService, report_csv, report_html
+
+logger = logging.getLogger(__name__)
+
+async def _build_report(week_start: Optional[datetime]) -> dict:
+    try:
+        # Reporting reads only, so it runs on the replica when there is one
+        async with (ReadSessionLocal or AsyncSessionLocal)() as db:
+            return await ReportService(db).weekly(week_start)
+    finally:
+        await engine.dispose()
+        if read_engine is not None:
+            await read_engine.dispose()
+
+def _write(report: dict, csv_files: dict[str, str], page: str) -> Path:
+    directory = Path(settings.report_dir) / f"weekly-{report['week_start']}"
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, content in {**csv_files, "report.html": page}.items():
+        (directory / name).write_text(content, encoding="utf-8")
+    return directory
+
+def _send(report: dict, csv_files: dict[str, str], page: str) -> bool:
+    recipients = [address.strip() for address in (settings.report_recipients or "").split(",") if address.strip()]
+    if not (settings.smtp_server and settings.from_email and recipients):
+        return False
+    message = EmailMessage()
+    message["Subject"] = f"Weekly report {report['week_start']} to {report['week_end']}"
+    message["From"] = settings.from_email
+    message["To"] = ", ".join(recipients)
+    message.set_content("The weekly report is attached as HTML and CSV.")
+    message.add_alternative(page, subtype="html")
+    for name, content in csv_files.items():
+        message.add_attachment(content.encode("utf-8"), maintype="text", subtype="csv", filename=name)
+    with smtplib.SMTP(settings.smtp_server, settings.smtp_port, timeout=30) as smtp:
+        smtp.starttls()
+        if settings.smtp_username:
+            smtp.login(settings.smtp_username, settings.smtp_password or "")
+        smtp.send_message(message)
+    return True
+
+def generate_weekly_report(week_start: Optional[str] = None) -> dict:
+    """Report on the last complete week (or the week starting at week_start, an ISO date)"""
+    start = datetime.fromisoformat(week_start).replace(tzinfo=timezone.utc) if week_start else None
+    report = asyncio.run(_build_report(start))
+    csv_files, page = report_csv(report), report_html(report)
+    directory = _write(report, csv_files, page)
+    sent = _send(report, csv_files, page)
+    logger.info("Weekly report for %s written to %s%s", report["week_start"], directory, " and mailed" if sent else "")
+    return {"status": "sent" if sent else "written", "week_start": report["week_start"], "path": str(directory)}
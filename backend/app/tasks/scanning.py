@@ -0,0 +1,82 @@
+import asyncio
+import time
+from sqlalchemy import select
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal, engine
+from ..models.models import Attachment
+from ..services.attachment_service import AttachmentService
+from ..services.clamav import ClamAVClient
+from ..services.scan_queue import create_scan_queue
+
+async def _scan_batch(batch_size: int) -> dict:
+    queue = create_scan_queue()
+    clamav = ClamAVClient(
+        host=settings.clamav_host,
+        port=settings.clamav_port,
+        pool_size=settings.clamav_pool_size,
+        connect_timeout=settings.clamav_connect_timeout,
+        timeout=settings.clamav_timeout
+    )
+    counts = {"scanned_clean": 0, "scanned_infected": 0, "scan_errors": 0, "requeued": 0}
+    started = time.monotonic()
+    try:
+        ids = await queue.pop_batch(batch_size)
+        if not ids:
+            return {"scanned": 0, "remaining": 0}
+        async with AsyncSessionLocal() as db:
+            service = AttachmentService(db)
+            service.clamav = clamav
+            result = await db.execute(
+                select(Attachment).where(Attachment.id.in_(ids), Attachment.is_scanned == 0)
+            )
+            attachments = []
+            for attachment in result.scalars().all():
+                if await service.storage.exists(attachment.file_path):
+                    attachments.append(attachment)
+                else:
+                    # Nothing to scan; leave it for storage reconciliation rather than retrying forever
+                    attachment.scan_result = "File missing"
+                    counts["scan_errors"] += 1
+            verdicts = await asyncio.gather(*[service._scan_file(a.file_path) for a in attachments])
+            retry = []
+            for attachment, (is_scanned, scan_result) in zip(attachments, verdicts):
+                if is_scanned == 0:
+                    # Scanner unavailable or errored: keep it pending and try again later
+                    counts["scan_errors"] += 1
+                    retry.append(attachment.id)
+                    continue
+                await service.apply_scan_result(attachment, is_scanned, scan_result)
+                counts["scanned_clean" if is_scanned == 1 else "scanned_infected"] += 1
+            await db.commit()
+            for attachment in attachments:
+                await service._queue_variants(attachment)
+        if retry:
+            # Release the claims first, or enqueue would skip ids it still sees being scanned
+            await queue.finish(*retry)
+            await queue.enqueue(*retry)
+            counts["requeued"] = len(retry)
+        await queue.finish(*ids)
+        await queue.record(**counts, scan_ms=int((time.monotonic() - started) * 1000), batches=1)
+        return {"scanned": len(attachments), "retry": len(retry), "remaining": await queue.depth()}
+    finally:
+        await clamav.close()
+        await queue.client.aclose()
+        await engine.dispose()
+
+async def _requeue_pending() -> dict:
+    queue = create_scan_queue()
+    try:
+        async with AsyncSessionLocal() as db:
+            ids = await AttachmentService(db).get_pending_scan_ids(limit=settings.scan_queue_max_depth)
+        # Only ids the queue has lost track of; ones queued or being scanned are left alone
+        requeued = await queue.enqueue_missing(ids)
+        return {"requeued": requeued, "depth": await queue.depth()}
+    finally:
+        await queue.client.aclose()
+        await engine.dispose()
+
+def scan_batch(batch_size: int = settings.scan_batch_size) -> dict:
+    return asyncio.run(_scan_batch(batch_size))
+
+def requeue_pending() -> dict:
+    return asyncio.run(_requeue_pending())
@@ -0,0 +1,13 @@
+import asyncio
+from ..core.database import AsyncSessionLocal, engine
+from ..services.request_stats import RequestStatsService
+
+async def _rebuild_counts() -> dict:
+    try:
+        async with AsyncSessionLocal() as db:
+            return {"requests": await RequestStatsService(db).rebuild_counts()}
+    finally:
+        await engine.dispose()
+
+def rebuild_counts() -> dict:
+    return asyncio.run(_rebuild_counts())
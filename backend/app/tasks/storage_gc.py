@@ -0,0 +1,24 @@
+import asyncio
+import redis.asyncio as aioredis
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal, engine
+from ..services.storage_gc import RUNNING_KEY, StorageReconciler
+
+async def _reconcile_batch(continuation: bool, dry_run: bool) -> dict:
+    client = aioredis.Redis.from_url(settings.redis_url, decode_responses=True)
+    try:
+        # A new pass must not start while a chain of batches is still walking the storage
+        if not continuation and await client.exists(RUNNING_KEY):
+            return {"skipped": True, "finished": True}
+        await client.set(RUNNING_KEY, 1, ex=30 * 60)
+        async with AsyncSessionLocal() as db:
+            result = await StorageReconciler(db, client).run_batch(dry_run=dry_run)
+        if result["finished"]:
+            await client.delete(RUNNING_KEY)
+        return result
+    finally:
+        await client.aclose()
+        await engine.dispose()
+
+def reconcile_batch(continuation: bool = False, dry_run: bool = False) -> dict:
+    return asyncio.run(_reconcile_batch(continuation, dry_run))
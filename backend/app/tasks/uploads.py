@@ -0,0 +1,12 @@
+import asyncio
+from ..services.resumable_uploads import create_upload_store
+
+async def _purge_expired() -> dict:
+    store = create_upload_store()
+    try:
+        return {"removed": await store.purge_expired()}
+    finally:
+        await store.client.aclose()
+
+def purge_expired() -> dict:
+    return asyncio.run(_purge_expired())
@@ -0,0 +1,88 @@
+"""Python-side cost of the hot queries, per simulated API request.
+
+    cd backend && python -m benchmarks.statement_cache [--iterations 5000]
+
+"prepare" is what SQLAlchemy does before it can look the SQL up in its
+compiled cache: building the statement and generating its cache key.
+"execute" runs the statement through an ORM session on in-memory SQLite,
+which adds the cache lookup, parameter binding and result handling.
+
+"before" rebuilds every select() per call, as the services used to; "after"
+uses the pre-built request-list statements and lambda statements.
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, desc, func, lambda_stmt, or_, select, tuple_
+from sqlalchemy.orm import Session
+from app.models.models import Base, Comment, ServiceRequest, User, RequestCategory, RequestStatus, UserRole
+from app.schemas.request import ServiceRequestFilter
+from app.services.request_service import RequestService, list_statements
+
+FILTERS = ServiceRequestFilter.model_construct(status=RequestStatus.SUBMITTED, category=RequestCategory.OTHER, search="pothole")
+CURSOR = (datetime(2024, 1, 1, tzinfo=timezone.utc), 100)
+
+def before(request_id: int, email: str):
+    """The statements one request list + detail + comments page used to build"""
+    user = select(User).where(User.email == email)
+    query = select(ServiceRequest).join(User, ServiceRequest.citizen_id == User.id)
+    query = query.where(ServiceRequest.status == FILTERS.status)
+    query = query.where(ServiceRequest.category == FILTERS.category)
+    term = f"%{FILTERS.search}%"
+    query = query.where(or_(ServiceRequest.title.ilike(term), ServiceRequest.description.ilike(term), User.full_name.ilike(term)))
+    count = select(func.count()).select_from(query.subquery())
+    page = query.order_by(ServiceRequest.created_at.desc(), ServiceRequest.id.desc()).offset(0).limit(20)
+    detail = select(ServiceRequest).where(ServiceRequest.id == request_id)
+    comments = select(Comment).where(Comment.request_id == request_id).where(Comment.is_internal == False)
+    comments = comments.where(tuple_(Comment.created_at, Comment.id) < tuple_(*CURSOR))
+    comments = comments.order_by(desc(Comment.created_at), desc(Comment.id)).limit(51)
+    return [(user, {}), (count, {}), (page, {}), (detail, {}), (comments, {})]
+
+def after(request_id: int, email: str):
+    """The same queries as the services now build them"""
+    user = lambda_stmt(lambda: select(User).where(User.email == email))
+    shape, values = RequestService(None).list_filters(FILTERS)
+    count, page = list_statements(shape)
+    detail = lambda_stmt(lambda: select(ServiceRequest).where(ServiceRequest.id == request_id))
+    comments = lambda_stmt(lambda: select(Comment).where(Comment.request_id == request_id))
+    comments += lambda q: q.where(Comment.is_internal == False)
+    created_at, comment_id = CURSOR
+    comments += lambda q: q.where(tuple_(Comment.created_at, Comment.id) < tuple_(created_at, comment_id))
+    page_size = 51
+    comments += lambda q: q.order_by(desc(Comment.created_at), desc(Comment.id)).limit(page_size)
+    return [(user, {}), (count, values), (page, {**values, "skip": 0, "limit": 20}), (detail, {}), (comments, {})]
+
+def prepare(build, iterations: int) -> float:
+    start = time.perf_counter()
+    for n in range(iterations):
+        for statement, _ in build(n, f"user{n}@example.com"):
+            statement._generate_cache_key()
+    return (time.perf_counter() - start) / iterations
+
+def execute(build, session: Session, iterations: int) -> float:
+    start = time.perf_counter()
+    for n in range(iterations):
+        for statement, params in build(n, f"user{n}@example.com"):
+            session.execute(statement, params).all()
+    return (time.perf_counter() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(id=1, email="user1@example.com", hashed_password="x", full_name="Ann", role=UserRole.CITIZEN))
+        session.commit()
+        for name, build in (("before", before), ("after", after)):
+            # Warm up SQLAlchemy's compiled cache so both sides measure the steady state
+            execute(build, session, 10)
+            prepared = prepare(build, args.iterations) * 1e6
+            executed = execute(build, session, args.iterations) * 1e6
+            print(f"{name:>6}: prepare {prepared:7.1f} us/request   execute {executed:7.1f} us/request")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Weekly report on a large request table: SQL aggregation vs. loading rows into Python.
+
+    cd backend && python -m benchmarks.weekly_report [--requests 1000000] [--url URL]
+
+Seeds --requests requests spread over two years (into a temporary SQLite file
+unless --url names an empty database) and times ReportService.weekly for the
+last seeded week. "python" is the obvious alternative: fetch every request
+and aggregate in the worker.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app.models.models import (
+    Base, OPEN_STATUSES, ServiceRequest, User, RequestCategory, RequestPriority, RequestStatus, UserRole
+)
+from app.services.reports import ReportService
+
+STAFF = 50
+CITIZENS = 5000
+END = datetime(2026, 1, 5, tzinfo=timezone.utc)  # A Monday
+START = END - timedelta(days=2 * 365)
+
+async def seed(url: str, requests: int):
+    engine = create_async_engine(url)
+    rng = random.Random(49)
+    span = (END - START).total_seconds()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": n, "email": f"user{n}@example.com", "hashed_password": "x", "full_name": f"User {n}",
+             "role": UserRole.STAFF if n <= STAFF else UserRole.CITIZEN}
+            for n in range(1, STAFF + CITIZENS + 1)
+        ])
+        for first in range(1, requests + 1, 50_000):
+            rows = []
+            for n in range(first, min(first + 50_000, requests + 1)):
+                created = START + timedelta(seconds=span * n / requests)
+                # Older requests are mostly done; the last few weeks are still being worked
+                done = rng.random() < min(0.97, (END - created).days / 30)
+                hours = rng.lognormvariate(3, 1.2)
+                rows.append({
+                    "id": n, "title": f"Request {n}", "description": "Seeded for the report benchmark",
+                    "category": rng.choice(list(RequestCategory)),
+                    "status": RequestStatus.COMPLETED if done else rng.choice(OPEN_STATUSES),
+                    "priority": rng.choice(list(RequestPriority)),
+                    "citizen_id": rng.randint(STAFF + 1, STAFF + CITIZENS),
+                    "assigned_staff_id": rng.randint(1, STAFF) if rng.random() < 0.9 else None,
+                    "created_at": created,
+                    "completed_at": created + timedelta(hours=hours) if done else None,
+                })
+            await conn.execute(insert(ServiceRequest), rows)
+    await engine.dispose()
+
+async def in_sql(url: str, week: datetime) -> float:
+    engine = create_async_engine(url)
+    async with AsyncSession(engine) as db:
+        await ReportService(db).weekly(week, as_of=END)  # Warm the page cache
+        start = time.perf_counter()
+        await ReportService(db).weekly(week, as_of=END)
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+async def in_python(url: str, week: datetime) -> float:
+    engine = create_async_engine(url)
+    # SQLite hands datetimes back without a timezone; compare everything naive, in UTC
+    week, end, as_of = (moment.replace(tzinfo=None) for moment in (week, week + timedelta(days=7), END))
+    async with AsyncSession(engine) as db:
+        start = time.perf_counter()
+        result = await db.execute(select(
+            ServiceRequest.category, ServiceRequest.status, ServiceRequest.assigned_staff_id,
+            ServiceRequest.created_at, ServiceRequest.completed_at
+        ))
+        opened, hours, ages = {}, {}, []
+        for category, status, staff_id, created, completed in result:
+            created, completed = created.replace(tzinfo=None), completed and completed.replace(tzinfo=None)
+            if week <= created < end:
+                opened[category] = opened.get(category, 0) + 1
+            if completed and week <= completed < end:
+                for key in (category, staff_id):
+                    hours.setdefault(key, []).append((completed - created).total_seconds() / 3600)
+            if status in OPEN_STATUSES:
+                ages.append((as_of - created).days)
+        percentiles = {key: statistics.quantiles(values, n=10) for key, values in hours.items() if len(values) > 1}
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--url", help="async database URL of an empty database (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(directory.name, 'report.db')}"
+    start = time.perf_counter()
+    asyncio.run(seed(url, args.requests))
+    print(f"seeded {args.requests} requests in {time.perf_counter() - start:.1f} s")
+
+    week = END - timedelta(days=7)
+    print(f"   sql: {asyncio.run(in_sql(url, week)) * 1000:8.1f} ms/report")
+    print(f"python: {asyncio.run(in_python(url, week)) * 1000:8.1f} ms/report")
+    directory.cleanup()
+
+if __name__ == "__main__":
+    main()
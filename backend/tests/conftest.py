@@ -1,15 +1,18 @@
 import pytest
+import pytest_asyncio
 import asyncio
 from typing import AsyncGenerator
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
-from app.main import app
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.config import settings
-from app.models.models import Base
+from app.core.query_stats import install_query_stats
+from app.models.models import Base, User, UserRole
+from app.services.status_cache import status_cache
 
 # Test database URL
 TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
@@ -20,6 +23,7 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+install_query_stats(engine)
 
 TestingSessionLocal = sessionmaker(
     autocommit=False,
@@ -35,7 +39,7 @@ def event_loop():
     yield loop
     loop.close()
 
-@pytest.fixture(scope="session", autouse=True)
+@pytest_asyncio.fixture(scope="session")
 async def setup_test_db():
     """Create test database tables."""
     async with engine.begin() as conn:
@@ -44,8 +48,8 @@ async def setup_test_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
-@pytest.fixture
-async def db_session() -> AsyncGenerator[AsyncSession, None]:
+@pytest_asyncio.fixture
+async def db_session(setup_test_db) -> AsyncGenerator[AsyncSession, None]:
     """Create a test database session."""
     async with TestingSessionLocal() as session:
         yield session
@@ -53,16 +57,59 @@ async def db_session() -> AsyncGenerator[AsyncSession, None]:
 @pytest.fixture
 def client(db_session: AsyncSession) -> TestClient:
     """Create a test client with overridden database dependency."""
+    # Imported here so tests of services alone do not load every router
+    from app.main import app
+
     async def override_get_db():
         yield db_session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     with TestClient(app) as test_client:
         yield test_client
     
     app.dependency_overrides.clear()
 
+def _enable_foreign_keys(connection, _):
+    connection.execute("PRAGMA foreign_keys=ON")
+
+@pytest.fixture
+def sqlite_sessions(tmp_path):
+    """Session factory for a fresh SQLite database of its own.
+
+    Every table exists, foreign keys are enforced, and three users are
+    seeded: 1 is a citizen, 2 (Ann) and 3 (Bob) are staff. Connections are
+    not pooled, so a test that fails half way leaves nothing open.
+    """
+    path = tmp_path / "test.db"
+    setup = create_engine(f"sqlite:///{path}")
+    with setup.begin() as conn:
+        Base.metadata.create_all(conn)
+        conn.execute(insert(User), [
+            {"id": 1, "email": "citizen@example.com", "hashed_password": "x", "full_name": "Citizen", "role": UserRole.CITIZEN},
+            {"id": 2, "email": "ann@example.com", "hashed_password": "x", "full_name": "Ann", "role": UserRole.STAFF},
+            {"id": 3, "email": "bob@example.com", "hashed_password": "x", "full_name": "Bob", "role": UserRole.STAFF},
+        ])
+    setup.dispose()
+
+    sqlite_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    event.listen(sqlite_engine.sync_engine, "connect", _enable_foreign_keys)
+    yield sessionmaker(sqlite_engine, class_=AsyncSession, expire_on_commit=False)
+    sqlite_engine.sync_engine.dispose()
+
+@pytest.fixture
+def no_status_cache(monkeypatch):
+    """Write-throughs to the status cache do nothing, so no Redis is needed."""
+    async def no_cache(*args):
+        pass
+    monkeypatch.setattr(status_cache, "set", no_cache)
+
+def query_count(response) -> int:
+    """Queries the request behind response ran, from its Server-Timing header"""
+    timing = response.headers["server-timing"]
+    return int(timing.split('desc="')[1].split(" ")[0])
+
 @pytest.fixture
 def test_user_data():
     """Sample user data for testing."""
@@ -0,0 +1,221 @@
+import io
+import os
+import zipfile
+from datetime import datetime
+import pytest
+import redis.asyncio as aioredis
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.models.models import Attachment, AttachmentBlob, RequestCategory, ServiceRequest
+from app.services.archive import ArchiveEntry, stream_zip
+from app.services.attachment_service import AttachmentService
+from app.services.file_types import detect_mime_type
+from app.services.image_variants import render_variant
+from app.services.resumable_uploads import ResumableUploadStore, UploadConflict, parse_checksum
+from app.services.storage import MemoryStorageBackend
+
+REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+class TestFileTypes:
+    def test_detects_matching_content(self):
+        assert detect_mime_type("photo.JPG", b"\xff\xd8\xff\xe0\x00\x10JFIF") == "image/jpeg"
+        assert detect_mime_type("scan.pdf", b"%PDF-1.7\n") == "application/pdf"
+
+    def test_rejects_disguised_file(self):
+        """An executable renamed to .png must not be accepted."""
+        assert detect_mime_type("photo.png", b"MZ\x90\x00\x03\x00\x00\x00") is None
+
+    def test_docx_is_a_zip_container(self):
+        assert detect_mime_type("letter.docx", b"PK\x03\x04\x14\x00").startswith("application/vnd.openxmlformats")
+
+    def test_signature_must_match_the_extension(self):
+        """A real PNG renamed to .jpg, or a Word file renamed to .pdf, is rejected too."""
+        assert detect_mime_type("photo.jpg", b"\x89PNG\r\n\x1a\n") is None
+        assert detect_mime_type("form.pdf", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1") is None
+        assert detect_mime_type("form.doc", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1") == "application/msword"
+
+class TestStreamingValidation:
+    @pytest.mark.asyncio
+    async def test_bad_extension_rejected_before_reading(self):
+        service = AttachmentService(db=None, storage_backend=MemoryStorageBackend())
+
+        async def never_read():
+            raise AssertionError("upload body should not be read")
+            yield b""
+
+        with pytest.raises(ValueError, match="not allowed"):
+            await service._store_stream(never_read(), "payload.exe", 1, 1)
+
+    @pytest.mark.asyncio
+    async def test_oversize_upload_aborts_and_cleans_up(self, monkeypatch):
+        monkeypatch.setattr(settings, "max_file_size", 10)
+        monkeypatch.setattr(settings, "attachment_scan_mode", "background")
+        storage = MemoryStorageBackend()
+        service = AttachmentService(db=None, storage_backend=storage)
+
+        async def has_capacity():
+            return True
+        monkeypatch.setattr(service.scan_queue, "has_capacity", has_capacity)
+
+        with pytest.raises(ValueError, match="maximum upload size"):
+            await service._store_stream(_chunks(b"%PDF-1.7", b"x" * 8, b"y" * 1024), "big.pdf", 1, 1)
+        assert storage.objects == {}
+
+class TestResumableUploads:
+    def test_parse_checksum_header(self):
+        assert parse_checksum("sha256 aGVsbG8=") == ("sha256", b"hello")
+        assert parse_checksum(None) is None
+        with pytest.raises(ValueError, match="Unsupported"):
+            parse_checksum("crc32 aGVsbG8=")
+        with pytest.raises(ValueError, match="Malformed"):
+            parse_checksum("sha256 not-base64!")
+
+    @pytest.mark.skipif(not REDIS_URL, reason="set TEST_REDIS_URL to run against Redis")
+    @pytest.mark.asyncio
+    async def test_expired_lock_is_not_released_by_its_old_holder(self, tmp_path):
+        client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+        uploads = ResumableUploadStore(client, str(tmp_path))
+        async with uploads.locked("abc"):
+            with pytest.raises(UploadConflict):
+                async with uploads.locked("abc"):
+                    pass
+            # Our lock expired and another request took it
+            await client.set("upload:abc:lock", "theirs")
+        assert await client.get("upload:abc:lock") == "theirs"
+        await client.delete("upload:abc:lock")
+        await client.aclose()
+
+class TestZipArchive:
+    @pytest.mark.asyncio
+    async def test_streamed_archive_round_trips(self):
+        photo = b"\xff\xd8\xff" + b"p" * 3000
+        report = b"%PDF-1.7 " + b"text " * 2000
+        entries = [
+            ArchiveEntry("photo.jpg", len(photo), datetime(2024, 5, 1), "image/jpeg", lambda: _chunks(photo[:1000], photo[1000:])),
+            ArchiveEntry("report.pdf", len(report), datetime(2024, 5, 1), "application/pdf", lambda: _chunks(report)),
+        ]
+        data = b"".join([part async for part in stream_zip(entries)])
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.testzip() is None
+        assert archive.read("photo.jpg") == photo
+        assert archive.getinfo("photo.jpg").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("report.pdf").compress_type == zipfile.ZIP_DEFLATED
+
+def _phone_photo() -> bytes:
+    """A landscape JPEG tagged as rotated, with camera and GPS EXIF"""
+    from PIL import Image
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees
+    exif[0x010F] = "PhoneMaker"
+    exif[0x8825] = {1: "N"}  # GPS IFD
+    out = io.BytesIO()
+    Image.new("RGB", (4000, 3000), (200, 10, 10)).save(out, "JPEG", exif=exif.tobytes())
+    return out.getvalue()
+
+class TestImageVariants:
+    def test_variant_is_resized_upright_and_stripped(self):
+        Image = pytest.importorskip("PIL.Image")
+        variant = Image.open(io.BytesIO(render_variant(_phone_photo(), 320, "webp")))
+        assert variant.format == "WEBP"
+        assert variant.size == (240, 320)
+        assert not variant.getexif()
+
+    @pytest.mark.asyncio
+    async def test_variant_rendered_once_then_served_from_storage(self):
+        pytest.importorskip("PIL")
+        storage = MemoryStorageBackend()
+        storage.objects["ab/cd/abcd"] = _phone_photo()
+        service = AttachmentService(db=None, storage_backend=storage)
+        attachment = Attachment(file_path="ab/cd/abcd", mime_type="image/jpeg", is_scanned=1)
+
+        key = await service.get_variant(attachment, "thumb.jpg")
+        assert key == "ab/cd/abcd.thumb.jpg"
+        rendered = storage.objects[key]
+        assert await service.get_variant(attachment, "thumb.jpg") == key
+        assert storage.objects[key] is rendered
+        assert await service.get_variant(attachment, "huge.bmp") is None
+
+async def _with_request(sessions):
+    async with sessions() as db:
+        await db.execute(insert(ServiceRequest), [
+            {"id": 1, "title": "Pothole", "description": "Deep one", "category": RequestCategory.ROAD_MAINTENANCE, "citizen_id": 1},
+        ])
+        await db.commit()
+    return sessions
+
+class _FakeScanner:
+    """Stands in for clamav_client with a fixed verdict"""
+    def __init__(self, verdict):
+        self.verdict = verdict
+
+    def stream(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def send(self, chunk: bytes):
+        pass
+
+    async def result(self):
+        return self.verdict
+
+class TestAttachmentBlobs:
+    @pytest.mark.asyncio
+    async def test_shared_blob_outlives_all_but_the_last_attachment(self, sqlite_sessions, monkeypatch):
+        sessions = await _with_request(sqlite_sessions)
+        monkeypatch.setattr(settings, "attachment_scan_mode", "background")
+        storage = MemoryStorageBackend()
+        async with sessions() as db:
+            service = AttachmentService(db, storage_backend=storage)
+
+            async def has_capacity():
+                return True
+
+            async def no_queue(attachment):
+                pass
+            monkeypatch.setattr(service.scan_queue, "has_capacity", has_capacity)
+            monkeypatch.setattr(service, "_queue_scan", no_queue)
+
+            first = await service.save_attachment(b"%PDF-1.7 same bytes", "a.pdf", 1, 1)
+            second = await service.save_attachment(b"%PDF-1.7 same bytes", "b.pdf", 1, 1)
+            blob = await db.get(AttachmentBlob, first.content_hash)
+            assert blob.ref_count == 2 and list(storage.objects) == [blob.file_path]
+
+            assert await service.delete_attachment(first.id)
+            await db.refresh(blob)
+            assert blob.ref_count == 1 and blob.file_path in storage.objects
+
+            assert await service.delete_attachment(second.id)
+            assert await db.get(AttachmentBlob, first.content_hash, populate_existing=True) is None
+            assert storage.objects == {}
+            assert (await db.get(ServiceRequest, 1, populate_existing=True)).attachment_count == 0
+
+    @pytest.mark.asyncio
+    async def test_infected_duplicate_scanned_inline_quarantines_the_blob(self, sqlite_sessions):
+        sessions = await _with_request(sqlite_sessions)
+        storage = MemoryStorageBackend()
+        async with sessions() as db:
+            service = AttachmentService(db, storage_backend=storage)
+            service.clamav = _FakeScanner((1, "Clean"))
+            first = await service.save_attachment(b"%PDF-1.7 same bytes", "a.pdf", 1, 1)
+            # Newer signatures catch the same bytes on a second upload
+            service.clamav = _FakeScanner((2, "Eicar-Test-Signature"))
+            second = await service.save_attachment(b"%PDF-1.7 same bytes", "b.pdf", 1, 1)
+
+            quarantined = f"quarantine/{first.content_hash}"
+            assert list(storage.objects) == [quarantined]
+            assert (await db.get(AttachmentBlob, first.content_hash)).file_path == quarantined
+            for attachment in (first, second):
+                await db.refresh(attachment)
+                assert (attachment.is_scanned, attachment.scan_result) == (2, "Eicar-Test-Signature")
+                assert attachment.file_path == quarantined
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import AuditEvent
+from app.services.audit_service import AuditBuffer, AuditService
+
+# Seeded as staff by the sqlite_sessions fixture
+ACTOR = 2
+
+async def _count(db: AsyncSession) -> int:
+    return await db.scalar(select(func.count(AuditEvent.id)))
+
+class TestAudit:
+    @pytest.mark.asyncio
+    async def test_transactional_events_follow_the_callers_transaction(self, sqlite_sessions):
+        async with sqlite_sessions() as db:
+            audit = AuditService(db, mode="transactional")
+            await audit.log(ACTOR, "update_request", "ServiceRequest", 1)
+            await db.rollback()
+            assert await _count(db) == 0
+            await audit.log(ACTOR, "update_request", "ServiceRequest", 1)
+            await db.commit()
+            assert await _count(db) == 1
+
+    @pytest.mark.asyncio
+    async def test_buffered_events_are_written_in_batches_and_on_close(self, sqlite_sessions):
+        async with sqlite_sessions() as db:
+            buffer = AuditBuffer(sqlite_sessions, batch_size=3, flush_interval=60, max_pending=5)
+            audit = AuditService(db, mode="buffered", buffer=buffer)
+            for entity_id in range(5):
+                await audit.log(ACTOR, "update_status", "ServiceRequest", entity_id)
+            assert await _count(db) == 0
+            # A row the database rejects is dropped without taking its batch with it
+            await audit.log(ACTOR + 100, "update_status", "ServiceRequest", 99)
+            await audit.log(ACTOR, "update_status", "ServiceRequest", 5)
+            assert len(buffer.pending) < 5
+            await buffer.close()
+            assert buffer.pending == []
+            assert await _count(db) == 6
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_drops_events_instead_of_failing_the_caller(self):
+        def database_down():
+            raise ConnectionRefusedError("database is down")
+        buffer = AuditBuffer(database_down, batch_size=10, flush_interval=60, max_pending=2, flush_timeout=0.1)
+        audit = AuditService(None, mode="buffered", buffer=buffer)
+        for entity_id in range(3):
+            await audit.log(1, "update_status", "ServiceRequest", entity_id)
+        assert [row["entity_id"] for row in buffer.pending] == [0, 1]
+        await buffer.close()
+
+    @pytest.mark.asyncio
+    async def test_search_pages_newest_first_with_filters(self, sqlite_sessions):
+        async with sqlite_sessions() as db:
+            audit = AuditService(db, mode="transactional")
+            for entity_id in range(5):
+                await audit.log(ACTOR, "update_status", "ServiceRequest", entity_id)
+            await audit.log(ACTOR, "assign_request", "ServiceRequest", 2)
+            await db.commit()
+            
+            seen, cursor = [], None
+            while True:
+                events, cursor = await audit.search(actor_id=ACTOR, action="update_status", limit=2, cursor=cursor)
+                seen += [event.entity_id for event in events]
+                if not cursor:
+                    break
+            assert seen == [4, 3, 2, 1, 0]
+            events, _ = await audit.search(entity_type="ServiceRequest", entity_id=2)
+            assert [event.action for event in events] == ["assign_request", "update_status"]
+
+    @pytest.mark.asyncio
+    async def test_search_filters_on_detail_values(self, sqlite_sessions):
+        async with sqlite_sessions() as db:
+            audit = AuditService(db, mode="transactional")
+            await audit.log(ACTOR, "assign_request", "ServiceRequest", 1, {"assigned_staff_id": 42})
+            await audit.log(ACTOR, "assign_request", "ServiceRequest", 2, {"assigned_staff_id": 7})
+            await audit.log(ACTOR, "update_status", "ServiceRequest", 1, {"status": "completed"})
+            await db.commit()
+            
+            events, _ = await audit.search(details={"assigned_staff_id": 42})
+            assert [event.entity_id for event in events] == [1]
+            assert events[0].details == {"assigned_staff_id": 42}
+            events, _ = await audit.search(details={"status": "completed"})
+            assert [event.action for event in events] == ["update_status"]
+            with pytest.raises(ValueError):
+                await audit.search(details={"status') OR 1=1 --": "x"})
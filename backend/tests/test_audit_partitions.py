@@ -0,0 +1,45 @@
+import os
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.models.models import AuditEvent, Base, User, UserRole
+from app.services.audit_partitions import PARTITION_AUDIT_EVENTS, AuditPartitionManager, _add_months, _month_start
+
+class TestAuditPartitions:
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+    async def test_new_partition_takes_its_rows_from_the_default_one(self):
+        # Points at a throwaway database; the tables are created and dropped here
+        engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+        now = datetime.now(timezone.utc)
+        stranded = _add_months(_month_start(now), 6).replace(day=15)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(text(PARTITION_AUDIT_EVENTS))
+                await conn.execute(insert(User), [
+                    {"id": 1, "email": "auditor@example.com", "hashed_password": "x", "full_name": "A", "role": UserRole.STAFF},
+                ])
+                # Beyond the months created ahead, so these land in the default partition
+                await conn.execute(insert(AuditEvent), [
+                    {"actor_id": 1, "action": "update_status", "entity_type": "ServiceRequest", "entity_id": n, "created_at": stranded}
+                    for n in range(3)
+                ])
+            async with AsyncSession(engine) as db:
+                created = await AuditPartitionManager(db).ensure_partitions(months_ahead=6, now=now)
+            name = f"audit_events_{stranded.year:04d}_{stranded.month:02d}"
+            assert name in created
+            async with engine.connect() as conn:
+                assert await conn.scalar(text(f'SELECT count(*) FROM "{name}"')) == 3
+                assert await conn.scalar(text("SELECT count(*) FROM audit_events_default")) == 0
+                # The default partition is attached again and still catches out-of-range rows
+                assert await conn.scalar(text(
+                    "SELECT count(*) FROM pg_inherits WHERE inhrelid = 'audit_events_default'::regclass"
+                )) == 1
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+        finally:
+            await engine.dispose()
@@ -0,0 +1,146 @@
+import asyncio
+import struct
+import pytest
+
+from app.services.clamav import ClamAVClient, parse_reply
+
+EICAR = b"X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*"
+
+class FakeClamd:
+    """Just enough of clamd's IDSESSION/INSTREAM protocol to exercise the client.
+
+    mode "hang" never answers a scan, "drop" closes the connection after the
+    first chunk and "error" answers with an ERROR reply.
+    """
+    def __init__(self, mode: str = "ok"):
+        self.mode = mode
+        self.connections = 0
+        self.scans: list[list[bytes]] = []
+        self.server = None
+        self.handlers: set[asyncio.Task] = set()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.handlers.add(asyncio.current_task())
+        request = 0
+        try:
+            while True:
+                command = await reader.readuntil(b"\0")
+                if command in (b"zIDSESSION\0", b"zEND\0"):
+                    if command == b"zEND\0":
+                        break
+                    continue
+                assert command == b"zINSTREAM\0"
+                request += 1
+                chunks = []
+                while True:
+                    (size,) = struct.unpack("!L", await reader.readexactly(4))
+                    if size == 0:
+                        break
+                    chunks.append(await reader.readexactly(size))
+                    if self.mode == "drop":
+                        writer.close()
+                        return
+                self.scans.append(chunks)
+                if self.mode == "hang":
+                    await asyncio.sleep(3600)
+                if self.mode == "error":
+                    writer.write(f"{request}: INSTREAM size limit exceeded. ERROR\0".encode())
+                    await writer.drain()
+                    break
+                verdict = "Eicar-Test-Signature FOUND" if EICAR in b"".join(chunks) else "OK"
+                writer.write(f"{request}: stream: {verdict}\0".encode())
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+async def _client(clamd: FakeClamd, **kwargs) -> ClamAVClient:
+    return ClamAVClient("127.0.0.1", await clamd.start(), **kwargs)
+
+class TestParseReply:
+    def test_replies(self):
+        assert parse_reply(b"1: stream: OK\0") == (1, "Clean")
+        assert parse_reply(b"stream: OK\0") == (1, "Clean")
+        assert parse_reply(b"2: stream: Eicar-Test-Signature FOUND\0") == (2, "Eicar-Test-Signature")
+        assert parse_reply(b"3: INSTREAM size limit exceeded. ERROR\0") == (0, "Scan error: INSTREAM size limit exceeded. ERROR")
+
+class TestClamAVClient:
+    @pytest.mark.asyncio
+    async def test_instream_frames_chunks_and_reads_verdicts(self):
+        clamd = FakeClamd()
+        client = await _client(clamd)
+        assert await client.scan_bytes(b"hello world", chunk_size=4) == (1, "Clean")
+        assert await client.scan_bytes(b"prefix " + EICAR) == (2, "Eicar-Test-Signature")
+        # Each chunk arrives as its own length-prefixed frame, zero-length frame ends the stream
+        assert clamd.scans[0] == [b"hell", b"o wo", b"rld"]
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_sessions_are_reused(self):
+        clamd = FakeClamd()
+        client = await _client(clamd)
+        for _ in range(3):
+            assert await client.scan_bytes(b"data") == (1, "Clean")
+        assert clamd.connections == 1
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_idle_sessions_are_not_reused(self):
+        clamd = FakeClamd()
+        client = await _client(clamd, idle_timeout=0)
+        await client.scan_bytes(b"data")
+        await client.scan_bytes(b"data")
+        assert clamd.connections == 2
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_timeout_reports_pending_and_discards_session(self):
+        clamd = FakeClamd("hang")
+        client = await _client(clamd, timeout=0.2)
+        is_scanned, result = await client.scan_bytes(b"data")
+        assert is_scanned == 0 and result.startswith("Scan error")
+        assert client._idle == []
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_dropped_connection_mid_scan(self):
+        clamd = FakeClamd("drop")
+        client = await _client(clamd, timeout=1)
+        is_scanned, result = await client.scan_bytes(b"a" * 64, chunk_size=16)
+        assert is_scanned == 0 and result.startswith("Scan error")
+        # The broken session is not handed out again
+        clamd.mode = "ok"
+        assert await client.scan_bytes(b"data") == (1, "Clean")
+        assert clamd.connections == 2
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_error_reply_ends_the_session(self):
+        clamd = FakeClamd("error")
+        client = await _client(clamd)
+        assert (await client.scan_bytes(b"data"))[0] == 0
+        assert client._idle == []
+        await client.close()
+        await clamd.stop()
+
+    @pytest.mark.asyncio
+    async def test_unreachable_scanner(self):
+        client = ClamAVClient("127.0.0.1", 1, connect_timeout=0.5)
+        assert await client.scan_bytes(b"data") == (0, "Scanner unavailable")
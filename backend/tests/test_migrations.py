@@ -0,0 +1,24 @@
+import re
+
+from app.migrations import MIGRATIONS, ConcurrentIndex
+from app.models.models import Base
+
+class TestMigrations:
+    def test_versions_are_unique_and_ascending(self):
+        versions = [migration.version for migration in MIGRATIONS]
+        assert versions == sorted(set(versions))
+        assert versions[0] == 1
+
+    def test_concurrent_indexes_run_outside_transactions(self):
+        for migration in MIGRATIONS:
+            if any(isinstance(step, ConcurrentIndex) for step in migration.steps):
+                assert not migration.transactional, migration.name
+
+    def test_every_model_table_is_created_by_a_revision(self):
+        # Revisions carry their own DDL, so a new model needs a revision that creates its table
+        created = {
+            re.search(r"CREATE TABLE IF NOT EXISTS (\w+)", step)[1]
+            for migration in MIGRATIONS for step in migration.steps
+            if isinstance(step, str) and "CREATE TABLE IF NOT EXISTS" in step
+        }
+        assert set(Base.metadata.tables) <= created
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from sqlalchemy import exc, text
+from app.core.config import settings
+from app.core.pool import InstrumentedNullPool, InstrumentedQueuePool, create_pooled_engine, engine_options, pool_status
+
+class TestPool:
+    def test_pool_settings_come_from_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, "db_pool_size", 3)
+        monkeypatch.setattr(settings, "db_max_overflow", 2)
+        options = engine_options("postgresql+asyncpg://u:p@db/app")
+        assert options["poolclass"] is InstrumentedQueuePool
+        assert (options["pool_size"], options["max_overflow"]) == (3, 2)
+
+    def test_pgbouncer_mode_turns_off_statement_caching(self, monkeypatch):
+        monkeypatch.setattr(settings, "db_pgbouncer", True)
+        options = engine_options("postgresql+asyncpg://u:p@pgbouncer/app")
+        assert options["poolclass"] is InstrumentedNullPool
+        assert options["connect_args"]["statement_cache_size"] == 0
+        assert options["connect_args"]["prepared_statement_cache_size"] == 0
+        name = options["connect_args"]["prepared_statement_name_func"]
+        assert name() != name()
+
+    @pytest.mark.asyncio
+    async def test_checkouts_are_timed_and_timeouts_counted(self, tmp_path):
+        engine = create_pooled_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+            poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+        )
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                assert pool_status(engine)["checked_out"] == 1
+                with pytest.raises(exc.TimeoutError):
+                    async with engine.connect():
+                        pass
+            status = pool_status(engine)
+            assert status["checked_out"] == 0
+            assert status["timeouts"] == 1
+            assert status["checkout_wait_seconds"]["count"] == 2
+            assert status["checkout_wait_seconds"]["buckets"]["0.05"] == 1
+            # dispose() replaces the pool; what was measured so far is kept
+            await engine.dispose()
+            assert pool_status(engine)["timeouts"] == 1
+        finally:
+            await engine.dispose()
@@ -0,0 +1,127 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.models.models import (
+    Base, ServiceRequest, User, UserRole, RequestStatus, RequestCategory, RequestPriority
+)
+from app.schemas.request import ServiceRequestFilter
+from app.services.request_service import RequestService, list_statements
+
+STAFF = 20
+CITIZENS = 400
+REQUESTS = 5000
+
+# The filter combinations the request list is used with; each must be answered from an index
+FILTERS = {
+    "none": {},
+    "citizen": {"citizen": 7},
+    "status": {"status": RequestStatus.IN_PROGRESS},
+    "category": {"category": RequestCategory.ROAD_MAINTENANCE},
+    "priority": {"priority": RequestPriority.URGENT},
+    "open": {"open_only": True},
+    "open_assigned": {"open_only": True, "assigned_staff_id": 3},
+    "assigned": {"assigned_staff_id": 3},
+    "status_category": {"status": RequestStatus.SUBMITTED, "category": RequestCategory.STREET_LIGHTING},
+    "citizen_status": {"citizen": 7, "status": RequestStatus.COMPLETED},
+}
+CASES = [(name, "created") for name in FILTERS] + [("none", "activity")]
+
+def _seed(conn):
+    Base.metadata.create_all(conn)
+    rng = random.Random(43)
+    conn.execute(insert(User), [
+        {
+            "id": n,
+            "email": f"user{n}@example.com",
+            "hashed_password": "x",
+            "full_name": f"User {n}",
+            "role": UserRole.STAFF if n <= STAFF else UserRole.CITIZEN,
+        }
+        for n in range(1, STAFF + CITIZENS + 1)
+    ])
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for n in range(1, REQUESTS + 1):
+        created = start + timedelta(minutes=37 * n)
+        rows.append({
+            "id": n,
+            "title": f"Request {n}",
+            "description": "Seeded for query plans",
+            "category": rng.choice(list(RequestCategory)),
+            # Most requests are finished, as in a long-running deployment
+            "status": rng.choices(list(RequestStatus), weights=[1, 1, 1, 2, 20, 1, 3])[0],
+            "priority": rng.choice(list(RequestPriority)),
+            "citizen_id": rng.randint(STAFF + 1, STAFF + CITIZENS),
+            "assigned_staff_id": rng.randint(1, STAFF) if rng.random() < 0.8 else None,
+            "created_at": created,
+            "last_activity_at": created,
+        })
+    conn.execute(insert(ServiceRequest), rows)
+
+def _list_statement(name: str, sort: str = "created"):
+    options = dict(FILTERS[name])
+    citizen = options.pop("citizen", None)
+    # model_construct keeps the column enums as they are, without schema validation
+    filter_params = ServiceRequestFilter.model_construct(**options)
+    shape, values = RequestService(None).list_filters(filter_params, citizen, "citizen" if citizen else None)
+    _, page_query = list_statements(shape, sort)
+    return page_query.params(**values, skip=0, limit=20)
+
+def _sql(statement, dialect) -> str:
+    return str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+@pytest.fixture(scope="module")
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        _seed(conn)
+        conn.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("name,sort", CASES)
+    def test_request_list_uses_an_index_on_sqlite(self, sqlite_engine, name, sort):
+        sql = _sql(_list_statement(name, sort), sqlite_engine.dialect)
+        with sqlite_engine.connect() as conn:
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        scans = [step for step in plan if step.startswith("SCAN service_requests")]
+        assert all("USING" in step for step in scans), f"{name}/{sort}: {plan}"
+        if name != "none":
+            # Walking the whole created_at index and filtering as it goes is a table scan in disguise;
+            # filtered lists must seek, or walk a partial index that holds only their rows
+            assert all("ix_service_requests_open_" in step for step in scans), f"{name}/{sort}: {plan}"
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL is not set")
+    async def test_request_list_uses_an_index_on_postgres(self):
+        # Points at a throwaway database; the tables are created and dropped here
+        engine = create_async_engine(os.environ["TEST_POSTGRES_URL"])
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(_seed)
+                await conn.execute(text("ANALYZE"))
+            async with engine.connect() as conn:
+                # Forbid sequential scans outright: any that remain had no index to fall back to
+                await conn.execute(text("SET enable_seqscan = off"))
+                for name, sort in CASES:
+                    sql = _sql(_list_statement(name, sort), engine.dialect)
+                    result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+                    plan = result.scalar()
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    assert "service_requests" not in _seq_scans(plan[0]["Plan"]), f"{name}/{sort}"
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+        finally:
+            await engine.dispose()
+
+def _seq_scans(node: dict) -> set[str]:
+    tables = {node["Relation Name"]} if node.get("Node Type") == "Seq Scan" else set()
+    for child in node.get("Plans", ()):
+        tables |= _seq_scans(child)
+    return tables
@@ -0,0 +1,48 @@
+import logging
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.query_stats import QueryStatsMiddleware, fingerprint, install_query_stats, track_queries
+
+def _app(engine) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+
+    @app.get("/rows")
+    async def rows():
+        async with engine.connect() as conn:
+            ids = (await conn.execute(text("SELECT id FROM items ORDER BY id"))).scalars().all()
+            # One query per row of the first: the N+1 shape
+            names = [(await conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i})).scalar() for i in ids]
+        return {"names": names}
+
+    return app
+
+class TestQueryStats:
+    def test_fingerprint_ignores_in_list_length_and_whitespace(self):
+        assert fingerprint("SELECT *\n  FROM t WHERE id IN ($1, $2, $3)") == "SELECT * FROM t WHERE id IN (...)"
+        assert fingerprint("SELECT * FROM t WHERE id IN (?, ?)") == "SELECT * FROM t WHERE id IN (...)"
+
+    @pytest.mark.asyncio
+    async def test_queries_are_counted_per_request(self, tmp_path, caplog):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stats.db'}")
+        install_query_stats(engine)
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+                await conn.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c'), ('d'), ('e')"))
+
+            transport = ASGITransport(app=_app(engine))
+            with caplog.at_level(logging.WARNING, logger="app.core.query_stats"):
+                with track_queries() as stats:
+                    async with AsyncClient(transport=transport, base_url="http://test") as client:
+                        response = await client.get("/rows")
+            assert response.json() == {"names": ["a", "b", "c", "d", "e"]}
+            # Query budget: the test sees the same count the header reports
+            assert stats.count == 6
+            assert response.headers["server-timing"].endswith('desc="6 queries"')
+            assert "Possible N+1 in GET /rows: 5 runs of SELECT name FROM items WHERE id = ?" in caplog.text
+        finally:
+            await engine.dispose()
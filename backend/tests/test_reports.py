@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import insert
+
+from app.models.models import ServiceRequest, RequestCategory, RequestStatus
+from app.services.reports import ReportService, last_week, report_csv, report_html
+
+WEEK = datetime(2026, 10, 5, tzinfo=timezone.utc)
+AS_OF = datetime(2026, 10, 12, 12, tzinfo=timezone.utc)
+
+def _request(n, category, created, hours=None, staff=None, status=None):
+    return {
+        "id": n, "title": f"Request {n}", "description": "d", "category": category,
+        "status": status or (RequestStatus.COMPLETED if hours is not None else RequestStatus.SUBMITTED),
+        "citizen_id": 1, "assigned_staff_id": staff, "created_at": created,
+        "completed_at": created + timedelta(hours=hours) if hours is not None else None,
+    }
+
+async def _seed(sessions):
+    # Staff 2 is Ann and 3 is Bob, as seeded by the sqlite_sessions fixture
+    async with sessions() as db:
+        day = timedelta(days=1)
+        await db.execute(insert(ServiceRequest), [
+            # Resolved in the week after 2, 4 and 10 hours, and one from the week before after 4 days
+            _request(1, RequestCategory.OTHER, WEEK + day, hours=2, staff=2),
+            _request(2, RequestCategory.OTHER, WEEK + day, hours=4, staff=2),
+            _request(3, RequestCategory.OTHER, WEEK + 2 * day, hours=10, staff=2),
+            _request(4, RequestCategory.ROAD_MAINTENANCE, WEEK - 3 * day, hours=24 * 3 + 24, staff=3),
+            # Still open: half a day, two days and forty days old
+            _request(5, RequestCategory.ROAD_MAINTENANCE, AS_OF - day / 2, staff=3),
+            _request(6, RequestCategory.OTHER, AS_OF - 2 * day),
+            _request(7, RequestCategory.OTHER, AS_OF - 40 * day, status=RequestStatus.IN_PROGRESS, staff=3),
+            # Resolved the week before: outside the report
+            _request(8, RequestCategory.OTHER, WEEK - 5 * day, hours=1, staff=2),
+        ])
+        await db.commit()
+    return sessions
+
+class TestWeeklyReport:
+    def test_last_week_is_the_last_complete_week(self):
+        assert last_week(AS_OF) == WEEK
+        assert last_week(WEEK) == WEEK - timedelta(days=7)
+
+    @pytest.mark.asyncio
+    async def test_weekly_aggregates(self, sqlite_sessions):
+        sessions = await _seed(sqlite_sessions)
+        async with sessions() as db:
+            report = await ReportService(db).weekly(WEEK, as_of=AS_OF)
+
+        assert (report["week_start"], report["week_end"]) == ("2026-10-05", "2026-10-11")
+        assert report["categories"] == [
+            {"category": "other", "opened": 4, "resolved": 3, "median_hours": 4.0, "p90_hours": 10.0},
+            {"category": "road_maintenance", "opened": 0, "resolved": 1, "median_hours": 96.0, "p90_hours": 96.0},
+        ]
+        assert report["total"] == {"category": "all", "opened": 4, "resolved": 4, "median_hours": 4.0, "p90_hours": 96.0}
+        assert {row["age"]: row["requests"] for row in report["backlog"]} == {
+            "under 1 day": 1, "1-3 days": 1, "3-7 days": 0, "1-2 weeks": 0, "2-4 weeks": 0, "4 weeks or more": 1,
+        }
+        assert report["staff"] == [
+            {"staff_id": 2, "name": "Ann", "resolved": 3, "median_hours": 4.0, "p90_hours": 10.0, "open": 0},
+            {"staff_id": 3, "name": "Bob", "resolved": 1, "median_hours": 96.0, "p90_hours": 96.0, "open": 2},
+        ]
+
+        files = report_csv(report)
+        assert files["categories.csv"].splitlines()[0] == "category,opened,resolved,median_hours,p90_hours"
+        assert "all,4,4,4.0,96.0" in files["categories.csv"].splitlines()
+        assert "Bob,1,96.0,96.0,2" in files["staff.csv"]
+        page = report_html(report)
+        assert "Weekly report, 2026-10-05 to 2026-10-11" in page
+        assert "<td>road_maintenance</td><td>0</td><td>1</td>" in page
+
+    @pytest.mark.asyncio
+    async def test_empty_week(self, sqlite_sessions):
+        sessions = await _seed(sqlite_sessions)
+        async with sessions() as db:
+            report = await ReportService(db).weekly(WEEK + timedelta(days=70), as_of=AS_OF)
+        assert report["categories"] == []
+        assert report["total"]["resolved"] == 0
+        assert report_csv(report)["categories.csv"].startswith("category,opened,resolved")
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.models import RequestCategory, RequestDailyStats, RequestPriority, RequestStatus
+from app.schemas.request import ServiceRequestCreate, ServiceRequestUpdate
+from app.services.request_service import RequestService
+from app.services.request_stats import RequestStatsService
+
+def _new_request(category: RequestCategory) -> ServiceRequestCreate:
+    return ServiceRequestCreate(title="Broken light", description="The light on the corner is out", category=category)
+
+class TestRequestStats:
+    @pytest.mark.asyncio
+    async def test_write_paths_keep_the_aggregates_current(self, sqlite_sessions, no_status_cache):
+        async with sqlite_sessions() as db:
+            service = RequestService(db)
+            first = await service.create_request(_new_request(RequestCategory.STREET_LIGHTING), 1)
+            await service.create_request(_new_request(RequestCategory.STREET_LIGHTING), 1)
+            await service.create_request(_new_request(RequestCategory.OTHER), 1)
+            await service.update_request(first.id, ServiceRequestUpdate(priority=RequestPriority.HIGH), 2)
+            await service.update_request_status(first.id, RequestStatus.COMPLETED, 2)
+
+            stats = await RequestStatsService(db).dashboard(days=7)
+        counts = stats["counts"]
+        assert (counts["total"], counts["open"], counts["closed"]) == (3, 2, 1)
+        assert counts["by_status"] == {"submitted": 2, "completed": 1}
+        assert counts["by_category"] == {"street_lighting": 2, "other": 1}
+        assert counts["by_priority"] == {"medium": 2, "high": 1}
+        today = stats["trend"][-1]
+        assert (today["opened"], today["closed"], today["reopened"]) == (3, 1, 0)
+        assert stats["completion"]["completed"] == 1
+        assert "street_lighting" in stats["completion"]["average_hours_by_category"]
+
+        # A full recount agrees with what the write paths maintained
+        async with sqlite_sessions() as db:
+            assert await RequestStatsService(db).rebuild_counts() == 3
+            assert (await RequestStatsService(db).counts()) == counts
+
+    @pytest.mark.asyncio
+    async def test_recompleted_request_counts_one_completion(self, sqlite_sessions, no_status_cache):
+        async with sqlite_sessions() as db:
+            service = RequestService(db)
+            request = await service.create_request(_new_request(RequestCategory.OTHER), 1)
+            await service.update_request_status(request.id, RequestStatus.COMPLETED, 2)
+            await service.update_request_status(request.id, RequestStatus.IN_PROGRESS, 2)
+            await service.update_request_status(request.id, RequestStatus.COMPLETED, 2)
+            # Marked completed again without a reopen in between
+            await service.update_request_status(request.id, RequestStatus.COMPLETED, 2)
+
+            stats = await RequestStatsService(db).dashboard(days=7)
+        today = stats["trend"][-1]
+        assert (today["opened"], today["closed"], today["reopened"]) == (1, 2, 1)
+        assert stats["completion"]["completed"] == 1
+        assert stats["counts"]["by_status"] == {"completed": 1}
+
+    @pytest.mark.asyncio
+    async def test_recategorised_completion_moves_to_the_new_category(self, sqlite_sessions, no_status_cache):
+        async with sqlite_sessions() as db:
+            service = RequestService(db)
+            request = await service.create_request(_new_request(RequestCategory.STREET_LIGHTING), 1)
+            await service.update_request_status(request.id, RequestStatus.COMPLETED, 2)
+            await service.update_request(request.id, ServiceRequestUpdate(category=RequestCategory.OTHER), 2)
+
+            rows = (await db.execute(select(RequestDailyStats).order_by(RequestDailyStats.category))).scalars().all()
+            assert [(row.category, row.opened, row.completed) for row in rows] == [
+                (RequestCategory.OTHER, 0, 1), (RequestCategory.STREET_LIGHTING, 1, 0)
+            ]
+            assert rows[1].completion_seconds == pytest.approx(0, abs=1e-6)
+            assert (await RequestStatsService(db).counts())["by_category"] == {"other": 1}
@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import AsyncSession
+from .conftest import query_count
 
 class TestRequests:
     def test_create_request_success(self, client: TestClient, test_user_data: dict, test_request_data: dict):
@@ -121,4 +122,77 @@ class TestRequests:
         response = client.get(f"/api/requests?search={test_request_data['title']}", headers={"Authorization": f"Bearer {token}"})
         assert response.status_code == 200
         data = response.json()
-        assert len(data["items"]) >= 1
\ No newline at end of file
+        assert len(data["items"]) >= 1
+
+    def test_comments_keyset_pagination(self, client: TestClient, test_user_data: dict, test_request_data: dict):
+        """Following X-Next-Cursor walks every comment exactly once, newest first."""
+        client.post("/api/auth/register", json=test_user_data)
+        login_response = client.post("/api/auth/login", json={
+            "email": test_user_data["email"],
+            "password": test_user_data["password"],
+        })
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        request_id = client.post("/api/requests", json=test_request_data, headers=headers).json()["id"]
+        for n in range(5):
+            client.post(
+                f"/api/requests/{request_id}/comments",
+                json={"content": f"comment {n}", "request_id": request_id},
+                headers=headers,
+            )
+        
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get(f"/api/requests/{request_id}/comments", params=params, headers=headers)
+            assert response.status_code == 200
+            seen += [comment["id"] for comment in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert len(seen) == 5
+        assert seen == sorted(seen, reverse=True)
+
+    def test_activity_counters_and_sort(self, client: TestClient, test_user_data: dict, test_request_data: dict):
+        """Comment counts follow new comments; sort=activity orders by the latest activity."""
+        client.post("/api/auth/register", json=test_user_data)
+        login_response = client.post("/api/auth/login", json={
+            "email": test_user_data["email"],
+            "password": test_user_data["password"],
+        })
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        first_id = client.post("/api/requests", json=test_request_data, headers=headers).json()["id"]
+        second_id = client.post("/api/requests", json=test_request_data, headers=headers).json()["id"]
+        for n in range(2):
+            client.post(
+                f"/api/requests/{first_id}/comments",
+                json={"content": f"comment {n}", "request_id": first_id},
+                headers=headers,
+            )
+        
+        data = client.get(f"/api/requests/{first_id}", headers=headers).json()
+        assert data["comment_count"] == 2
+        assert data["public_comment_count"] == 2
+        assert data["last_activity_at"] is not None
+        
+        items = client.get("/api/requests?sort=activity", headers=headers).json()["items"]
+        activity = [item["last_activity_at"] for item in items]
+        assert activity == sorted(activity, reverse=True)
+        items = client.get("/api/requests?sort=created", headers=headers).json()["items"]
+        assert [item["id"] for item in items][:2] == [second_id, first_id]
+
+    def test_read_endpoints_query_budget(self, client: TestClient, test_user_data: dict, test_request_data: dict):
+        """Reads stay within a fixed number of queries, however many requests exist."""
+        client.post("/api/auth/register", json=test_user_data)
+        login_response = client.post("/api/auth/login", json={
+            "email": test_user_data["email"],
+            "password": test_user_data["password"],
+        })
+        headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+        for _ in range(3):
+            request_id = client.post("/api/requests", json=test_request_data, headers=headers).json()["id"]
+        
+        # Current user, total count, page
+        assert query_count(client.get("/api/requests", headers=headers)) <= 3
+        # Current user, request
+        assert query_count(client.get(f"/api/requests/{request_id}", headers=headers)) <= 2
@@ -0,0 +1,134 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import insert, select
+
+from app.models.models import ResolutionSketchBin, ServiceRequest, RequestCategory, RequestStatus
+from app.schemas.request import ServiceRequestUpdate
+from app.services.request_service import RequestService
+from app.services.resolution_analytics import (
+    RELATIVE_ACCURACY, DDSketch, ResolutionAnalytics, backfill_resolution_sketches, week_of
+)
+
+START = datetime(2026, 6, 1, tzinfo=timezone.utc)  # A Monday
+
+async def _seed(sessions, requests):
+    async with sessions() as db:
+        await db.execute(insert(ServiceRequest), list(requests))
+        await backfill_resolution_sketches(await db.connection())
+        await db.commit()
+    return sessions
+
+def _completed(rng, n):
+    """Requests completed over ten weeks, roads taking about four times as long as the rest"""
+    rows = []
+    for n in range(1, n + 1):
+        category = rng.choice([RequestCategory.ROAD_MAINTENANCE, RequestCategory.OTHER])
+        completed = START + timedelta(seconds=rng.uniform(0, 70 * 86400))
+        hours = rng.lognormvariate(3 if category == RequestCategory.ROAD_MAINTENANCE else 1.6, 1)
+        rows.append({
+            "id": n, "title": f"Request {n}", "description": "d", "category": category,
+            "status": RequestStatus.COMPLETED, "citizen_id": 1,
+            "created_at": completed - timedelta(hours=hours), "completed_at": completed,
+        })
+    return rows
+
+def _within_accuracy(estimate, exact):
+    # Exact hours are rounded to 0.01 in the response, hence the small absolute slack
+    return abs(estimate - exact) <= RELATIVE_ACCURACY * exact + 0.01
+
+class TestDDSketch:
+    def test_quantiles_are_within_the_relative_accuracy(self):
+        rng = random.Random(50)
+        values = [rng.lognormvariate(10, 2) for _ in range(20_000)]
+        sketch = DDSketch()
+        for value in values:
+            sketch.add(value)
+        ordered = sorted(values)
+        for q in (0.01, 0.5, 0.9, 0.99, 1.0):
+            exact = ordered[max(1, math.ceil(q * len(ordered))) - 1]
+            assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact
+
+    def test_merge_is_the_sketch_of_the_union(self):
+        first, second, both = DDSketch(), DDSketch(), DDSketch()
+        for n, value in enumerate(range(1, 5000, 7)):
+            (first if n % 3 else second).add(value)
+            both.add(value)
+        first.merge(second)
+        assert first.bins == both.bins
+        assert DDSketch().quantile(0.5) is None
+
+class TestResolutionAnalytics:
+    @pytest.mark.asyncio
+    async def test_ranges_merge_sketches_and_agree_with_exact_mode(self, sqlite_sessions):
+        sessions = await _seed(sqlite_sessions, _completed(random.Random(50), 3000))
+        # Ragged at both ends: Wednesday of week 2 to Friday of week 8
+        since, until = START + timedelta(days=9, hours=5), START + timedelta(days=53, hours=17)
+        async with sessions() as db:
+            analytics = ResolutionAnalytics(db)
+            sketched = await analytics.percentiles(since, until)
+            exact = await analytics.percentiles(since, until, exact=True)
+            roads = await analytics.percentiles(since, until, RequestCategory.ROAD_MAINTENANCE)
+            weekly = await analytics.weekly(weeks=200)
+
+        assert sketched["all"]["resolved"] == exact["all"]["resolved"] > 0
+        for name in ("all", "road_maintenance", "other"):
+            estimate = sketched["all"] if name == "all" else sketched["categories"][name]
+            truth = exact["all"] if name == "all" else exact["categories"][name]
+            assert estimate["resolved"] == truth["resolved"]
+            for quantile in ("p50_hours", "p90_hours", "p99_hours"):
+                assert _within_accuracy(estimate[quantile], truth[quantile]), (name, quantile)
+        assert list(roads["categories"]) == ["road_maintenance"]
+        assert roads["categories"]["road_maintenance"] == sketched["categories"]["road_maintenance"]
+        # Ten weeks, two categories, every request in exactly one week's sketch
+        assert len(weekly) == 20
+        assert sum(row["resolved"] for row in weekly) == 3000
+
+    @pytest.mark.asyncio
+    async def test_completing_a_request_updates_its_week(self, sqlite_sessions, no_status_cache):
+        async with sqlite_sessions() as db:
+            db.add(ServiceRequest(id=1, title="t", description="d", category=RequestCategory.OTHER, citizen_id=1))
+            await db.commit()
+            service = RequestService(db)
+            await service.update_request_status(1, RequestStatus.COMPLETED, 1)
+            # Completing it again does not count it twice
+            await service.update_request_status(1, RequestStatus.COMPLETED, 1)
+            rows = (await db.execute(select(ResolutionSketchBin))).scalars().all()
+            assert [(row.week, row.category, row.count) for row in rows] == [
+                (week_of(datetime.now(timezone.utc)), RequestCategory.OTHER, 1)
+            ]
+            with pytest.raises(ValueError):
+                await ResolutionAnalytics(db).percentiles(START, START)
+
+    @pytest.mark.asyncio
+    async def test_recompleted_request_moves_to_its_new_bin(self, sqlite_sessions, no_status_cache):
+        now = datetime.now(timezone.utc)
+        sessions = await _seed(sqlite_sessions, [{
+            "id": 1, "title": "t", "description": "d", "category": RequestCategory.OTHER,
+            "status": RequestStatus.COMPLETED, "citizen_id": 1,
+            "created_at": now - timedelta(days=30), "completed_at": now - timedelta(days=20),
+        }])
+        async with sessions() as db:
+            service = RequestService(db)
+            await service.update_request_status(1, RequestStatus.IN_PROGRESS, 1)
+            await service.update_request_status(1, RequestStatus.COMPLETED, 1)
+            rows = (await db.execute(select(ResolutionSketchBin).where(ResolutionSketchBin.count != 0))).scalars().all()
+            assert [(row.week, row.bin, row.count) for row in rows] == [
+                (week_of(now), DDSketch.bin_of(30 * 86400), 1)
+            ]
+
+    @pytest.mark.asyncio
+    async def test_recategorised_request_moves_to_the_new_categorys_bin(self, sqlite_sessions, no_status_cache):
+        now = datetime.now(timezone.utc)
+        sessions = await _seed(sqlite_sessions, [{
+            "id": 1, "title": "t", "description": "d", "category": RequestCategory.OTHER,
+            "status": RequestStatus.COMPLETED, "citizen_id": 1,
+            "created_at": now - timedelta(days=30), "completed_at": now - timedelta(days=20),
+        }])
+        async with sessions() as db:
+            await RequestService(db).update_request(1, ServiceRequestUpdate(category=RequestCategory.ROAD_MAINTENANCE), 1)
+            rows = (await db.execute(select(ResolutionSketchBin).where(ResolutionSketchBin.count != 0))).scalars().all()
+            assert [(row.week, row.category, row.bin, row.count) for row in rows] == [
+                (week_of(now - timedelta(days=20)), RequestCategory.ROAD_MAINTENANCE, DDSketch.bin_of(10 * 86400), 1)
+            ]
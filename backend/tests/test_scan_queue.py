@@ -0,0 +1,67 @@
+import os
+import pytest
+import redis.asyncio as aioredis
+
+from app.services.scan_queue import CLAIMED_KEY, METRICS_KEY, PENDING_KEY, QUEUED_KEY, ScanQueue
+
+# The queue's guarantees live in Lua scripts, so these run against a real Redis when one is given
+REDIS_URL = os.getenv("TEST_REDIS_URL")
+needs_redis = pytest.mark.skipif(not REDIS_URL, reason="set TEST_REDIS_URL to run against Redis")
+
+async def _queue(**kwargs) -> ScanQueue:
+    client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+    await client.delete(PENDING_KEY, QUEUED_KEY, CLAIMED_KEY, METRICS_KEY)
+    return ScanQueue(client, **kwargs)
+
+class TestScanQueue:
+    @pytest.mark.asyncio
+    async def test_unreachable_redis_counts_as_full(self):
+        client = aioredis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1)
+        assert not await ScanQueue(client).has_capacity()
+        await client.aclose()
+
+    @needs_redis
+    @pytest.mark.asyncio
+    async def test_backpressure(self):
+        queue = await _queue(max_depth=3)
+        assert await queue.enqueue(1, 2) == 2
+        assert await queue.has_capacity()
+        assert await queue.enqueue(3) == 3
+        assert not await queue.has_capacity()
+        await queue.client.aclose()
+
+    @needs_redis
+    @pytest.mark.asyncio
+    async def test_ids_are_queued_once(self):
+        queue = await _queue()
+        await queue.enqueue(1, 2)
+        assert await queue.enqueue(2, 3, 3) == 3
+        assert await queue.pop_batch(10) == [1, 2, 3]
+        # Being scanned: a new upload of the same id is not queued behind it
+        assert await queue.enqueue(2) == 0
+        await queue.finish(1, 2, 3)
+        assert await queue.enqueue(2) == 1
+        assert (await queue.metrics())["enqueued"] == 4
+        await queue.client.aclose()
+
+    @needs_redis
+    @pytest.mark.asyncio
+    async def test_sweep_adds_only_what_the_queue_lost(self):
+        queue = await _queue()
+        await queue.enqueue(1, 2, 3)
+        assert await queue.pop_batch(1) == [1]
+        # 1 is being scanned, 2 and 3 are queued: only 4 was lost
+        assert await queue.enqueue_missing([1, 2, 3, 4]) == 1
+        assert await queue.pop_batch(10) == [2, 3, 4]
+        await queue.client.aclose()
+
+    @needs_redis
+    @pytest.mark.asyncio
+    async def test_sweep_requeues_expired_claims(self):
+        queue = await _queue(claim_ttl=-1)
+        await queue.enqueue(1)
+        assert await queue.pop_batch(5) == [1]
+        # The worker died without finish(); its claim has expired
+        assert await queue.enqueue_missing([1]) == 1
+        assert await queue.pop_batch(5) == [1]
+        await queue.client.aclose()
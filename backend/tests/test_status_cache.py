@@ -0,0 +1,68 @@
+import os
+import pytest
+import redis.asyncio as aioredis
+from sqlalchemy import insert
+
+from app.models.models import ServiceRequest, RequestCategory, RequestStatus
+from app.services.status_cache import STATUS_PREFIX, StatusCache
+
+REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+async def _seed(sessions):
+    async with sessions() as db:
+        await db.execute(insert(ServiceRequest), [
+            {"id": n, "title": f"Request {n}", "description": "d", "category": RequestCategory.OTHER,
+             "status": RequestStatus.IN_PROGRESS if n == 2 else RequestStatus.SUBMITTED, "citizen_id": 1}
+            for n in (1, 2)
+        ])
+        await db.commit()
+    return sessions
+
+def _unreachable_redis():
+    return aioredis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1, decode_responses=True)
+
+class TestStatusCache:
+    @pytest.mark.asyncio
+    async def test_batch_falls_back_to_the_database_without_redis(self, sqlite_sessions):
+        sessions = await _seed(sqlite_sessions)
+        cache = StatusCache(_unreachable_redis())
+        async with sessions() as db:
+            statuses = await cache.get_many(db, [2, 99, 1, 2])
+        assert statuses == {2: "in_progress", 99: None, 1: "submitted"}
+        await cache.client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_local_tier_answers_and_takes_write_through(self, sqlite_sessions):
+        sessions = await _seed(sqlite_sessions)
+        cache = StatusCache(_unreachable_redis(), local_ttl=60)
+        async with sessions() as db:
+            assert await cache.get(db, 1) == "submitted"
+            assert await cache.get(db, 3) is None
+        # Served from the process without touching the database
+        assert await cache.get(None, 1) == "submitted"
+        assert await cache.get(None, 3) is None
+        # A new request replaces the remembered miss
+        await cache.set(3, "submitted")
+        assert await cache.get(None, 3) == "submitted"
+        await cache.client.aclose()
+
+    @pytest.mark.skipif(not REDIS_URL, reason="set TEST_REDIS_URL to run against Redis")
+    @pytest.mark.asyncio
+    async def test_late_read_fill_does_not_replace_a_write_through(self, sqlite_sessions, monkeypatch):
+        sessions = await _seed(sqlite_sessions)
+        cache = StatusCache(aioredis.Redis.from_url(REDIS_URL, decode_responses=True), local_ttl=60)
+        await cache.client.delete(STATUS_PREFIX + "1")
+        store = cache._store
+
+        async def update_lands_first(statuses, fill=False):
+            if fill:
+                # The update commits and writes through between the reader's query and its fill
+                await cache.set(1, "completed")
+            await store(statuses, fill)
+        monkeypatch.setattr(cache, "_store", update_lands_first)
+        async with sessions() as db:
+            assert await cache.get(db, 1) == "submitted"
+        assert await cache.client.get(STATUS_PREFIX + "1") == "completed"
+        assert await cache.get(None, 1) == "completed"
+        await cache.client.delete(STATUS_PREFIX + "1")
+        await cache.client.aclose()
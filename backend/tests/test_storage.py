@@ -0,0 +1,87 @@
+import pytest
+
+from app.services.storage import LocalStorageBackend, MemoryStorageBackend, content_disposition, parse_range
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorageBackend(str(tmp_path))
+    return MemoryStorageBackend()
+
+async def _write(storage, key: str, *chunks: bytes) -> bool:
+    writer = storage.open_writer()
+    for chunk in chunks:
+        await writer.write(chunk)
+    return await writer.commit(key)
+
+async def _read(storage, key: str, **kwargs) -> bytes:
+    return b"".join([chunk async for chunk in storage.iter_chunks(key, **kwargs)])
+
+class TestStorageBackends:
+    @pytest.mark.asyncio
+    async def test_write_and_read_back(self, storage):
+        assert await _write(storage, "ab/cd/abcd", b"hello ", b"world")
+        assert await storage.exists("ab/cd/abcd")
+        assert await storage.size("ab/cd/abcd") == 11
+        assert await _read(storage, "ab/cd/abcd", chunk_size=4) == b"hello world"
+
+    @pytest.mark.asyncio
+    async def test_commit_to_existing_key_keeps_first_copy(self, storage):
+        assert await _write(storage, "blob", b"first")
+        assert not await _write(storage, "blob", b"second")
+        assert await _read(storage, "blob") == b"first"
+
+    @pytest.mark.asyncio
+    async def test_ranged_read(self, storage):
+        await _write(storage, "blob", b"0123456789")
+        assert await _read(storage, "blob", start=2, end=5) == b"2345"
+        assert await _read(storage, "blob", start=7) == b"789"
+
+    @pytest.mark.asyncio
+    async def test_abort_leaves_nothing_behind(self, storage):
+        writer = storage.open_writer()
+        await writer.write(b"partial")
+        await writer.abort()
+        assert not await storage.exists("blob")
+
+    @pytest.mark.asyncio
+    async def test_move_and_delete(self, storage):
+        await _write(storage, "blob", b"data")
+        await storage.move("blob", "quarantine/blob")
+        assert not await storage.exists("blob")
+        assert await _read(storage, "quarantine/blob") == b"data"
+        await storage.delete("quarantine/blob")
+        assert not await storage.exists("quarantine/blob")
+
+    @pytest.mark.asyncio
+    async def test_keys_listed_in_string_order(self, storage):
+        # "ab.x" sorts before "ab/..." even though the directory name "ab" is shorter
+        for key in ["ab/cd/ef", "ab.x", "ab/cd/ef.thumb.webp", "a", "quarantine/ff"]:
+            await _write(storage, key, b"x")
+        keys = [obj.key async for obj in storage.iter_keys()]
+        assert keys == sorted(keys) == ["a", "ab.x", "ab/cd/ef", "ab/cd/ef.thumb.webp", "quarantine/ff"]
+        assert [obj.key async for obj in storage.iter_keys(start_after="ab/cd/ef")] == [
+            "ab/cd/ef.thumb.webp", "quarantine/ff"
+        ]
+
+class TestContentDisposition:
+    def test_plain_names_are_quoted(self):
+        assert content_disposition("attachment", "report.pdf") == 'attachment; filename="report.pdf"'
+
+    def test_other_names_use_rfc5987(self):
+        header = content_disposition("inline", 'Straße "neu".jpg')
+        assert header == "inline; filename=\"Stra_e _neu_.jpg\"; filename*=UTF-8''Stra%C3%9Fe%20%22neu%22.jpg"
+        # Encodable as a header value, which the hand-built one was not
+        header.encode("latin-1")
+
+class TestDownloadRanges:
+    def test_single_ranges(self):
+        assert parse_range("bytes=0-3", 10) == (0, 3)
+        assert parse_range("bytes=5-", 10) == (5, 9)
+        assert parse_range("bytes=-4", 10) == (6, 9)
+        assert parse_range("bytes=8-100", 10) == (8, 9)
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        assert parse_range("bytes=10-", 10) == "invalid"
+        assert parse_range("bytes=0-1,4-5", 10) is None
+        assert parse_range("items=1-2", 10) is None